@@ -0,0 +1,486 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+# Benchmarks the symbolication hot path using synthetic sym files and stacks.
+#
+# Everything runs locally: sym files are generated from a seed and served by a
+# fake symbols server running in this process, so results are reproducible
+# offline.
+#
+# Usage: ./bin/benchmark.py [--size SIZE] [--iterations N] [BENCHMARK...]
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import random
+import resource
+import statistics
+import tempfile
+import threading
+from time import perf_counter
+
+import click
+from everett.manager import ConfigDictEnv, ConfigManager
+
+from eliot.cache import DiskCache, LookupCache, MemoryCache
+from eliot.cache_manager import get_cache_manager
+from eliot.downloader import SymbolFileDownloader
+from eliot.libcompression import get_compressor
+from eliot.libsymbolic import bytes_to_symcache, parse_sym_file, symcache_to_bytes
+from eliot.symbolicate_resource import DebugStats, SymbolicateBase
+
+
+# Sizes of synthetic sym files as (number of functions, lines per function); "large"
+# is about the size of a libxul.so sym file
+SIZES = {
+    "small": (1_000, 10),
+    "medium": (20_000, 20),
+    "large": (200_000, 30),
+}
+
+SEED = 8675309
+
+
+def make_debug_id(rng):
+    return "".join(rng.choice("0123456789ABCDEF") for _ in range(32)) + "0"
+
+
+def make_sym_file(debug_filename, debug_id, num_functions, lines_per_function, rng):
+    """Generates a synthetic Breakpad sym file
+
+    :arg debug_filename: the debug filename
+    :arg debug_id: the debug id
+    :arg num_functions: number of FUNC records
+    :arg lines_per_function: number of line records per FUNC record
+    :arg rng: random.Random instance
+
+    :returns: ``(sym file as bytes, list of (start, size) for functions)``
+
+    """
+    num_files = max(num_functions // 20, 1)
+    lines = [f"MODULE Linux x86_64 {debug_id} {debug_filename}"]
+    lines.extend(
+        f"FILE {i} /builds/worker/checkouts/gecko/src/dir{i % 97}/file{i}.cpp"
+        for i in range(num_files)
+    )
+
+    functions = []
+    address = 0x1000
+    for i in range(num_functions):
+        size = lines_per_function * rng.randint(2, 8)
+        functions.append((address, size))
+        lines.append(
+            f"FUNC {address:x} {size:x} 0 mozilla::dom::Namespace{i % 113}::Function{i}"
+        )
+        file_id = rng.randrange(num_files)
+        line_size = size // lines_per_function
+        for j in range(lines_per_function):
+            lines.append(
+                f"{address + j * line_size:x} {line_size:x} {100 + j} {file_id}"
+            )
+        address += size + rng.randint(0, 16)
+
+    return ("\n".join(lines) + "\n").encode("utf-8"), functions
+
+
+def make_modules(size, num_modules, rng):
+    """Generates synthetic modules with sym files
+
+    :returns: list of dicts with "debug_filename", "debug_id", "sym_file", and
+        "functions" keys
+
+    """
+    num_functions, lines_per_function = SIZES[size]
+    modules = []
+    for i in range(num_modules):
+        debug_filename = f"libbench{i}.so"
+        debug_id = make_debug_id(rng)
+        sym_file, functions = make_sym_file(
+            debug_filename, debug_id, num_functions, lines_per_function, rng
+        )
+        modules.append(
+            {
+                "debug_filename": debug_filename,
+                "debug_id": debug_id,
+                "sym_file": sym_file,
+                "functions": functions,
+            }
+        )
+    return modules
+
+
+def make_jobs(modules, num_jobs, num_stacks, frames_per_stack, rng):
+    """Generates symbolicate/v5 jobs with addresses in the synthetic modules
+
+    Frames are mostly in the modules' functions with some in modules we don't have
+    sym files for.
+
+    """
+    memory_map = [[mod["debug_filename"], mod["debug_id"]] for mod in modules]
+    memory_map.append(["thirdparty.dll", "0123456789ABCDEF0123456789ABCDEF1"])
+
+    jobs = []
+    for _ in range(num_jobs):
+        stacks = []
+        for _ in range(num_stacks):
+            stack = []
+            for _ in range(frames_per_stack):
+                module_index = rng.randrange(len(memory_map))
+                if module_index == len(modules):
+                    stack.append([module_index, rng.randrange(0x10000)])
+                    continue
+                start, size = rng.choice(modules[module_index]["functions"])
+                stack.append([module_index, start + rng.randrange(size)])
+            stacks.append(stack)
+        jobs.append({"memoryMap": memory_map, "stacks": stacks})
+    return jobs
+
+
+class FakeSymbolsServer:
+    """Symbols server serving sym files from memory on localhost"""
+
+    def __init__(self, files):
+        """
+        :arg files: map of path (``debug_filename/debug_id/filename``) to bytes
+        """
+        self.files = files
+
+        files = self.files
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = files.get(self.path.lstrip("/"))
+                if data is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def get_peak_rss():
+    """Returns peak resident set size of this process in bytes"""
+    # NOTE(willkg): ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_benchmark(name, fun, iterations, setup=None, teardown=None):
+    """Runs fun iterations times and returns stats
+
+    :arg name: the name of the benchmark
+    :arg fun: the function to time; it's passed the return value of setup
+    :arg iterations: number of times to run fun
+    :arg setup: function called before each run that isn't timed
+    :arg teardown: function called with the return value of setup after each run
+        that isn't timed
+
+    :returns: dict of stats
+
+    """
+    timings = []
+    for i in range(iterations):
+        arg = setup(i) if setup is not None else None
+        start = perf_counter()
+        fun(arg)
+        timings.append(perf_counter() - start)
+        if teardown is not None:
+            teardown(arg)
+
+    timings.sort()
+
+    def percentile(pct):
+        return timings[min(int(len(timings) * pct / 100), len(timings) - 1)]
+
+    return {
+        "name": name,
+        "iterations": iterations,
+        "throughput": iterations / sum(timings),
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": percentile(50) * 1000,
+        "p90_ms": percentile(90) * 1000,
+        "p99_ms": percentile(99) * 1000,
+        "max_ms": timings[-1] * 1000,
+        "peak_rss_mb": get_peak_rss() / 1024 / 1024,
+    }
+
+
+def bench_symcache(modules, iterations):
+    module = modules[0]
+    args = (module["debug_filename"], module["debug_id"], module["sym_file"])
+    symcache = parse_sym_file(*args)
+    data = symcache_to_bytes(symcache)
+
+    yield run_benchmark("parse_sym_file", lambda _: parse_sym_file(*args), iterations)
+    yield run_benchmark(
+        "symcache_to_bytes", lambda _: symcache_to_bytes(symcache), iterations
+    )
+    yield run_benchmark(
+        "bytes_to_symcache", lambda _: bytes_to_symcache(data), iterations
+    )
+
+
+def bench_diskcache(modules, iterations, tmpdir):
+    module = modules[0]
+    symcache = parse_sym_file(
+        module["debug_filename"], module["debug_id"], module["sym_file"]
+    )
+    data = symcache_to_bytes(symcache)
+
+    for compression in ["none", "zstd", "lz4"]:
+        cachedir = Path(tmpdir) / f"diskcache-{compression}"
+        cachedir.mkdir()
+        cache = DiskCache(
+            cachedir=cachedir,
+            tmpdir=Path(tmpdir),
+            compressor=get_compressor(compression),
+        )
+        suffix = "" if compression == "none" else f"[{compression}]"
+
+        yield run_benchmark(
+            f"diskcache.set_symcache{suffix}",
+            lambda i, cache=cache: cache.set_symcache(
+                f"bench/{i}.symc", data, "libbench.so"
+            ),
+            iterations,
+            setup=lambda i: i,
+        )
+        yield run_benchmark(
+            f"diskcache.get_symcache{suffix}",
+            lambda i, cache=cache: cache.get_symcache(f"bench/{i}.symc"),
+            iterations,
+            setup=lambda i: i,
+        )
+
+    cachedir = Path(tmpdir) / "diskcache"
+    cachedir.mkdir()
+    cache = DiskCache(cachedir=cachedir, tmpdir=Path(tmpdir))
+    yield run_benchmark(
+        "diskcache.set",
+        lambda i: cache.set(f"bench/{i}.msgpack", {"data": data}),
+        iterations,
+        setup=lambda i: i,
+    )
+    yield run_benchmark(
+        "diskcache.get",
+        lambda i: cache.get(f"bench/{i}.msgpack"),
+        iterations,
+        setup=lambda i: i,
+    )
+
+
+def bench_symbolicate(modules, iterations, tmpdir, num_jobs, rng):
+    jobs = make_jobs(modules, num_jobs, num_stacks=5, frames_per_stack=40, rng=rng)
+    files = {
+        f"{mod['debug_filename']}/{mod['debug_id']}/{mod['debug_filename']}.sym": (
+            mod["sym_file"]
+        )
+        for mod in modules
+    }
+
+    with FakeSymbolsServer(files) as server:
+        downloader = SymbolFileDownloader([server.url])
+
+        def make_base(name, memory_cache=None, lookup_cache=None):
+            cachedir = Path(tmpdir) / name
+            cachedir.mkdir(parents=True)
+            return SymbolicateBase(
+                downloader=downloader,
+                cache=DiskCache(cachedir=cachedir, tmpdir=Path(tmpdir)),
+                tmpdir=Path(tmpdir),
+                memory_cache=memory_cache,
+                fetch_concurrency=4,
+                lookup_cache=lookup_cache,
+            )
+
+        # Cold: every run downloads and parses all the sym files
+        yield run_benchmark(
+            "symbolicate.cold",
+            lambda base: base.symbolicate(jobs, DebugStats()),
+            iterations,
+            setup=lambda i: make_base(f"cold{i}"),
+            teardown=lambda base: base.close(),
+        )
+
+        # Warm disk: symcaches come from the disk cache
+        base = make_base("warmdisk")
+        base.symbolicate(jobs, DebugStats())
+        yield run_benchmark(
+            "symbolicate.warm_disk",
+            lambda _: base.symbolicate(jobs, DebugStats()),
+            iterations,
+        )
+        base.close()
+
+        # Warm memory: symcaches come from the memory cache
+        base = make_base("warmmemory", memory_cache=MemoryCache(max_size=2**32))
+        base.symbolicate(jobs, DebugStats())
+        yield run_benchmark(
+            "symbolicate.warm_memory",
+            lambda _: base.symbolicate(jobs, DebugStats()),
+            iterations,
+        )
+        base.close()
+
+        # Warm lookup: symcaches come from the memory cache and lookup results come
+        # from the lookup cache
+        base = make_base(
+            "warmlookup",
+            memory_cache=MemoryCache(max_size=2**32),
+            lookup_cache=LookupCache(max_items=1_000_000),
+        )
+        base.symbolicate(jobs, DebugStats())
+        yield run_benchmark(
+            "symbolicate.warm_lookup",
+            lambda _: base.symbolicate(jobs, DebugStats()),
+            iterations,
+        )
+        base.close()
+
+
+def bench_inventory(iterations, tmpdir, num_dirs=100, files_per_dir=200):
+    basedir = Path(tmpdir) / "inventory"
+    cachedir = basedir / "cache"
+    for i in range(num_dirs):
+        dirpath = cachedir / f"module{i}"
+        dirpath.mkdir(parents=True)
+        for j in range(files_per_dir):
+            (dirpath / f"{j:040X}.symc").write_bytes(b"x" * 100)
+
+    def make_cache_manager(snapshot_interval):
+        config = {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(basedir),
+            "ELIOT_SYMBOLS_CACHE_SNAPSHOT_INTERVAL": str(snapshot_interval),
+        }
+        return get_cache_manager(
+            ConfigManager([ConfigDictEnv(config)]).with_namespace("eliot")
+        )
+
+    # Start once so there's a snapshot and journal to restart from
+    cache_manager = make_cache_manager(300)
+    cache_manager.run_once()
+    cache_manager.shutdown()
+
+    # Restarting with a snapshot only stats files that aren't in it
+    for name, snapshot_interval in [("snapshot", 300), ("scan", 0)]:
+        yield run_benchmark(
+            f"cache_manager.restart[{name}]",
+            lambda cache_manager: cache_manager.run_once(),
+            iterations,
+            setup=lambda i, interval=snapshot_interval: make_cache_manager(interval),
+            teardown=lambda cache_manager: cache_manager.shutdown(),
+        )
+
+
+BENCHMARKS = ["symcache", "diskcache", "symbolicate", "inventory"]
+
+
+@click.command()
+@click.option(
+    "--size",
+    type=click.Choice(list(SIZES.keys())),
+    default="medium",
+    show_default=True,
+    help="Size of the synthetic sym files.",
+)
+@click.option(
+    "--modules",
+    "num_modules",
+    default=4,
+    show_default=True,
+    help="Number of modules in symbolicate jobs.",
+)
+@click.option(
+    "--jobs",
+    "num_jobs",
+    default=3,
+    show_default=True,
+    help="Number of jobs per symbolicate request.",
+)
+@click.option(
+    "--iterations",
+    default=20,
+    show_default=True,
+    help="Number of times to run each benchmark.",
+)
+@click.option(
+    "--seed", default=SEED, show_default=True, help="Seed for synthetic data."
+)
+@click.option("--json", "as_json", is_flag=True, help="Print results as JSON.")
+@click.argument("benchmarks", nargs=-1, type=click.Choice(BENCHMARKS))
+def benchmark(size, num_modules, num_jobs, iterations, seed, as_json, benchmarks):
+    """Benchmarks symbolication with synthetic sym files and stacks.
+
+    Runs all benchmarks unless some are specified. Peak RSS is for the whole
+    process at the end of each benchmark, so it only goes up.
+
+    """
+    benchmarks = benchmarks or BENCHMARKS
+    rng = random.Random(seed)
+
+    if not as_json:
+        click.echo(f"Generating {num_modules} {size} sym files ...")
+    modules = make_modules(size, num_modules, rng)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="eliot-benchmark-") as tmpdir:
+        runs = {
+            "symcache": lambda: bench_symcache(modules, iterations),
+            "diskcache": lambda: bench_diskcache(modules, iterations, tmpdir),
+            "symbolicate": lambda: bench_symbolicate(
+                modules, iterations, tmpdir, num_jobs, rng
+            ),
+            "inventory": lambda: bench_inventory(iterations, tmpdir),
+        }
+        for name in benchmarks:
+            for result in runs[name]():
+                results.append(result)
+                if not as_json:
+                    click.echo(
+                        f"{result['name']:<30} "
+                        f"{result['throughput']:>10.1f}/s  "
+                        f"p50 {result['p50_ms']:>9.3f}ms  "
+                        f"p90 {result['p90_ms']:>9.3f}ms  "
+                        f"p99 {result['p99_ms']:>9.3f}ms  "
+                        f"max {result['max_ms']:>9.3f}ms  "
+                        f"rss {result['peak_rss_mb']:>8.1f}MB"
+                    )
+
+    if as_json:
+        click.echo(
+            json.dumps(
+                {
+                    "size": size,
+                    "sym_file_size": len(modules[0]["sym_file"]),
+                    "modules": num_modules,
+                    "jobs": num_jobs,
+                    "seed": seed,
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -6,15 +6,25 @@
 
 # default variables
 : "${PORT:=8000}"
+: "${ELIOT_WEB_INTERFACE:=wsgi}"
 : "${ELIOT_GUNICORN_WORKERS:=1}"
 : "${ELIOT_GUNICORN_TIMEOUT:=300}"
 : "${ELIOT_GUNICORN_MAX_REQUESTS:=0}"
 : "${ELIOT_GUNICORN_MAX_REQUESTS_JITTER:=0}"
 
-(set -o posix; set) | grep ELIOT_GUNICORN
+(set -o posix; set) | grep -e ELIOT_GUNICORN -e ELIOT_WEB_INTERFACE
 
 cd /app/
 
+if [[ "${ELIOT_WEB_INTERFACE}" == "asgi" ]]; then
+    exec uvicorn \
+        --host 0.0.0.0 \
+        --port "${PORT}" \
+        --workers "${ELIOT_GUNICORN_WORKERS}" \
+        --no-proxy-headers \
+        eliot.asgi:application
+fi
+
 gunicorn \
     --bind 0.0.0.0:"${PORT}" \
     --timeout "${ELIOT_GUNICORN_TIMEOUT}" \
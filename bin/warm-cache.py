@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+# Warms up the disk cache by downloading and parsing sym files for a list of
+# modules. This uses the same ELIOT_ configuration as the webapp.
+
+# Usage: warm-cache.py [OPTIONS]
+
+import click
+
+from eliot.warmup import (
+    build_symbolicate_base,
+    read_modules_file,
+    read_modules_from_cachedir,
+    read_modules_from_logs,
+    warm_up,
+    WarmUpResult,
+)
+
+
+RESULT_COLORS = {
+    WarmUpResult.CACHED: None,
+    WarmUpResult.BUILT: "green",
+    WarmUpResult.MISSING: "yellow",
+    WarmUpResult.ERROR: "red",
+}
+
+
+@click.command()
+@click.option(
+    "--from-file",
+    "modules_files",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="File with a debug filename and debug id per line.",
+)
+@click.option(
+    "--from-cachedir",
+    "cachedirs",
+    multiple=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Existing cache directory to copy the modules of.",
+)
+@click.option(
+    "--from-logs",
+    "log_files",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Symbols server access log to pull sym file requests from.",
+)
+@click.option(
+    "--limit",
+    default=0,
+    type=int,
+    help="Maximum number of modules to warm up; 0 for all of them.",
+)
+@click.option(
+    "--concurrency",
+    default=4,
+    type=click.IntRange(min=1),
+    help="Number of modules to download and parse at the same time.",
+)
+@click.pass_context
+def warm_cache(ctx, modules_files, cachedirs, log_files, limit, concurrency):
+    """Downloads and parses sym files for modules and saves them in the cache."""
+    modules = []
+    for path in modules_files:
+        modules.extend(read_modules_file(path))
+    for path in cachedirs:
+        modules.extend(read_modules_from_cachedir(path))
+    for path in log_files:
+        modules.extend(read_modules_from_logs(path))
+
+    # Remove duplicates but keep the order
+    modules = list(dict.fromkeys(modules))
+    if limit:
+        modules = modules[:limit]
+
+    if not modules:
+        click.echo(click.style("ERROR: no modules to warm up", fg="red"))
+        ctx.exit(1)
+
+    click.echo(f"Warming up {len(modules):,} modules ...")
+    base = build_symbolicate_base()
+
+    def progress(index, total, module_info, result, duration):
+        debug_filename, debug_id = module_info
+        click.echo(
+            f"[{index}/{total}] {debug_filename}/{debug_id}: "
+            + click.style(result, fg=RESULT_COLORS[result])
+            + f" ({duration:.2f}s)"
+        )
+
+    counts = warm_up(base, modules, concurrency=concurrency, progress=progress)
+    click.echo(", ".join(f"{result}: {count:,}" for result, count in counts.items()))
+
+
+if __name__ == "__main__":
+    warm_cache()
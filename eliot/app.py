@@ -4,8 +4,10 @@
 
 """
 Holds the EliotApp code. EliotApp is a WSGI app implemented using Falcon.
+EliotASGIApp is the ASGI variant.
 """
 
+import inspect
 import logging
 import logging.config
 from pathlib import Path
@@ -18,28 +20,52 @@ from everett.manager import (
     get_config_for_class,
     ListOf,
     Option,
+    parse_data_size,
 )
 import falcon
+import falcon.asgi
 from falcon.errors import HTTPInternalServerError
+from falcon.util.sync import wrap_sync_to_async
 from fillmore.libsentry import set_up_sentry
 from fillmore.scrubber import Scrubber, Rule, SCRUB_RULES_DEFAULT
 import sentry_sdk
 from sentry_sdk.hub import Hub
+from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
 from sentry_sdk.integrations.wsgi import SentryWsgiMiddleware
 from sentry_sdk.utils import event_from_exception
 
-from eliot.cache import DiskCache
-from eliot.downloader import SymbolFileDownloader
+from eliot.cache import (
+    DiskCache,
+    get_second_tier_cache,
+    LookupCache,
+    MemoryCache,
+    NegativeCache,
+    SharedSymcacheCache,
+    SingleFlight,
+)
+from eliot.downloader import (
+    AsyncSymbolFileDownloader,
+    parse_strategy,
+    SymbolFileDownloader,
+)
 from eliot.health_resource import (
     BrokenResource,
     HeartbeatResource,
     LBHeartbeatResource,
     VersionResource,
 )
+from eliot.libcompression import get_compressor
 from eliot.libdockerflow import get_release_name
+from eliot.libjson import get_json_codec
 from eliot.liblogging import set_up_logging, log_config
 from eliot.libmarkus import set_up_metrics, METRICS
-from eliot.symbolicate_resource import SymbolicateV4, SymbolicateV5
+from eliot.libsymbolic import ParseSymFilePool
+from eliot.symbolicate_resource import (
+    AsyncSymbolicateV4,
+    AsyncSymbolicateV5,
+    SymbolicateV4,
+    SymbolicateV5,
+)
 
 
 LOGGER = logging.getLogger(__name__)
@@ -109,6 +135,10 @@ class IndexResource:
 class EliotApp(falcon.App):
     """Falcon App for Eliot."""
 
+    downloader_class = SymbolFileDownloader
+    symbolicate_v4_class = SymbolicateV4
+    symbolicate_v5_class = SymbolicateV5
+
     class Config:
         local_dev_env = Option(
             default="False",
@@ -138,10 +168,210 @@ class EliotApp(falcon.App):
                 "See https://docs.sentry.io/quickstart/#configure-the-dsn for details."
             ),
         )
+        json_codec = Option(
+            default="stdlib",
+            parser=get_json_codec,
+            doc=(
+                "JSON codec for symbolication requests and responses. ``stdlib`` "
+                "uses the Python json module. ``orjson`` uses orjson which is "
+                "faster, but produces compact UTF-8 output that's not byte for "
+                "byte the same as ``stdlib``. ``auto`` uses orjson if it's "
+                "installed and ``stdlib`` otherwise."
+            ),
+        )
+        stream_responses = Option(
+            default="False",
+            parser=bool,
+            doc=(
+                "Whether to stream symbolicate/v5 responses. Streamed responses are "
+                "encoded stack by stack as they're sent which lowers peak memory use "
+                "for large responses. The results are still all built before the "
+                "first byte is sent, so this doesn't lower time to first byte."
+            ),
+        )
+        symbols_cache_compression = Option(
+            default="none",
+            parser=get_compressor,
+            doc=(
+                "Compression for symcache files in the disk cache: none, zstd, or "
+                "lz4. Compressed symcaches take up several times less disk space, "
+                "so more modules fit in the disk cache, but they have to be "
+                "decompressed into memory when read rather than mmapped, so they "
+                "can't be shared between webapp processes. Files stored with any "
+                "setting can be read."
+            ),
+        )
         symbols_cache_dir = Option(
             default="/tmp/cache",
             doc="Location for caching symcache files.",
         )
+        symbols_compressed_suffixes = Option(
+            default="",
+            parser=ListOf(str),
+            doc=(
+                "Comma-separated list of suffixes of compressed variants of sym "
+                "files to try before the sym file itself like ``.zst,.gz``. Any "
+                "error response for a compressed variant moves on to the next one. "
+                "Downloaded sym files are decompressed if they're gzip or Zstandard "
+                "compressed regardless of their name."
+            ),
+        )
+        symbols_download_hedge_delay = Option(
+            default="0.5",
+            parser=float,
+            doc=(
+                "With the ``hedged`` download strategy, the number of seconds to "
+                "wait for a source to respond before also trying the next source."
+            ),
+        )
+        symbols_download_strategy = Option(
+            default="sequential",
+            parser=parse_strategy,
+            doc=(
+                "How to get sym files when there are multiple symbols urls. "
+                "``sequential`` tries the urls one at a time in order. "
+                "``concurrent`` tries all the urls at the same time. ``hedged`` "
+                "tries the next url if the previous ones haven't responded after "
+                "the hedge delay or as soon as they fail. With ``concurrent`` and "
+                "``hedged``, the first url to return the sym file wins and the "
+                "other downloads are cancelled."
+            ),
+        )
+        symbols_fetch_concurrency = Option(
+            default="4",
+            parser=int,
+            doc=(
+                "Maximum number of modules to download and parse at the same time "
+                "when handling a symbolication request. Set to 1 to get modules one "
+                "at a time."
+            ),
+        )
+        symbols_lookup_cache_max_items = Option(
+            default="100000",
+            parser=int,
+            doc=(
+                "Maximum number of symbol lookup results to cache in each webapp "
+                "process. Hot addresses in popular modules get symbolicated over and "
+                "over, so this saves looking them up in the symcache every time. Set "
+                "to 0 to disable the lookup cache."
+            ),
+        )
+        symbols_memory_cache_max_size = Option(
+            default="256mb",
+            parser=parse_data_size,
+            doc=(
+                "Max size (bytes) of the in-memory cache of symcache objects in each "
+                "webapp process. Set to 0 to disable. You can use _ to group digits "
+                "for legibility. You can use units like kb, mb, gb, and tb."
+            ),
+        )
+        symbols_negative_cache_error_ttl = Option(
+            default="60",
+            parser=int,
+            doc=(
+                "Number of seconds to remember that a sym file couldn't be downloaded "
+                "because of an error like a timeout or an HTTP 500. Set to 0 to not "
+                "remember errors."
+            ),
+        )
+        symbols_negative_cache_ttl = Option(
+            default="300",
+            parser=int,
+            doc=(
+                "Number of seconds to remember that a sym file wasn't found in any of "
+                "the symbols urls. Requests for modules known to be missing don't "
+                "check the symbols urls again until this expires. This is a tradeoff: "
+                "a sym file that's uploaded after a miss isn't used until the entry "
+                "expires, and with symbols_negative_cache_use_disk, that applies to "
+                "every process on the node. Set to 0 to disable the negative cache."
+            ),
+        )
+        symbols_negative_cache_use_disk = Option(
+            default="True",
+            parser=bool,
+            doc=(
+                "Whether to store negative cache entries in the disk cache so they're "
+                "shared by all processes on the node."
+            ),
+        )
+        symbols_parse_pool_max_tasks_per_child = Option(
+            default="100",
+            parser=int,
+            doc=(
+                "Number of sym files a parse pool worker process parses before it's "
+                "replaced with a new process. This keeps memory fragmentation from "
+                "large parses in check. Set to 0 to never replace worker processes."
+            ),
+        )
+        symbols_parse_pool_size = Option(
+            default="0",
+            parser=int,
+            doc=(
+                "Number of worker processes for parsing sym files into symcaches. "
+                "Parsing large sym files is CPU-heavy and holds the GIL, so doing it "
+                "in worker processes lets the webapp continue to handle requests. Set "
+                "to 0 to parse sym files in the request thread."
+            ),
+        )
+        symbols_parse_timeout = Option(
+            default="120",
+            parser=int,
+            doc=(
+                "Number of seconds to wait for a parse pool worker process to parse a "
+                "sym file before giving up. When a parse times out, the worker "
+                "processes are killed and replaced, so other parses running at the "
+                "same time fail."
+            ),
+        )
+        symbols_second_tier_cache_ttl = Option(
+            default="604800",
+            parser=int,
+            doc=(
+                "Seconds to keep symcache files in a Redis second tier cache. Set to "
+                "0 to keep them until Redis evicts them."
+            ),
+        )
+        symbols_second_tier_cache_url = Option(
+            default="",
+            doc=(
+                "Second tier cache shared between nodes that's checked for symcache "
+                "files that aren't in the disk cache and that new symcache files are "
+                "published to. Use a redis://, rediss://, or unix:// url for Redis or "
+                "a server that speaks the Redis protocol. Use a file:// url or an "
+                "absolute path for a shared directory like an NFS mount. Leave empty "
+                "to not use a second tier cache."
+            ),
+        )
+        symbols_shared_cache_max_items = Option(
+            default="0",
+            parser=int,
+            doc=(
+                "Maximum number of symcache files from the disk cache to keep mmapped "
+                "in each webapp process. Mapped symcache pages are shared by all the "
+                "webapp processes on the node, so a symcache is only in memory once. "
+                "Newly parsed symcaches are mapped from the disk cache instead of "
+                "being kept in the memory cache. Set to 0 to disable the shared "
+                "cache."
+            ),
+        )
+        symbols_singleflight = Option(
+            default="True",
+            parser=bool,
+            doc=(
+                "Whether concurrent cache misses for the same module on a node wait "
+                "for one of them to download and parse the sym file rather than all "
+                "doing it. This uses lock files in the cache tmp directory."
+            ),
+        )
+        symbols_stream_downloads = Option(
+            default="False",
+            parser=bool,
+            doc=(
+                "Whether to stream sym file downloads to a temp file in the cache "
+                "tmp directory and parse the sym file from there. This keeps large "
+                "sym files out of memory. Incomplete downloads are retried."
+            ),
+        )
         symbols_urls = Option(
             default="https://symbols.mozilla.org/try/",
             doc="Comma-separated list of urls to pull symbols files from.",
@@ -198,17 +428,102 @@ class EliotApp(falcon.App):
         self.add_route("lbheartbeat", "/__lbheartbeat__", LBHeartbeatResource())
         self.add_route("broken", "/__broken__", BrokenResource())
 
-        diskcache = DiskCache(cachedir=cachecachedir, tmpdir=tmpdir)
-        downloader = SymbolFileDownloader(self.config("symbols_urls"))
+        diskcache = DiskCache(
+            cachedir=cachecachedir,
+            tmpdir=tmpdir,
+            compressor=self.config("symbols_cache_compression"),
+            second_tier=get_second_tier_cache(
+                self.config("symbols_second_tier_cache_url"),
+                ttl=self.config("symbols_second_tier_cache_ttl"),
+            ),
+        )
+        memory_cache_max_size = self.config("symbols_memory_cache_max_size")
+        if memory_cache_max_size > 0:
+            memory_cache = MemoryCache(max_size=memory_cache_max_size)
+        else:
+            memory_cache = None
+        shared_cache_max_items = self.config("symbols_shared_cache_max_items")
+        if shared_cache_max_items > 0:
+            shared_cache = SharedSymcacheCache(
+                diskcache=diskcache, max_items=shared_cache_max_items
+            )
+        else:
+            shared_cache = None
+        if self.config("symbols_singleflight"):
+            singleflight = SingleFlight(lockdir=tmpdir)
+        else:
+            singleflight = None
+        lookup_cache_max_items = self.config("symbols_lookup_cache_max_items")
+        if lookup_cache_max_items > 0:
+            lookup_cache = LookupCache(max_items=lookup_cache_max_items)
+        else:
+            lookup_cache = None
+        parse_pool_size = self.config("symbols_parse_pool_size")
+        if parse_pool_size > 0:
+            parse_pool = ParseSymFilePool(
+                size=parse_pool_size,
+                max_tasks_per_child=self.config(
+                    "symbols_parse_pool_max_tasks_per_child"
+                ),
+                timeout=self.config("symbols_parse_timeout"),
+            )
+        else:
+            parse_pool = None
+        if self.config("symbols_negative_cache_ttl") > 0:
+            negative_cache = NegativeCache(
+                ttl=self.config("symbols_negative_cache_ttl"),
+                error_ttl=self.config("symbols_negative_cache_error_ttl"),
+                diskcache=(
+                    diskcache
+                    if self.config("symbols_negative_cache_use_disk")
+                    else None
+                ),
+            )
+        else:
+            negative_cache = None
+        downloader = self.downloader_class(
+            self.config("symbols_urls"),
+            compressed_suffixes=self.config("symbols_compressed_suffixes"),
+            strategy=self.config("symbols_download_strategy"),
+            hedge_delay=self.config("symbols_download_hedge_delay"),
+        )
         self.add_route(
             "symbolicate_v4",
             "/symbolicate/v4",
-            SymbolicateV4(downloader=downloader, cache=diskcache, tmpdir=tmpdir),
+            self.symbolicate_v4_class(
+                downloader=downloader,
+                cache=diskcache,
+                tmpdir=tmpdir,
+                memory_cache=memory_cache,
+                fetch_concurrency=self.config("symbols_fetch_concurrency"),
+                singleflight=singleflight,
+                parse_pool=parse_pool,
+                negative_cache=negative_cache,
+                stream_responses=self.config("stream_responses"),
+                json_codec=self.config("json_codec"),
+                lookup_cache=lookup_cache,
+                shared_cache=shared_cache,
+                stream_downloads=self.config("symbols_stream_downloads"),
+            ),
         )
         self.add_route(
             "symbolicate_v5",
             "/symbolicate/v5",
-            SymbolicateV5(downloader=downloader, cache=diskcache, tmpdir=tmpdir),
+            self.symbolicate_v5_class(
+                downloader=downloader,
+                cache=diskcache,
+                tmpdir=tmpdir,
+                memory_cache=memory_cache,
+                fetch_concurrency=self.config("symbols_fetch_concurrency"),
+                singleflight=singleflight,
+                parse_pool=parse_pool,
+                negative_cache=negative_cache,
+                stream_responses=self.config("stream_responses"),
+                json_codec=self.config("json_codec"),
+                lookup_cache=lookup_cache,
+                shared_cache=shared_cache,
+                stream_downloads=self.config("symbols_stream_downloads"),
+            ),
         )
 
         # Add the index.html resource and static route last
@@ -256,7 +571,8 @@ class EliotApp(falcon.App):
             # The SentryWsgiMiddleware tacks on an unhelpful transaction value which
             # makes things hard to find in the Sentry interface, so we stomp on that
             # with the req.path
-            scope.transaction.name = req.path
+            if scope.transaction is not None:
+                scope.transaction.name = req.path
             hub = Hub.current
 
             event, hint = event_from_exception(
@@ -284,12 +600,51 @@ class EliotApp(falcon.App):
             self.config(key)
 
 
-def get_app(config_manager=None):
-    """Build and return EliotApp instance.
+class EliotASGIApp(EliotApp, falcon.asgi.App):
+    """Falcon ASGI App for Eliot.
+
+    This uses an asyncio downloader and async symbolication resources so that
+    downloads for many requests overlap in a single process.
+
+    """
+
+    downloader_class = AsyncSymbolFileDownloader
+    symbolicate_v4_class = AsyncSymbolicateV4
+    symbolicate_v5_class = AsyncSymbolicateV5
+
+    def add_route(self, name, uri_template, resource, *args, **kwargs):
+        """Add specified Falcon route.
+
+        Falcon ASGI apps require responders to be coroutine functions, so this wraps
+        synchronous responders of resources like the health resources so they run in
+        an executor.
+
+        """
+        for attr in dir(resource):
+            if not attr.startswith("on_"):
+                continue
+            responder = getattr(resource, attr)
+            if callable(responder) and not inspect.iscoroutinefunction(responder):
+                setattr(resource, attr, wrap_sync_to_async(responder))
+
+        super().add_route(name, uri_template, resource, *args, **kwargs)
 
+    async def uncaught_error_handler(self, req, resp, ex, params):
+        """Handle uncaught exceptions
+
+        See ``EliotApp.uncaught_error_handler``.
+
+        """
+        super().uncaught_error_handler(req, resp, ex, params)
+
+
+def _build_app(app_class, config_manager):
+    """Build, set up, and verify an app instance.
+
+    :arg app_class: the app class to build
     :arg config_manager: Everet ConfigManager to use; if None, it will build one
 
-    :returns: EliotApp instance
+    :returns: app instance
 
     """
     if config_manager is None:
@@ -297,7 +652,7 @@ def get_app(config_manager=None):
 
     # Set up logging and sentry first, so we have something to log to. Then
     # build and log everything else.
-    app_config = config_manager.with_options(EliotApp)
+    app_config = config_manager.with_options(app_class)
     set_up_logging(
         logging_level=app_config("logging_level"),
         debug=app_config("local_dev_env"),
@@ -307,7 +662,7 @@ def get_app(config_manager=None):
     configure_sentry(app_config)
 
     # Create the app and verify configuration
-    app = EliotApp(config_manager)
+    app = app_class(config_manager)
     app.verify_configuration()
     app.set_up()
     app.verify()
@@ -315,8 +670,38 @@ def get_app(config_manager=None):
     if app.config("local_dev_env"):
         LOGGER.info("Eliot is running! http://localhost:8000")
 
+    return app
+
+
+def get_app(config_manager=None):
+    """Build and return EliotApp instance.
+
+    :arg config_manager: Everet ConfigManager to use; if None, it will build one
+
+    :returns: EliotApp instance
+
+    """
+    app = _build_app(EliotApp, config_manager)
+
     # Wrap app in Sentry WSGI middleware which builds the request section in the
     # Sentry event
     app = SentryWsgiMiddleware(app)
 
     return app
+
+
+def get_asgi_app(config_manager=None):
+    """Build and return EliotASGIApp instance.
+
+    :arg config_manager: Everet ConfigManager to use; if None, it will build one
+
+    :returns: EliotASGIApp instance
+
+    """
+    app = _build_app(EliotASGIApp, config_manager)
+
+    # Wrap app in Sentry ASGI middleware which builds the request section in the
+    # Sentry event
+    app = SentryAsgiMiddleware(app)
+
+    return app
@@ -3,19 +3,33 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 """
-Contains LRU disk cache code for symc files.
+Contains LRU disk cache, second tier cache, and in-memory cache code for symc files.
 """
 
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import fcntl
+import hashlib
 import logging
+import mmap
+import os
 from pathlib import Path
 import re
+import struct
 import tempfile
+import threading
 import time
 
 import msgpack
 import msgpack.exceptions
+import redis
+import symbolic
 
+from eliot.libcompression import CompressionError, get_compressor
 from eliot.libmarkus import METRICS
+from eliot.libsymbolic import bytes_to_symcache, open_symcache
 
 
 LOGGER = logging.getLogger(__name__)
@@ -23,13 +37,152 @@ LOGGER = logging.getLogger(__name__)
 
 NO_DEFAULT = object()
 
+# Symcache files are stored as the raw symcache bytes followed by a msgpack-encoded
+# metadata trailer, then the length of the metadata and this magic marker. Because
+# the symcache starts at the beginning of the file, it can be mmapped directly. The
+# first byte is a NUL which never ends a legacy msgpack-encoded cache file.
+#
+# If the metadata has a "compression" key, the symcache is compressed with that
+# compressor and "size" is the uncompressed size. Compressed symcaches can't be
+# mmapped, so they're decompressed into memory when read.
+SYMCACHE_MAGIC = b"\x00ELSYMC1"
+SYMCACHE_TRAILER = struct.Struct("<I8s")
+
+
+# Extended attribute with how long it took to build a symcache file in seconds. The
+# disk cache manager uses it to weigh evictions.
+COST_XATTR = "user.eliot.cost"
+
+# Minimum seconds between telling the disk cache manager that a cache file that's
+# used from memory or a mapping was used
+ACCESS_INTERVAL = 60
+
 
 class CacheReadError(Exception):
     """Exception for errors hit when reading the cache from disk"""
 
 
+def get_cost(path):
+    """Returns the cost recorded for a cache file
+
+    This reads an extended attribute, so it doesn't read the file or trigger inotify
+    access events.
+
+    :arg path: path of the cache file
+
+    :returns: cost in seconds as a float or None if there's no cost
+
+    """
+    try:
+        return float(os.getxattr(path, COST_XATTR))
+    except (OSError, ValueError):
+        return None
+
+
+def record_access(fd):
+    """Reads a byte from an open cache file so inotify reports an access
+
+    The Disk Cache Manager keeps its LRU up to date with inotify access events.
+    Using a symcache through a mapping or a copy in memory doesn't read the file, so
+    nothing gets reported and the file looks unused. This reads one byte, which is
+    in the page cache for files in use, so the access gets reported.
+
+    :arg int fd: file descriptor of the open cache file
+
+    """
+    try:
+        os.pread(fd, 1, 0)
+    except OSError:
+        pass
+
+
+class AccessThrottle:
+    """Limits how often accesses to a cache file get recorded
+
+    The Disk Cache Manager only needs to know roughly when a file was last used, so
+    there's no need to record every use of hot symcaches.
+
+    This is thread-safe.
+
+    """
+
+    def __init__(self, interval=ACCESS_INTERVAL, max_items=100_000):
+        """
+        :arg float interval: minimum seconds between recording accesses for a key
+        :arg int max_items: maximum number of keys to keep track of; when there are
+            more, the oldest keys are forgotten
+        """
+        self.interval = interval
+        self.max_items = max_items
+        # key -> time the access was last recorded in order of recording
+        self._last_recorded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def should_record(self, key):
+        """Returns whether to record an access for a key now
+
+        :arg str key: the cache key
+
+        :returns: bool
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            last_recorded = self._last_recorded.get(key)
+            if last_recorded is not None and now - last_recorded < self.interval:
+                return False
+
+            self._set(key, now)
+            return True
+
+    def recorded(self, key):
+        """Notes that an access for a key was recorded some other way
+
+        :arg str key: the cache key
+
+        """
+        with self._lock:
+            self._set(key, time.monotonic())
+
+    def _set(self, key, now):
+        self._last_recorded[key] = now
+        self._last_recorded.move_to_end(key, last=True)
+        while len(self._last_recorded) > self.max_items:
+            self._last_recorded.popitem(last=False)
+
+    def forget(self, key):
+        """Forgets when the access for a key was last recorded
+
+        :arg str key: the cache key
+
+        """
+        with self._lock:
+            self._last_recorded.pop(key, None)
+
+
+BAD_KEY_CHARS = re.compile(r"[^A-Za-z0-9._/-]")
+
+
+def sanitize_key(key):
+    """Sanitize a cache key so it's safe to use as a relative file path.
+
+    :arg str key: cache key
+
+    :returns: sanitized key as a str
+
+    """
+    # NOTE(willkg): we want to make sure we sanitize the file path in a way that
+    # doesn't allow two different valid keys to end up as the same file.
+
+    # Remove / and . at the beginning
+    key = key.lstrip("/.")
+
+    # Replace all non-good characters with _
+    return BAD_KEY_CHARS.sub("_", key)
+
+
 class DiskCache:
-    """Disk cache of msgpack data files
+    """Disk cache of symcache and msgpack data files
 
     NOTE(willkg): This sets and checks the cache--it doesn't do any cleanup. The Disk
     Cache Manager watches the disk and enforces a max size by evicting least recently
@@ -38,15 +191,24 @@ class DiskCache:
 
     """
 
-    BAD_CHARS = re.compile(r"[^A-Za-z0-9._/-]")
-
-    def __init__(self, cachedir, tmpdir):
+    def __init__(self, cachedir, tmpdir, compressor=None, second_tier=None):
         """
         :arg Path cachedir: location for cache--should already exist
         :arg Path tmpdir: location for temporary files
+        :arg compressor: compressor from ``eliot.libcompression`` to compress
+            symcaches with or None to store them uncompressed; entries are read
+            regardless of how they were stored
+        :arg SecondTierCache second_tier: cache shared between nodes to check for
+            symcaches that aren't on disk and to publish new symcaches to; None to
+            only use the disk
         """
         self.cachedir = cachedir
         self.tmpdir = tmpdir
+        self.compressor = compressor
+        self.second_tier = second_tier
+
+        self._publish_lock = threading.Lock()
+        self._publish_executor = None
 
     def key_to_filepath(self, key):
         """Sanitize a key and convert to a filepath.
@@ -56,16 +218,7 @@ class DiskCache:
         :returns: sanitized Path
 
         """
-        # NOTE(willkg): we want to make sure we sanitize the file path in a way that
-        # doesn't allow two different valid keys to end up as the same file.
-
-        # Remove / and . at the beginning
-        key = key.lstrip("/.")
-
-        # Replace all non-good characters with _
-        key = self.BAD_CHARS.sub("_", key)
-
-        filepath = self.cachedir / Path(key)
+        filepath = self.cachedir / Path(sanitize_key(key))
         return filepath
 
     def __contains__(self, key):
@@ -85,6 +238,24 @@ class DiskCache:
         filepath = self.key_to_filepath(key)
         return filepath.exists()
 
+    def touch(self, key):
+        """Records an access to the file for a key without reading all of it
+
+        See ``record_access``.
+
+        :arg str key: the cache key
+
+        """
+        filepath = self.key_to_filepath(key)
+        try:
+            fd = os.open(filepath, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            record_access(fd)
+        finally:
+            os.close(fd)
+
     def read_from_file(self, filepath):
         """Reads data from a file
 
@@ -104,32 +275,153 @@ class DiskCache:
 
             return msgpack.unpackb(data)
 
-        except (OSError, msgpack.exceptions.ExtraData) as exc:
+        except (
+            OSError,
+            ValueError,
+            msgpack.exceptions.ExtraData,
+            msgpack.exceptions.UnpackException,
+        ) as exc:
+            # NOTE(willkg): Truncated or corrupt data raises ValueError or a subclass
+            # like msgpack.exceptions.FormatError
             raise CacheReadError(f"can't read {filepath} from cache") from exc
 
-    def write_to_file(self, filepath, data):
-        """Write data to a file
+    def read_symcache_trailer(self, fp):
+        """Reads the metadata trailer of a symcache file
+
+        :arg fp: the symcache file opened in binary mode
+
+        :returns: ``(symcache_size, metadata)`` or None if the file isn't in the
+            symcache format
+
+        :raises OSError: if there's a problem reading the file
+        :raises ValueError: if the metadata is malformed
+
+        """
+        file_size = fp.seek(0, 2)
+        trailer_start = file_size - SYMCACHE_TRAILER.size
+        if trailer_start < 0:
+            return None
+
+        fp.seek(trailer_start)
+        metadata_size, magic = SYMCACHE_TRAILER.unpack(fp.read(SYMCACHE_TRAILER.size))
+        if magic != SYMCACHE_MAGIC:
+            return None
+
+        symcache_size = trailer_start - metadata_size
+        fp.seek(symcache_size)
+        metadata = msgpack.unpackb(fp.read(metadata_size))
+        return symcache_size, metadata
+
+    def read_symcache_from_file(self, filepath):
+        """Reads a symcache from a file
+
+        Uncompressed symcache files written by ``write_symcache_to_file`` are opened
+        with mmap so the symcache isn't copied into memory. Compressed symcache files
+        and legacy msgpack-encoded files are read and converted.
+
+        :arg Path filepath: the file to read from
+
+        :returns: dict with "symcache", "filename", and "size" keys
+
+        :raises CacheReadError: if there's a problem reading from the cache file
+            or converting it to a symcache
+
+        """
+        try:
+            with filepath.open("rb") as fp:
+                trailer = self.read_symcache_trailer(fp)
+                if trailer is not None:
+                    symcache_size, metadata = trailer
+                    if "compression" in metadata:
+                        fp.seek(0)
+                        symcache_data = self.decompress(
+                            metadata["compression"], fp.read(symcache_size)
+                        )
+                        return {
+                            "symcache": bytes_to_symcache(symcache_data),
+                            "filename": metadata["filename"],
+                            "size": metadata["size"],
+                        }
+
+                    symcache = open_symcache(filepath)
+                    return {
+                        "symcache": symcache,
+                        "filename": metadata["filename"],
+                        "size": symcache_size,
+                    }
+
+                # This is a legacy msgpack-encoded file
+                fp.seek(0)
+                data = msgpack.unpackb(fp.read())
+
+            return {
+                "symcache": bytes_to_symcache(data["symcache"]),
+                "filename": data["filename"],
+                "size": len(data["symcache"]),
+            }
+
+        except (
+            OSError,
+            KeyError,
+            ValueError,
+            CompressionError,
+            msgpack.exceptions.ExtraData,
+            symbolic.SymbolicError,
+        ) as exc:
+            raise CacheReadError(f"can't read {filepath} from cache") from exc
+
+    def decompress(self, compression, data):
+        """Decompresses a compressed symcache
+
+        :arg str compression: the name of the compressor it was compressed with
+        :arg bytes data: the compressed data
+
+        :returns: bytes
+
+        :raises ValueError: if the compressor is unknown or unavailable
+        :raises CompressionError: if the data can't be decompressed
 
-        This converts the data to msgpack then saves it to disk. It tries to account for
-        race conditions between reads and writes by writing to a temporary file and then
-        renaming it.
+        """
+        if self.compressor is not None and self.compressor.name == compression:
+            compressor = self.compressor
+        else:
+            compressor = get_compressor(compression)
+
+        start_time = time.perf_counter()
+        symcache_data = compressor.decompress(data)
+        delta = (time.perf_counter() - start_time) * 1000.0
+        METRICS.histogram(
+            "diskcache.decompress", value=delta, tags=[f"compression:{compression}"]
+        )
+        return symcache_data
+
+    def _write_atomically(self, filepath, parts, cost=None):
+        """Write parts to a file
+
+        This tries to account for race conditions between reads and writes by writing
+        to a temporary file and then renaming it.
 
         :arg Path filepath: the file to write to
-        :arg dict data: the data to write
+        :arg list parts: list of bytes-like objects to write in order
+        :arg float cost: how long it took to build the data in seconds or None
 
         :returns: True if successful, False if there was a problem
 
         """
-        # Pack the data into a single blob
-        data = msgpack.packb(data)
-
         # Save the file to a temp file and then rename that so as to avoid race
         # conditions.
         try:
             temp_fp = tempfile.NamedTemporaryFile(
                 mode="w+b", suffix=".sym", dir=self.tmpdir, delete=False
             )
-            temp_fp.write(data)
+            for part in parts:
+                temp_fp.write(part)
+            if cost is not None:
+                try:
+                    os.setxattr(temp_fp.fileno(), COST_XATTR, f"{cost:.6f}".encode())
+                except OSError:
+                    # The filesystem doesn't support extended attributes
+                    pass
             temp_fp.close()
 
             filepath.parent.mkdir(parents=True, exist_ok=True)
@@ -140,6 +432,64 @@ class DiskCache:
             LOGGER.exception("Exception when writing to disk cache")
             return False
 
+    def write_to_file(self, filepath, data):
+        """Write data to a file
+
+        This converts the data to msgpack then saves it to disk.
+
+        :arg Path filepath: the file to write to
+        :arg dict data: the data to write
+
+        :returns: True if successful, False if there was a problem
+
+        """
+        # Pack the data into a single blob
+        data = msgpack.packb(data)
+        return self._write_atomically(filepath, [data])
+
+    def write_symcache_to_file(self, filepath, symcache_data, filename):
+        """Write a symcache to a file
+
+        :arg Path filepath: the file to write to
+        :arg bytes symcache_data: the symcache as bytes
+        :arg str filename: the module filename
+
+        :returns: True if successful, False if there was a problem
+
+        """
+        parts = self.build_symcache_file_parts(symcache_data, filename)
+        return self._write_atomically(filepath, parts)
+
+    def build_symcache_file_parts(self, symcache_data, filename):
+        """Builds the contents of a symcache file
+
+        This is the symcache bytes followed by a metadata trailer. If there's no
+        compressor, the raw symcache bytes are used so that the symcache can be
+        mmapped when it's read.
+
+        :arg bytes symcache_data: the symcache as bytes
+        :arg str filename: the module filename
+
+        :returns: list of bytes-like objects that make up the file in order
+
+        """
+        metadata = {"filename": filename}
+        if self.compressor is not None:
+            size = len(symcache_data)
+            symcache_data = self.compressor.compress(symcache_data)
+            metadata["compression"] = self.compressor.name
+            metadata["size"] = size
+            if symcache_data:
+                METRICS.histogram(
+                    "diskcache.compression_ratio",
+                    value=size / len(symcache_data),
+                    tags=[f"compression:{self.compressor.name}"],
+                )
+
+        metadata = msgpack.packb(metadata)
+        trailer = SYMCACHE_TRAILER.pack(len(metadata), SYMCACHE_MAGIC)
+        return [symcache_data, metadata, trailer]
+
     def get(self, key, default=NO_DEFAULT):
         """Retrieve contents for a given key.
 
@@ -196,3 +546,1079 @@ class DiskCache:
 
         delta = (time.perf_counter() - start_time) * 1000.0
         METRICS.histogram("diskcache.set", value=delta, tags=["result:" + result])
+
+    def get_symcache(self, key, default=NO_DEFAULT):
+        """Retrieve symcache for a given key.
+
+        If the symcache isn't on disk and there's a second tier cache, this gets it
+        from the second tier cache and saves it to disk.
+
+        :arg str key: the key to retrieve for
+        :arg default: the default to return if there's no key; otherwise this
+            raises a KeyError
+
+        :returns: dict with "symcache", "filename", and "size" keys
+
+        :raises KeyError: if there's no key or there's an error when reading from
+            cache and no default is given
+
+        """
+        error = False
+        start_time = time.perf_counter()
+        filepath = self.key_to_filepath(key)
+        if filepath.is_file():
+            try:
+                data = self.read_symcache_from_file(filepath)
+
+                delta = (time.perf_counter() - start_time) * 1000.0
+                METRICS.histogram("diskcache.get", value=delta, tags=["result:hit"])
+                return data
+            except CacheReadError:
+                error = True
+                LOGGER.exception("Cache error on read")
+
+        delta = (time.perf_counter() - start_time) * 1000.0
+        METRICS.histogram(
+            "diskcache.get",
+            value=delta,
+            tags=["result:" + ("error" if error else "miss")],
+        )
+
+        if self.second_tier is not None and not error:
+            data = self.get_symcache_from_second_tier(key, filepath)
+            if data is not None:
+                return data
+
+        if default != NO_DEFAULT:
+            return default
+        raise KeyError(f"key {filepath!r} not in cache")
+
+    def get_symcache_from_second_tier(self, key, filepath):
+        """Gets a symcache file from the second tier cache and saves it to disk.
+
+        :arg str key: the key to retrieve for
+        :arg Path filepath: the file to save it to
+
+        :returns: dict with "symcache", "filename", and "size" keys or None if it's
+            not in the second tier cache or there was a problem
+
+        """
+        file_data = self.second_tier.get(key)
+        if file_data is None:
+            return None
+
+        if not self._write_atomically(filepath, [file_data]):
+            return None
+
+        try:
+            return self.read_symcache_from_file(filepath)
+        except CacheReadError:
+            LOGGER.exception("Cache error on read from second tier")
+            filepath.unlink(missing_ok=True)
+            return None
+
+    def _get_publish_executor(self):
+        with self._publish_lock:
+            if self._publish_executor is None:
+                self._publish_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="eliot-second-tier"
+                )
+            return self._publish_executor
+
+    def publish_to_second_tier(self, key, filepath):
+        """Publishes a symcache file to the second tier cache in the background
+
+        The file is sent from disk, so it isn't held in memory.
+
+        :arg str key: the key to set
+        :arg Path filepath: the symcache file
+
+        :returns: Future for the result of ``SecondTierCache.set_from_file``
+
+        """
+        return self._get_publish_executor().submit(
+            self.second_tier.set_from_file, key, filepath
+        )
+
+    def close(self):
+        """Waits for symcaches to be published to the second tier cache"""
+        with self._publish_lock:
+            executor, self._publish_executor = self._publish_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def set_symcache(self, key, symcache_data, filename, cost=None):
+        """Set symcache for a given key.
+
+        If there's a second tier cache, this publishes the file to it in the
+        background, too. See ``publish_to_second_tier``.
+
+        This will log and emit metrics on OSError and IOError.
+
+        :arg str key: the key to set
+        :arg bytes symcache_data: the symcache as bytes
+        :arg str filename: the module filename
+        :arg float cost: how long it took to download and parse the sym file in
+            seconds or None
+
+        """
+        start_time = time.perf_counter()
+        filepath = self.key_to_filepath(key)
+
+        parts = self.build_symcache_file_parts(symcache_data, filename)
+        ret = self._write_atomically(filepath, parts, cost=cost)
+        result = "success" if ret else "fail"
+
+        delta = (time.perf_counter() - start_time) * 1000.0
+        METRICS.histogram("diskcache.set", value=delta, tags=["result:" + result])
+
+        if self.second_tier is not None and ret:
+            self.publish_to_second_tier(key, filepath)
+
+
+class SecondTierCache:
+    """Defines a second tier cache
+
+    A second tier cache holds symcache files shared between nodes. The DiskCache
+    checks it when a symcache isn't on disk and publishes new symcaches to it. That
+    way a new node can get symcaches that other nodes already built rather than
+    downloading and parsing the sym files again.
+
+    Values are the contents of symcache files as written by the DiskCache.
+
+    Errors are logged and treated as misses--the second tier cache is an
+    optimization and shouldn't fail symbolication.
+
+    """
+
+    name = "base"
+
+    # Exceptions that are treated as cache errors
+    errors = (OSError,)
+
+    def get_data(self, key):
+        """Retrieve data for a given key.
+
+        :arg str key: the key to retrieve for
+
+        :returns: bytes or None if there's no key
+
+        """
+        raise NotImplementedError
+
+    def set_data(self, key, data):
+        """Set data for a given key.
+
+        :arg str key: the key to set
+        :arg bytes data: the data to save; this can be a bytes-like object
+
+        """
+        raise NotImplementedError
+
+    def set_data_from_file(self, key, path):
+        """Set data for a given key to the contents of a file.
+
+        The file is mmapped and passed to ``set_data`` as a ``memoryview``, so it
+        isn't read into memory.
+
+        NOTE(willkg): Reading the file with read() would generate IN_ACCESS events
+        that the disk cache manager counts as cache hits; mmapping it doesn't.
+
+        :arg str key: the key to set
+        :arg Path path: the file to save
+
+        """
+        with open(path, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                # Empty files can't be mmapped
+                self.set_data(key, b"")
+                return
+
+            with (
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+                memoryview(mapped) as data,
+            ):
+                self.set_data(key, data)
+
+    def get(self, key):
+        """Retrieve data for a given key.
+
+        :arg str key: the key to retrieve for
+
+        :returns: bytes or None if there's no key or there was an error
+
+        """
+        start_time = time.perf_counter()
+        try:
+            data = self.get_data(key)
+            result = "miss" if data is None else "hit"
+        except self.errors:
+            LOGGER.exception("Second tier cache error on get")
+            data = None
+            result = "error"
+
+        delta = (time.perf_counter() - start_time) * 1000.0
+        METRICS.histogram(
+            "secondtiercache.get",
+            value=delta,
+            tags=[f"backend:{self.name}", f"result:{result}"],
+        )
+        return data
+
+    def set(self, key, data):
+        """Set data for a given key.
+
+        :arg str key: the key to set
+        :arg bytes data: the data to save
+
+        :returns: True if successful, False if there was a problem
+
+        """
+        return self._set(self.set_data, key, data)
+
+    def set_from_file(self, key, path):
+        """Set data for a given key to the contents of a file.
+
+        :arg str key: the key to set
+        :arg Path path: the file to save
+
+        :returns: True if successful, False if there was a problem
+
+        """
+        return self._set(self.set_data_from_file, key, path)
+
+    def _set(self, setter, key, value):
+        start_time = time.perf_counter()
+        try:
+            setter(key, value)
+            result = "success"
+        except self.errors:
+            LOGGER.exception("Second tier cache error on set")
+            result = "fail"
+
+        delta = (time.perf_counter() - start_time) * 1000.0
+        METRICS.histogram(
+            "secondtiercache.set",
+            value=delta,
+            tags=[f"backend:{self.name}", f"result:{result}"],
+        )
+        return result == "success"
+
+
+class DirectorySecondTierCache(SecondTierCache):
+    """Second tier cache in a directory shared between nodes like an NFS mount
+
+    NOTE(willkg): Nothing evicts files from this directory. Use something outside
+    of Eliot to expire old files.
+
+    """
+
+    name = "directory"
+
+    def __init__(self, path):
+        """
+        :arg Path path: the shared directory--should already exist
+        """
+        self.path = Path(path)
+
+    def key_to_filepath(self, key):
+        return self.path / Path(sanitize_key(key))
+
+    def get_data(self, key):
+        try:
+            return self.key_to_filepath(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def set_data(self, key, data):
+        filepath = self.key_to_filepath(key)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file in the same directory and rename it so other nodes
+        # never see a partial file; renames within a directory are atomic on NFS
+        temp_fp = tempfile.NamedTemporaryFile(
+            mode="w+b", prefix=".", suffix=".tmp", dir=filepath.parent, delete=False
+        )
+        try:
+            with temp_fp:
+                temp_fp.write(data)
+            Path(temp_fp.name).rename(filepath)
+        except OSError:
+            Path(temp_fp.name).unlink(missing_ok=True)
+            raise
+
+
+class RedisSecondTierCache(SecondTierCache):
+    """Second tier cache in Redis or a server that speaks the Redis protocol"""
+
+    name = "redis"
+
+    errors = (OSError, redis.RedisError)
+
+    KEY_PREFIX = "eliot:"
+
+    def __init__(self, url, ttl=0, timeout=5.0):
+        """
+        :arg str url: Redis url like ``redis://localhost:6379/0``
+        :arg int ttl: seconds to keep keys for; 0 to keep them until Redis evicts
+            them
+        :arg float timeout: connect and read timeout in seconds
+        """
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+        self.ttl = ttl
+
+    def get_data(self, key):
+        return self.client.get(self.KEY_PREFIX + key)
+
+    def set_data(self, key, data):
+        self.client.set(self.KEY_PREFIX + key, data, ex=self.ttl or None)
+
+
+def get_second_tier_cache(url, ttl=0):
+    """Returns a second tier cache for a url
+
+    :arg str url: ``redis://``, ``rediss://``, or ``unix://`` url for a Redis
+        second tier cache, ``file://`` url or absolute path for a directory second
+        tier cache, or "" for no second tier cache
+    :arg int ttl: seconds to keep keys for in Redis; 0 to keep them until Redis
+        evicts them
+
+    :returns: SecondTierCache instance or None
+
+    :raises ValueError: if the url isn't supported
+
+    """
+    if not url:
+        return None
+
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSecondTierCache(url, ttl=ttl)
+
+    if url.startswith("file://"):
+        url = url[len("file://") :]
+
+    if url.startswith("/"):
+        return DirectorySecondTierCache(Path(url))
+
+    raise ValueError(f"unsupported second tier cache url {url!r}")
+
+
+class MemoryCache:
+    """In-process LRU cache of live objects with a byte budget
+
+    This sits in front of the DiskCache so that hot modules don't have to be read
+    from disk and converted to symcache instances on every request. Each webapp
+    process has its own MemoryCache.
+
+    Items are stored with the size of the data they were built from. When adding an
+    item pushes the total size over ``max_size``, least recently used items are
+    evicted until it fits.
+
+    This is thread-safe.
+
+    """
+
+    def __init__(self, max_size):
+        """
+        :arg int max_size: maximum total size in bytes of items in the cache; 0
+            disables the cache
+        """
+        self.max_size = max_size
+        self.total_size = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def __contains__(self, key):
+        return key in self._lru
+
+    def get(self, key, default=None):
+        """Retrieve item for a given key and mark it as recently used.
+
+        :arg str key: the key to retrieve for
+        :arg default: the default to return if there's no key
+
+        :returns: the item or default
+
+        """
+        with self._lock:
+            try:
+                value, _ = self._lru[key]
+                self._lru.move_to_end(key, last=True)
+            except KeyError:
+                value = default
+                hit = False
+            else:
+                hit = True
+
+        METRICS.incr("memorycache.get", tags=["result:" + ("hit" if hit else "miss")])
+        return value
+
+    def set(self, key, value, size):
+        """Set item for a given key.
+
+        Items larger than ``max_size`` are not cached.
+
+        :arg str key: the key to set
+        :arg value: the item to store
+        :arg int size: the size of the item in bytes
+
+        """
+        if size > self.max_size:
+            return
+
+        evicted = 0
+        with self._lock:
+            if key in self._lru:
+                _, old_size = self._lru.pop(key)
+                self.total_size -= old_size
+
+            while self._lru and self.total_size + size > self.max_size:
+                _, (_, rm_size) = self._lru.popitem(last=False)
+                self.total_size -= rm_size
+                evicted += 1
+
+            self._lru[key] = (value, size)
+            self.total_size += size
+            total_size = self.total_size
+
+        if evicted:
+            METRICS.incr("memorycache.evict", value=evicted)
+        METRICS.gauge("memorycache.usage", value=total_size)
+
+
+class SharedSymcacheCache:
+    """Node-level cache of symcaches shared between webapp processes
+
+    Symcache files in the DiskCache are mmapped read-only, so every process on the
+    node that maps the same file shares the same page cache pages. A large symcache
+    is in memory once no matter how many webapp processes are using it. This keeps
+    a per-process LRU index of mapped symcache files so hot modules don't have to be
+    opened again on every request, and publishes newly parsed symcaches to the disk
+    cache and maps them rather than holding on to a private copy.
+
+    Eviction is reference-safe. The Disk Cache Manager evicts a file by unlinking it
+    and a mapping of an unlinked file stays valid until it's closed, so requests
+    using the symcache aren't affected. Each entry holds the file open and ``get``
+    drops entries whose file was unlinked or replaced. That way the disk space is
+    freed once every process has let go of the mapping.
+
+    Items are limited by count rather than size since the mapped pages belong to the
+    page cache and not to any one process.
+
+    Using a mapped symcache doesn't read the file, so hits record an access at most
+    every ``access_interval`` seconds. Otherwise the Disk Cache Manager would see the
+    hottest files as unused and evict them first.
+
+    This is thread-safe.
+
+    """
+
+    def __init__(self, diskcache, max_items, access_interval=ACCESS_INTERVAL):
+        """
+        :arg DiskCache diskcache: the disk cache holding the symcache files
+        :arg int max_items: maximum number of symcache files to keep mapped
+        :arg float access_interval: minimum seconds between recording accesses
+            to a mapped symcache file
+        """
+        self.diskcache = diskcache
+        self.max_items = max_items
+        self.access_throttle = AccessThrottle(interval=access_interval)
+        self.total_size = 0
+        # key -> (symcache, filename, size, fp)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def __contains__(self, key):
+        return key in self._lru
+
+    def _open(self, key):
+        """Maps the symcache file for a key.
+
+        :arg str key: the cache key
+
+        :returns: ``(symcache, filename, size, fp)`` or None if the file doesn't
+            exist, isn't in the symcache format, or was replaced while opening it
+
+        """
+        filepath = self.diskcache.key_to_filepath(key)
+        try:
+            fp = filepath.open("rb")
+        except FileNotFoundError:
+            return None
+
+        try:
+            trailer = self.diskcache.read_symcache_trailer(fp)
+            if trailer is None or "compression" in trailer[1]:
+                # Legacy and compressed files can't be mapped
+                fp.close()
+                return None
+
+            symcache_size, metadata = trailer
+            symcache = open_symcache(filepath)
+
+            # NOTE(willkg): The file could have been replaced between opening it and
+            # mapping it. If the file we have open isn't the file at that path now,
+            # we can't tell which file got mapped, so skip it.
+            if os.fstat(fp.fileno()).st_ino != os.stat(filepath).st_ino:
+                fp.close()
+                return None
+
+        except (
+            OSError,
+            KeyError,
+            ValueError,
+            msgpack.exceptions.ExtraData,
+            symbolic.SymbolicError,
+        ):
+            LOGGER.exception("Shared cache error on open")
+            fp.close()
+            return None
+
+        return symcache, metadata["filename"], symcache_size, fp
+
+    def _is_stale(self, fp):
+        """Returns whether the file for an entry was unlinked or replaced"""
+        try:
+            return os.fstat(fp.fileno()).st_nlink == 0
+        except OSError:
+            return True
+
+    def _remove(self, key):
+        """Removes an entry; the lock must be held"""
+        _, _, size, fp = self._lru.pop(key)
+        self.total_size -= size
+        self.access_throttle.forget(key)
+        fp.close()
+
+    def get(self, key, default=None):
+        """Retrieve symcache for a given key and mark it as recently used.
+
+        If the symcache isn't mapped yet, this maps the symcache file from the disk
+        cache.
+
+        :arg str key: the key to retrieve for
+        :arg default: the default to return if there's no key
+
+        :returns: ``(symcache, filename)`` or default
+
+        """
+        stale = False
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if self._is_stale(entry[3]):
+                    self._remove(key)
+                    entry = None
+                    stale = True
+                else:
+                    self._lru.move_to_end(key, last=True)
+                    if self.access_throttle.should_record(key):
+                        record_access(entry[3].fileno())
+
+        if stale:
+            METRICS.incr("sharedcache.evict", tags=["reason:stale"])
+
+        if entry is not None:
+            METRICS.incr("sharedcache.get", tags=["result:hit"])
+            return entry[0], entry[1]
+
+        entry = self._open(key)
+        if entry is None:
+            METRICS.incr("sharedcache.get", tags=["result:miss"])
+            return default
+
+        METRICS.incr("sharedcache.get", tags=["result:mapped"])
+        self._add(key, entry)
+        return entry[0], entry[1]
+
+    def _add(self, key, entry):
+        """Adds an entry evicting least recently used entries to make room"""
+        evicted = 0
+        with self._lock:
+            if key in self._lru:
+                self._remove(key)
+
+            while self._lru and len(self._lru) >= self.max_items:
+                self._remove(next(iter(self._lru)))
+                evicted += 1
+
+            self._lru[key] = entry
+            self.total_size += entry[2]
+            total_size = self.total_size
+            # Opening the file read the trailer which was recorded as an access
+            self.access_throttle.recorded(key)
+
+        if evicted:
+            METRICS.incr("sharedcache.evict", value=evicted, tags=["reason:lru"])
+        METRICS.gauge("sharedcache.usage", value=total_size)
+
+    def publish(self, key, symcache_data, filename, cost=None):
+        """Publishes a symcache so other processes can map it and maps it.
+
+        This writes the symcache to the disk cache and then maps the file.
+
+        :arg str key: the key to set
+        :arg bytes symcache_data: the symcache as bytes
+        :arg str filename: the module filename
+        :arg float cost: how long it took to download and parse the sym file in
+            seconds or None
+
+        :returns: ``(symcache, filename)`` for the mapped symcache or None if it
+            couldn't be published
+
+        """
+        self.diskcache.set_symcache(key, symcache_data, filename, cost=cost)
+
+        entry = self._open(key)
+        if entry is None:
+            return None
+
+        self._add(key, entry)
+        return entry[0], entry[1]
+
+    def close(self):
+        """Closes all the mapped symcache files."""
+        with self._lock:
+            for key in list(self._lru):
+                self._remove(key)
+
+
+class LookupCache:
+    """In-process LRU cache of symbol lookup results
+
+    The same addresses in hot modules get symbolicated over and over in separate
+    requests. This caches the results of symcache lookups keyed by ``(debug_filename,
+    debug_id, module_offset)`` so repeat addresses cost a dict lookup instead of a
+    symcache lookup.
+
+    Values are whatever the caller stores--including None for addresses that have no
+    symbol information. Gets and sets work on a batch of offsets for a single module
+    and emit one set of metrics per batch.
+
+    This is thread-safe.
+
+    """
+
+    def __init__(self, max_items):
+        """
+        :arg int max_items: maximum number of lookup results to keep
+        """
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def get_many(self, module_info, module_offsets):
+        """Retrieve lookup results for offsets in a module and mark them as recently
+        used.
+
+        :arg tuple module_info: ``(debug_filename, debug_id)`` of the module
+        :arg list module_offsets: the offsets to retrieve lookup results for
+
+        :returns: dict of module_offset -> value for offsets that are in the cache
+
+        """
+        debug_filename, debug_id = module_info
+        hits = {}
+        with self._lock:
+            for module_offset in module_offsets:
+                key = (debug_filename, debug_id, module_offset)
+                try:
+                    hits[module_offset] = self._lru[key]
+                except KeyError:
+                    continue
+                self._lru.move_to_end(key, last=True)
+
+        if hits:
+            METRICS.incr("lookupcache.get", value=len(hits), tags=["result:hit"])
+        if len(module_offsets) > len(hits):
+            METRICS.incr(
+                "lookupcache.get",
+                value=len(module_offsets) - len(hits),
+                tags=["result:miss"],
+            )
+        return hits
+
+    def set_many(self, module_info, items):
+        """Set lookup results for offsets in a module.
+
+        :arg tuple module_info: ``(debug_filename, debug_id)`` of the module
+        :arg dict items: dict of module_offset -> value
+
+        """
+        if not items:
+            return
+
+        debug_filename, debug_id = module_info
+        evicted = 0
+        with self._lock:
+            for module_offset, value in items.items():
+                self._lru[(debug_filename, debug_id, module_offset)] = value
+
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+                evicted += 1
+
+        if evicted:
+            METRICS.incr("lookupcache.evict", value=evicted)
+
+
+class NegativeCache:
+    """Cache of modules whose sym files couldn't be downloaded
+
+    Many modules in crash reports are third-party libraries that we'll never have
+    sym files for. This remembers that so we don't spend request time asking every
+    symbols source for them again.
+
+    Entries expire after a TTL. Modules that weren't found (HTTP 404 everywhere) use
+    ``ttl``. Modules that couldn't be downloaded because of some possibly transient
+    error use the shorter ``error_ttl``.
+
+    Entries are kept in memory. If a DiskCache is given, they're also stored on disk
+    so other processes on the node can use them.
+
+    This is thread-safe.
+
+    """
+
+    NOT_FOUND = "not_found"
+    ERROR = "error"
+
+    # Suffix for negative cache entry keys in the DiskCache
+    DISK_KEY_SUFFIX = ".missing"
+
+    def __init__(self, ttl, error_ttl, max_items=100_000, diskcache=None):
+        """
+        :arg int ttl: seconds to remember modules that weren't found
+        :arg int error_ttl: seconds to remember modules that couldn't be downloaded
+            because of an error; 0 doesn't remember them
+        :arg int max_items: maximum number of entries to keep in memory
+        :arg DiskCache diskcache: DiskCache to store entries in or None
+        """
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_items = max_items
+        self.diskcache = diskcache
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_from_memory(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            return entry
+
+    def _set_in_memory(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_items:
+                # Entries are added in order, so the first one is the oldest
+                self._entries.popitem(last=False)
+            self._entries[key] = entry
+
+    def _get_from_disk(self, key, now):
+        filepath = self.diskcache.key_to_filepath(key + self.DISK_KEY_SUFFIX)
+        if not filepath.is_file():
+            return None
+
+        try:
+            data = self.diskcache.read_from_file(filepath)
+            entry = (data["expires"], data["reason"])
+        except (CacheReadError, KeyError, TypeError):
+            LOGGER.exception("Negative cache error on read")
+            # The file is bad, so remove it so it doesn't get read again
+            with contextlib.suppress(OSError):
+                filepath.unlink()
+            return None
+
+        if entry[0] <= now:
+            # The cache manager evicts files eventually, but there's no reason to
+            # wait for that
+            with contextlib.suppress(OSError):
+                filepath.unlink()
+            return None
+
+        return entry
+
+    def get(self, key):
+        """Returns why the module for a given key is missing.
+
+        :arg str key: the cache key for the module
+
+        :returns: ``NOT_FOUND``, ``ERROR``, or None if the module isn't known to be
+            missing
+
+        """
+        now = time.time()
+        entry = self._get_from_memory(key, now)
+        if entry is None and self.diskcache is not None:
+            entry = self._get_from_disk(key, now)
+            if entry is not None:
+                self._set_in_memory(key, entry)
+
+        if entry is None:
+            METRICS.incr("negativecache.get", tags=["result:miss"])
+            return None
+
+        reason = entry[1]
+        METRICS.incr("negativecache.get", tags=["result:hit", f"reason:{reason}"])
+        return reason
+
+    def set(self, key, reason):
+        """Records that the module for a given key is missing.
+
+        :arg str key: the cache key for the module
+        :arg str reason: ``NOT_FOUND`` or ``ERROR``
+
+        """
+        ttl = self.ttl if reason == self.NOT_FOUND else self.error_ttl
+        if ttl <= 0:
+            return
+
+        expires = time.time() + ttl
+        self._set_in_memory(key, (expires, reason))
+        if self.diskcache is not None:
+            self.diskcache.write_to_file(
+                self.diskcache.key_to_filepath(key + self.DISK_KEY_SUFFIX),
+                {"expires": expires, "reason": reason},
+            )
+
+        METRICS.incr("negativecache.set", tags=[f"reason:{reason}"])
+
+
+class SingleFlight:
+    """Coordinates work on a key so only one thread or process does it at a time
+
+    This is used so that when many requests miss the cache for the same module at
+    the same time, only one of them downloads and parses the sym file. The others
+    wait and then read the result from the cache.
+
+    Within a process, this uses a map of key -> lock for threads and a map of key
+    -> ``asyncio.Lock`` for coroutines. Across processes on the same node and
+    between threads and coroutines, this uses ``flock`` on a lock file for the key
+    in ``lockdir``.
+
+    """
+
+    # Maximum number of threads waiting for lock files for coroutines; there's at
+    # most one per key
+    MAX_ASYNC_WAITERS = 16
+
+    def __init__(self, lockdir):
+        """
+        :arg Path lockdir: location for lock files--should already exist and should
+            not be watched by the disk cache manager
+        """
+        self.lockdir = lockdir
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._async_locks = {}
+        self._executor = None
+
+    def key_to_lockpath(self, key):
+        """Convert a key to a lock file path.
+
+        :arg str key: the key
+
+        :returns: Path
+
+        """
+        return self.lockdir / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+
+    @contextlib.contextmanager
+    def _thread_lock(self, key):
+        with self._locks_lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        lock = entry[0]
+        try:
+            waited = not lock.acquire(blocking=False)
+            if waited:
+                lock.acquire()
+            try:
+                yield waited
+            finally:
+                lock.release()
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def _acquire_file_lock(self, key, blocking=True):
+        """Locks the lock file for a key
+
+        :arg str key: the key
+        :arg bool blocking: whether to wait for the lock
+
+        :returns: ``(fd, waited)`` or None if blocking is False and the lock is held
+
+        """
+        lockpath = self.key_to_lockpath(key)
+        waited = False
+        while True:
+            fd = os.open(lockpath, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if not blocking:
+                    os.close(fd)
+                    return None
+                waited = True
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+            # The holder removes the lock file before releasing the lock, so if the
+            # file we locked isn't the one at lockpath anymore, try again
+            try:
+                is_current = os.stat(lockpath).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                is_current = False
+
+            if is_current:
+                return fd, waited
+            os.close(fd)
+
+    def _release_file_lock(self, key, fd):
+        """Removes the lock file for a key and unlocks it; this doesn't block"""
+        lockpath = self.key_to_lockpath(key)
+        try:
+            os.remove(lockpath)
+        except OSError:
+            LOGGER.exception("Exception when removing lock file %s", lockpath)
+        os.close(fd)
+
+    @contextlib.contextmanager
+    def _file_lock(self, key):
+        fd, waited = self._acquire_file_lock(key)
+        try:
+            yield waited
+        finally:
+            self._release_file_lock(key, fd)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.MAX_ASYNC_WAITERS,
+                thread_name_prefix="eliot-singleflight",
+            )
+        return self._executor
+
+    async def _acquire_file_lock_async(self, key):
+        # Try without blocking first so the common case doesn't need a thread
+        ret = self._acquire_file_lock(key, blocking=False)
+        if ret is not None:
+            return ret
+
+        loop = asyncio.get_running_loop()
+        acquire = loop.run_in_executor(
+            self._get_executor(), self._acquire_file_lock, key
+        )
+        try:
+            fd, _ = await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+
+            def _release_when_acquired(future):
+                if not future.cancelled() and future.exception() is None:
+                    self._release_file_lock(key, future.result()[0])
+
+            acquire.add_done_callback(_release_when_acquired)
+            raise
+        return fd, True
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Acquire the lock for a key.
+
+        Usage::
+
+            with singleflight.lock(key) as waited:
+                if waited:
+                    # someone else did the work, so check for the result
+                    ...
+
+        :arg str key: the key to lock
+
+        :returns: context manager yielding whether or not we had to wait for another
+            thread or process to release the lock
+
+        """
+        start_time = time.perf_counter()
+        with self._thread_lock(key) as thread_waited:
+            with self._file_lock(key) as file_waited:
+                waited = thread_waited or file_waited
+                if waited:
+                    delta = (time.perf_counter() - start_time) * 1000.0
+                    METRICS.histogram("singleflight.wait", value=delta)
+                yield waited
+
+    @contextlib.asynccontextmanager
+    async def lock_async(self, key):
+        """Acquire the lock for a key from a coroutine.
+
+        Coroutines in this process wait for each other with an ``asyncio.Lock``, so
+        there's at most one coroutine per key waiting for the lock file. That wait
+        blocks, so it happens in a thread pool that's only used for that. If the
+        coroutine is cancelled while waiting, the thread still gets the lock, so
+        it's released as soon as it's acquired. Releasing doesn't block, so it
+        happens on the event loop.
+
+        Usage::
+
+            async with singleflight.lock_async(key) as waited:
+                ...
+
+        :arg str key: the key to lock
+
+        :returns: async context manager yielding whether or not we had to wait for
+            another thread or process to release the lock
+
+        """
+        start_time = time.perf_counter()
+        entry = self._async_locks.get(key)
+        if entry is None:
+            entry = self._async_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        lock = entry[0]
+        try:
+            task_waited = lock.locked()
+            async with lock:
+                fd, file_waited = await self._acquire_file_lock_async(key)
+                try:
+                    waited = task_waited or file_waited
+                    if waited:
+                        delta = (time.perf_counter() - start_time) * 1000.0
+                        METRICS.histogram("singleflight.wait", value=delta)
+                    yield waited
+                finally:
+                    self._release_file_lock(key, fd)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._async_locks[key]
+
+    def close(self):
+        """Shuts down the thread pool used to wait for lock files for coroutines"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
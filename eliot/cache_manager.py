@@ -6,8 +6,9 @@
 This defines the DiskCacheManager application. It's designed to run as
 a standalone application separate from the rest of Eliot which is a webapp.
 
-It keeps track of files in a directory and evicts files least recently
-used in order to keep the total size under a max number.
+It keeps track of files in a directory and evicts files in order to keep the
+total size under a max number. Which files get evicted is up to the eviction
+policy. The default policy evicts files least recently used.
 
 It uses inotify to cheaply watch the files.
 
@@ -19,12 +20,23 @@ To run::
 
 """
 
-from collections import OrderedDict
+from collections import deque, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import fcntl
+import heapq
+import itertools
 import logging
 import os
 import pathlib
+import queue
+import signal
 import socket
+import struct
 import sys
+import tempfile
+import termios
+import threading
+import time
 import traceback
 
 from boltons.dictutils import OneToOne
@@ -35,6 +47,9 @@ from fillmore.scrubber import Scrubber, SCRUB_RULES_DEFAULT
 from inotify_simple import INotify, flags
 
 from eliot.app import build_config_manager
+from eliot.cache import get_cost
+from eliot.cache_status import DEFAULT_TOP_N, parse_address, StatusServer
+from eliot.eviction import parse_eviction_policy
 from eliot.libdockerflow import get_release_name
 from eliot.liblogging import set_up_logging, log_config
 from eliot.libmarkus import set_up_metrics, METRICS
@@ -50,6 +65,16 @@ LOGGER = logging.getLogger(MODULE_NAME)
 REPOROOT_DIR = str(pathlib.Path(__file__).parent.parent.parent)
 MAX_ERRORS = 10
 
+# First line of LRU snapshot files; bump the version if the format changes
+SNAPSHOT_HEADER = "eliot-lru-snapshot 1"
+
+# Compact the journal when it has more than this many entries and more entries
+# than there are files in the LRU
+JOURNAL_COMPACT_MIN_ENTRIES = 10_000
+
+# Window in seconds for eviction rates in the status
+EVICTION_RATE_WINDOW = 300
+
 
 def count_sentry_scrub_error(msg):
     METRICS.incr("sentry_scrub_error", value=1, tags=["service:cachemanager"])
@@ -82,6 +107,281 @@ def handle_exception(exctype, value, tb):
 sys.excepthook = handle_exception
 
 
+class LRUJournal:
+    """Append-only journal of changes to the LRU
+
+    Each line is an operation and a path relative to the cachedir:
+
+    * ``C <size> <path>``: the file was created or changed size and is the most
+      recently used
+    * ``A <path>``: the file was accessed and is the most recently used
+    * ``D <path>``: the file was deleted or evicted
+
+    Replaying the journal on top of the snapshot it was started after rebuilds the
+    LRU. Replaying is idempotent for LRU order, so replaying entries that are
+    already in the snapshot is fine.
+
+    """
+
+    CREATE = "C"
+    ACCESS = "A"
+    DELETE = "D"
+
+    def __init__(self, path, cachedir):
+        """
+        :arg Path path: path of the journal file
+        :arg str cachedir: the directory paths in the journal are relative to
+        """
+        self.path = path
+        self.cachedir = str(cachedir)
+        self._prefix_len = len(self.cachedir) + 1
+        self._fp = None
+        # Number of entries in the journal
+        self.entries = 0
+        # Number of bad entries skipped in the last replay
+        self.skipped = 0
+
+    def open(self):
+        """Opens the journal for appending"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = open(self.path, "a")
+
+    def close(self):
+        """Flushes and closes the journal"""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def flush(self):
+        """Flushes entries to the journal file
+
+        This doesn't fsync. Entries only need to survive the process crashing.
+
+        """
+        if self._fp is not None:
+            self._fp.flush()
+
+    def record(self, op, path, size=0):
+        """Records an operation
+
+        :arg str op: ``CREATE``, ``ACCESS``, or ``DELETE``
+        :arg str path: absolute path of the file in the cachedir
+        :arg int size: size of the file for ``CREATE``
+
+        """
+        if self._fp is None:
+            return
+
+        relpath = path[self._prefix_len :]
+        if op == self.CREATE:
+            self._fp.write(f"{op} {size} {relpath}\n")
+        else:
+            self._fp.write(f"{op} {relpath}\n")
+        self.entries += 1
+
+    def truncate(self):
+        """Removes all entries from the journal
+
+        Call this after saving a snapshot of the LRU.
+
+        """
+        if self._fp is not None:
+            # Flush first so buffered entries don't get written after truncating
+            self._fp.flush()
+            self._fp.truncate(0)
+            self._fp.seek(0)
+        else:
+            self.path.unlink(missing_ok=True)
+        self.entries = 0
+
+    def is_empty(self):
+        """Returns whether the journal file is missing or has no entries"""
+        try:
+            return self.path.stat().st_size == 0
+        except FileNotFoundError:
+            return True
+
+    def replay(self, lru):
+        """Applies the journal entries to an LRU
+
+        Entries that can't be parsed are skipped. The last entry may be partially
+        written if the process crashed.
+
+        :arg lru: ``OrderedDict`` of absolute path -> size in LRU order to apply
+            entries to
+
+        :returns: number of entries applied; ``skipped`` is set to the number of
+            bad entries that were skipped
+
+        """
+        applied = 0
+        self.skipped = 0
+        try:
+            fp = open(self.path, "r")
+        except FileNotFoundError:
+            return applied
+
+        with fp:
+            for line in fp:
+                if not line.endswith("\n"):
+                    # Partial write
+                    break
+
+                try:
+                    op, rest = line.rstrip("\n").split(" ", 1)
+                    if op == self.CREATE:
+                        size, relpath = rest.split(" ", 1)
+                        path = os.path.join(self.cachedir, relpath)
+                        lru[path] = int(size)
+                        lru.move_to_end(path, last=True)
+                    elif op == self.ACCESS:
+                        path = os.path.join(self.cachedir, rest)
+                        if path in lru:
+                            lru.move_to_end(path, last=True)
+                    elif op == self.DELETE:
+                        lru.pop(os.path.join(self.cachedir, rest), None)
+                    else:
+                        raise ValueError(f"unknown op {op!r}")
+                except ValueError:
+                    LOGGER.warning(f"skipping bad journal entry: {line!r}")
+                    self.skipped += 1
+                    continue
+
+                applied += 1
+
+        return applied
+
+
+class UnlinkWorker:
+    """Removes evicted files in a background thread
+
+    This keeps unlinking files, which can be slow when a lot of files get evicted at
+    once, off of the event loop.
+
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        # map of path -> size for files waiting to be removed
+        self._pending = {}
+        self._thread = None
+
+    @property
+    def pending_count(self):
+        """Number of files waiting to be removed"""
+        return len(self._pending)
+
+    @property
+    def pending_size(self):
+        """Total size of files waiting to be removed"""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def start(self):
+        """Starts the worker thread"""
+        self._thread = threading.Thread(
+            target=self._run, name="eliot-unlink", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Removes files that are waiting and stops the worker thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, path, size):
+        """Adds a file to remove
+
+        :arg str path: absolute path of the file
+        :arg int size: size of the file
+
+        """
+        with self._lock:
+            self._pending[path] = size
+        self._queue.put(path)
+
+    def cancel(self, path):
+        """Cancels removing a file if it hasn't been removed, yet
+
+        Call this when a new file is written to the path of an evicted file before
+        it's removed. This is best effort--the new file can still get removed if it
+        gets written while the old file is being removed.
+
+        :arg str path: absolute path of the file
+
+        :returns: True if the file was waiting to be removed
+
+        """
+        with self._lock:
+            return self._pending.pop(path, None) is not None
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+
+            with self._lock:
+                if self._pending.pop(path, None) is None:
+                    # Removing the file was cancelled
+                    continue
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                LOGGER.exception(f"error removing evicted file: {path}")
+
+
+def scan_directory(path, known=None):
+    """Scans a directory for the cache manager inventory
+
+    This uses ``os.scandir`` so file types come from the directory listing and
+    only files that aren't in ``known`` get stat'd.
+
+    :arg str path: the directory to scan
+    :arg dict known: map of path -> size for files that don't need to be stat'd
+
+    :returns: ``(subdirs, files)`` where subdirs is a list of directory paths and
+        files is a list of ``(path, size, last_used)`` tuples; last_used is None
+        for known files
+
+    """
+    known = known or {}
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+
+                    elif entry.path in known:
+                        files.append((entry.path, known[entry.path], None))
+
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        # NOTE(willkg): atime isn't updated on volumes mounted with
+                        # noatime, so use whichever is more recent
+                        last_used = max(stat.st_atime, stat.st_mtime)
+                        files.append((entry.path, stat.st_size, last_used))
+
+                except FileNotFoundError:
+                    # The file was deleted while we were scanning
+                    continue
+
+    except FileNotFoundError:
+        # The directory was deleted before we got to it
+        pass
+
+    return subdirs, files
+
+
 class DiskCacheManager:
     class Config:
         local_dev_env = Option(
@@ -124,6 +424,84 @@ class DiskCacheManager:
                 "legibility. You can use units like kb, mb, gb, and tb."
             ),
         )
+        symbols_cache_journal = Option(
+            default="True",
+            parser=bool,
+            doc=(
+                "Whether to record changes to the LRU in an append-only journal in "
+                "symbols_cache_dir between snapshots. At startup, the journal is "
+                "replayed on top of the snapshot, so the exact LRU order is restored "
+                "after a crash. The snapshot and journal are trusted at startup "
+                "unless the journal is missing or has bad entries, in which case "
+                "every file is stat'd. The journal is compacted into the snapshot "
+                "when the snapshot is saved. This requires snapshots to be enabled."
+            ),
+        )
+        symbols_cache_eviction_policy = Option(
+            default="lru",
+            parser=parse_eviction_policy,
+            doc=(
+                "Policy for picking which files to evict. ``lru`` evicts the least "
+                "recently used files. ``gdsf`` (Greedy-Dual-Size-Frequency) weighs "
+                "how often files are used, their size, and how long they took to "
+                "build, so it keeps small, popular, and expensive to rebuild files "
+                "over large files that are rarely used."
+            ),
+        )
+        symbols_cache_high_watermark = Option(
+            default="0",
+            parser=float,
+            doc=(
+                "Fraction of symbols_cache_max_size at which to evict files in a "
+                "batch. When usage goes over the high watermark, files are evicted "
+                "until usage is at the low watermark and the files are removed by a "
+                "background thread, so the event loop keeps up with bursts of "
+                "writes. For example, 0.95. Set to 0 to disable batch eviction and "
+                "only evict files as needed to stay under the max size."
+            ),
+        )
+        symbols_cache_low_watermark = Option(
+            default="0.9",
+            parser=float,
+            doc=(
+                "Fraction of symbols_cache_max_size to evict files down to when "
+                "usage goes over the high watermark. If this is over the high "
+                "watermark, the high watermark is used."
+            ),
+        )
+        symbols_cache_inventory_concurrency = Option(
+            default="8",
+            parser=int,
+            doc=(
+                "Number of directories to scan at the same time when taking "
+                "inventory of the cache at startup."
+            ),
+        )
+        symbols_cache_status_address = Option(
+            default="",
+            doc=(
+                "host:port to serve the status of the cache on, for example "
+                "localhost:8001. ``GET /status`` returns the entry count, total "
+                "size, largest and oldest entries, eviction rates, inotify queue "
+                "size, and watch count as JSON. ``POST /trim?size=500mb`` evicts "
+                "files down to a size. There's no authentication, so only listen on "
+                "localhost. Leave empty to disable the status server."
+            ),
+        )
+        symbols_cache_snapshot_interval = Option(
+            default="300",
+            parser=int,
+            doc=(
+                "Seconds between saving a snapshot of the LRU to symbols_cache_dir. "
+                "The snapshot is also saved on shutdown. At startup, the LRU order "
+                "and file sizes are restored from the snapshot and journal, so only "
+                "files that aren't in them need to be stat'd. Files from the "
+                "snapshot are stat'd when they're evicted in case they changed while "
+                "the cache manager wasn't running. Without a good journal, every "
+                "file is stat'd and the snapshot only restores the LRU order. Set to "
+                "0 to disable snapshots."
+            ),
+        )
 
     def __init__(self, config_manager):
         self.config_manager = config_manager
@@ -134,12 +512,58 @@ class DiskCacheManager:
             pathlib.Path(self.config("symbols_cache_dir")).resolve() / "cache"
         )
         self.max_size = self.config("symbols_cache_max_size")
+        self.policy_class = self.config("symbols_cache_eviction_policy")
+        self.high_watermark = None
+        self.low_watermark = None
+        high_watermark = self.config("symbols_cache_high_watermark")
+        if high_watermark:
+            low_watermark = min(
+                self.config("symbols_cache_low_watermark"), high_watermark
+            )
+            self.high_watermark = int(self.max_size * high_watermark)
+            self.low_watermark = int(self.max_size * low_watermark)
+        self.snapshot_interval = self.config("symbols_cache_snapshot_interval")
+        self.snapshot_path = (
+            pathlib.Path(self.config("symbols_cache_dir")).resolve() / "lru.snapshot"
+        )
+        self.status_address = None
+        if self.config("symbols_cache_status_address"):
+            self.status_address = parse_address(
+                self.config("symbols_cache_status_address")
+            )
+        self.journal = None
+        if self.snapshot_interval and self.config("symbols_cache_journal"):
+            self.journal = LRUJournal(
+                path=self.snapshot_path.with_name("lru.journal"),
+                cachedir=self.cachedir,
+            )
 
         # Set up attributes for cache monitoring; these get created in the generator
         self.lru = LastUpdatedOrderedDict()
+        self.policy = self.policy_class()
         self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        # Paths of files from the snapshot that haven't been stat'd and when the
+        # snapshot and journal were last written
+        self._unverified = set()
+        self._saved_time = 0
+        # Whether the LRU was restored from the snapshot as is
+        self._restored = False
         self.watches = OneToOne()
+        self.unlinker = None
+        self.status_server = None
+        # Held while changing the LRU so the status server sees a consistent view
+        self.lock = threading.Lock()
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        # deque of (time, files, bytes) for evictions in the last
+        # EVICTION_RATE_WINDOW seconds
+        self._evictions = deque()
+        self._last_read_time = None
         self._generator = None
+        self._snapshot_time = 0
+        self._snapshot_dirty = False
         self.inotify = None
         self.watch_flags = (
             flags.ACCESS
@@ -201,45 +625,518 @@ class DiskCacheManager:
         if path in self.watches:
             del self.watches[path]
 
+    def record(self, op, path, size=0):
+        """Records a change to the LRU in the journal
+
+        See ``LRUJournal.record``.
+
+        """
+        if self.journal is not None:
+            self.journal.record(op, path, size)
+
+    def _metric_tags(self, *tags):
+        return [*tags, f"policy:{self.policy.name}"]
+
+    def add_file(self, path, size, cost=None):
+        """Adds a new file to the LRU and the eviction policy
+
+        This doesn't make room for the file. Call ``make_room`` first.
+
+        :arg str path: absolute path of the file
+        :arg int size: size of the file in bytes
+        :arg float cost: cost of building the file again or None to look it up
+            if the eviction policy uses costs
+
+        """
+        if self.unlinker is not None:
+            # A new file was written to the path of an evicted file before it was
+            # removed, so don't remove it
+            self.unlinker.cancel(path)
+        if cost is None and self.policy.uses_cost:
+            cost = get_cost(path)
+        self.lru[path] = size
+        self._unverified.discard(path)
+        self.policy.add(path, size, cost)
+        self.total_size += size
+        self.record(LRUJournal.CREATE, path, size)
+
+    def touch_file(self, path):
+        """Marks a file in the LRU as used
+
+        :arg str path: absolute path of the file
+
+        """
+        self.lru.touch(path)
+        self.policy.access(path)
+        self.record(LRUJournal.ACCESS, path)
+
+    def remove_file(self, path):
+        """Removes a file that was deleted or moved away from the LRU
+
+        :arg str path: absolute path of the file
+
+        """
+        size = self.lru.pop(path)
+        self._unverified.discard(path)
+        self.policy.remove(path)
+        self.total_size -= size
+        self.record(LRUJournal.DELETE, path)
+
+    def record_access(self, hit):
+        """Counts a cache hit or miss
+
+        An access to a file in the cache is a hit. A new file in the cache means
+        something wasn't in the cache and had to be built, so it's a miss.
+
+        :arg bool hit: whether it was a hit
+
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        METRICS.incr(
+            "diskcache.access",
+            tags=self._metric_tags(f"result:{'hit' if hit else 'miss'}"),
+        )
+
+    @property
+    def hit_ratio(self):
+        """Ratio of hits to hits and misses since startup or None"""
+        total = self.hits + self.misses
+        if not total:
+            return None
+        return self.hits / total
+
+    def inotify_queue_size(self):
+        """Returns the number of bytes of events waiting in the inotify queue"""
+        if self.inotify is None or self.inotify.closed:
+            return 0
+        buf = fcntl.ioctl(self.inotify.fileno(), termios.FIONREAD, b"\x00" * 4)
+        return struct.unpack("i", buf)[0]
+
+    def _record_evictions(self, files, size):
+        now = time.monotonic()
+        self.evicted_files += files
+        self.evicted_bytes += size
+        self._evictions.append((now, files, size))
+        while self._evictions and self._evictions[0][0] < now - EVICTION_RATE_WINDOW:
+            self._evictions.popleft()
+
+    def get_status(self, top_n=DEFAULT_TOP_N):
+        """Returns the status of the cache
+
+        :arg int top_n: number of largest and oldest entries to list
+
+        :returns: dict
+
+        """
+        cachedir = str(self.cachedir)
+
+        def _entries(items):
+            return [
+                {"path": os.path.relpath(path, cachedir), "size": size}
+                for path, size in items
+            ]
+
+        with self.lock:
+            now = time.monotonic()
+            recent = [
+                (files, size)
+                for when, files, size in self._evictions
+                if when >= now - EVICTION_RATE_WINDOW
+            ]
+            window_minutes = EVICTION_RATE_WINDOW / 60
+            status = {
+                "policy": self.policy.name,
+                "entries": len(self.lru),
+                "total_size": self.total_size,
+                "max_size": self.max_size,
+                "high_watermark": self.high_watermark,
+                "low_watermark": self.low_watermark,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hit_ratio,
+                "evictions": {
+                    "files": self.evicted_files,
+                    "bytes": self.evicted_bytes,
+                    "files_per_minute": sum(item[0] for item in recent)
+                    / window_minutes,
+                    "bytes_per_minute": sum(item[1] for item in recent)
+                    / window_minutes,
+                    "pending_unlinks": (
+                        self.unlinker.pending_count if self.unlinker else 0
+                    ),
+                },
+                "inotify": {
+                    "watches": len(self.watches),
+                    "queued_bytes": self.inotify_queue_size(),
+                    "seconds_since_read": (
+                        now - self._last_read_time
+                        if self._last_read_time is not None
+                        else None
+                    ),
+                },
+                "largest": _entries(
+                    heapq.nlargest(top_n, self.lru.items(), key=lambda item: item[1])
+                ),
+                "oldest": _entries(itertools.islice(self.lru.items(), top_n)),
+            }
+        return status
+
+    def trim(self, target_size=None):
+        """Evicts files down to a target size
+
+        This is called from the status server thread. It holds the lock, so it waits
+        for the event loop to finish the batch of events it's handling, including
+        any eviction, and the event loop waits for it.
+
+        :arg int target_size: size to evict down to; defaults to the low watermark
+            or the max size if there are no watermarks
+
+        :returns: dict with the number of files evicted and the new total size
+
+        """
+        if target_size is None:
+            target_size = (
+                self.low_watermark if self.low_watermark is not None else self.max_size
+            )
+
+        with self.lock:
+            evicted = self.evict(target_size)
+            if evicted:
+                self._snapshot_dirty = True
+                if self.journal is not None:
+                    self.journal.flush()
+            LOGGER.info(f"trimmed {evicted} files to {target_size:,d} bytes")
+            return {"evicted": evicted, "total_size": self.total_size}
+
+    def load_snapshot(self):
+        """Loads the LRU snapshot and replays the journal on top of it
+
+        The snapshot and journal are trusted if the snapshot is valid and the
+        journal exists and has no bad entries. Otherwise, changes to the LRU could
+        be missing, so the files need to be stat'd.
+
+        :returns: tuple of (``OrderedDict`` of path -> size in LRU order, whether
+            it can be trusted); the ``OrderedDict`` is empty if there's no snapshot
+            or it's not valid
+
+        """
+        known = OrderedDict()
+        if not self.snapshot_interval:
+            return known, False
+
+        try:
+            with open(self.snapshot_path, "r") as fp:
+                if fp.readline().rstrip("\n") != SNAPSHOT_HEADER:
+                    LOGGER.warning(f"ignoring snapshot with bad header: {fp.name}")
+                    return known, False
+
+                prefix = f"{self.cachedir}{os.sep}"
+                for line in fp:
+                    size, relpath = line.rstrip("\n").split(" ", 1)
+                    known[prefix + relpath] = int(size)
+
+        except FileNotFoundError:
+            return known, False
+
+        except (OSError, ValueError):
+            LOGGER.exception(f"error loading snapshot: {self.snapshot_path}")
+            known.clear()
+            return known, False
+
+        if self.journal is None:
+            return known, False
+
+        if not self.journal.path.exists():
+            LOGGER.warning(f"journal is missing: {self.journal.path}")
+            return known, False
+
+        applied = self.journal.replay(known)
+        LOGGER.info(f"replayed {applied} journal entries")
+        if self.journal.skipped:
+            LOGGER.warning(f"journal has {self.journal.skipped} bad entries")
+            return known, False
+
+        return known, True
+
+    def get_saved_time(self):
+        """Returns when the snapshot or journal was last written
+
+        :returns: modification time in seconds since the epoch or 0 if neither
+            exists
+
+        """
+        paths = [self.snapshot_path]
+        if self.journal is not None:
+            paths.append(self.journal.path)
+
+        saved_time = 0
+        for path in paths:
+            try:
+                saved_time = max(saved_time, path.stat().st_mtime)
+            except FileNotFoundError:
+                pass
+        return saved_time
+
+    def save_snapshot(self):
+        """Saves the LRU to the snapshot file
+
+        The snapshot has one line per file with the size and the path relative to
+        the cachedir in LRU order.
+
+        """
+        if not self.snapshot_interval:
+            return
+
+        # NOTE(willkg): All paths in the LRU are in the cachedir, so slice off the
+        # cachedir rather than using os.path.relpath which is slow for big caches
+        prefix_len = len(str(self.cachedir)) + 1
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_fp = tempfile.NamedTemporaryFile(
+            mode="w",
+            dir=self.snapshot_path.parent,
+            prefix=f"{self.snapshot_path.name}.",
+            delete=False,
+        )
+        try:
+            with temp_fp:
+                temp_fp.write(f"{SNAPSHOT_HEADER}\n")
+                for path, size in self.lru.items():
+                    temp_fp.write(f"{size} {path[prefix_len:]}\n")
+            os.replace(temp_fp.name, self.snapshot_path)
+        except BaseException:
+            os.unlink(temp_fp.name)
+            raise
+
+        # The snapshot has everything in the journal, so compact the journal
+        if self.journal is not None:
+            self.journal.truncate()
+
+        self._snapshot_time = time.monotonic()
+        self._snapshot_dirty = False
+        LOGGER.debug(f"saved snapshot: {self.snapshot_path} ({len(self.lru)} files)")
+
     def inventory_existing(self):
         """Sets up LRU from cachedir
 
         This goes through the cachedir and adds watches for directories and adds files
-        to the LRU.
+        to the LRU. Directories are scanned in parallel. Files are added to the LRU in
+        the order they were last used.
+
+        If there's a snapshot of the LRU and a good journal, files in the snapshot
+        are added in the snapshot's order with their sizes from the snapshot and
+        only files that aren't in the snapshot are stat'd and added after them.
+        Directories are still listed since they need watches and may have new
+        files. Files from the snapshot are checked when they're evicted; see
+        ``verify_victim``.
+
+        If the journal is missing or corrupt, every file is stat'd. Files that
+        weren't changed after the snapshot and journal were written are added in
+        the snapshot's order and then the rest in the order they were last used.
 
         NOTE(willkg): this does not deal with the max size of the LRU--that'll get
         handled when we start going through events.
 
         """
+        start_time = time.perf_counter()
         cachedir = str(self.cachedir)
+        known, trusted = self.load_snapshot()
+        self._saved_time = self.get_saved_time()
+        if known and not trusted:
+            LOGGER.warning("can't trust snapshot, so checking all files")
+        # Files in a trusted snapshot don't get stat'd
+        skip_stat = known if trusted else None
+
+        # map of path -> (size, last_used)
+        found = {}
+
+        with ThreadPoolExecutor(
+            max_workers=self.config("symbols_cache_inventory_concurrency"),
+            thread_name_prefix="eliot-inventory",
+        ) as executor:
+            # NOTE(willkg): Add the watch for a directory before scanning it so we don't
+            # miss files that get created between the scan and adding the watch
+            self.add_watch(cachedir)
+            pending = {executor.submit(scan_directory, cachedir, skip_stat)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subdirs, files = future.result()
+                    for path in subdirs:
+                        self.add_watch(path)
+                        LOGGER.debug(f"adding watch: {path}")
+                        pending.add(executor.submit(scan_directory, path, skip_stat))
+
+                    for path, size, last_used in files:
+                        found[path] = (size, last_used)
+
+        # Add files from the snapshot in snapshot order and then files that weren't
+        # in the snapshot in the order they were last used
+        for path, size in known.items():
+            if path not in found:
+                continue
+
+            if trusted:
+                self._unverified.add(path)
+            else:
+                size, last_used = found[path]
+                if last_used > self._saved_time:
+                    # Changed after the snapshot, so it goes with the new files
+                    continue
+
+            self.lru[path] = size
+            self.total_size += size
+
+        new_files = sorted(
+            (last_used, path, size)
+            for path, (size, last_used) in found.items()
+            if path not in self.lru
+        )
+        for _, path, size in new_files:
+            self.lru[path] = size
+            self.total_size += size
+            LOGGER.debug(f"adding file: {path} ({size:,d})")
+
+        # The LRU is exactly what's in the snapshot, so there's no need to save it
+        # again
+        self._restored = (
+            trusted and len(self.lru) == len(known) and self.journal.is_empty()
+        )
 
-        self.add_watch(cachedir)
-        for base, dirs, files in os.walk(cachedir):
-            for dir_ in dirs:
-                path = os.path.join(base, dir_)
-                self.add_watch(path)
-                LOGGER.debug(f"adding watch: {path}")
+        # Add files to the eviction policy in LRU order
+        costs = {}
+        if self.policy.uses_cost:
+            with ThreadPoolExecutor(
+                max_workers=self.config("symbols_cache_inventory_concurrency"),
+                thread_name_prefix="eliot-inventory",
+            ) as executor:
+                costs = dict(
+                    zip(self.lru, executor.map(get_cost, self.lru), strict=True)
+                )
+        for path, size in self.lru.items():
+            self.policy.add(path, size, costs.get(path))
+
+        METRICS.histogram(
+            "diskcache.inventory",
+            value=(time.perf_counter() - start_time) * 1000.0,
+            tags=[f"snapshot:{'true' if trusted else 'false'}"],
+        )
 
-            for fn in files:
-                path = os.path.join(base, fn)
-                size = os.stat(path).st_size
-                self.lru[path] = size
-                self.total_size += size
-                LOGGER.debug(f"adding file: {path} ({size:,d})")
+    def verify_victim(self, path):
+        """Checks a file from the snapshot that's about to be evicted
 
-    def make_room(self, size):
-        total_size = self.total_size + size
-        removed = 0
-
-        while self.lru and total_size > self.max_size:
-            rm_path, rm_size = self.lru.pop_oldest()
-            total_size -= rm_size
-            removed += rm_size
-            os.remove(rm_path)
+        Files from the snapshot aren't stat'd at startup, so they could have been
+        deleted, replaced, or changed size while the cache manager wasn't running.
+        This fixes the LRU for the file. Files that were changed after the snapshot
+        and journal were last written are kept and become the most recently used.
+
+        :arg str path: absolute path of the file; it was already removed from the
+            eviction policy
+
+        :returns: whether to evict the file
+
+        """
+        self._unverified.discard(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove_file(path)
+            return False
+
+        size = self.lru[path]
+        if stat.st_size != size:
+            self.total_size += stat.st_size - size
+            self.lru[path] = stat.st_size
+
+        if stat.st_mtime > self._saved_time:
+            LOGGER.debug(f"keeping file changed while not running: {path}")
+            self.lru[path] = stat.st_size
+            self.policy.add(path, stat.st_size)
+            self.record(LRUJournal.CREATE, path, stat.st_size)
+            return False
+        return True
+
+    def evict(self, target_size):
+        """Evicts files until the total size is at or under the target size
+
+        If there's an unlink worker, files are removed from the LRU right away and
+        removed from disk in the background.
+
+        :arg int target_size: the total size to evict down to
+
+        :returns: number of files evicted
+
+        """
+        evicted = 0
+        evicted_size = 0
+        while self.lru and self.total_size > target_size:
+            rm_path = self.policy.pop_victim()
+            if rm_path in self._unverified and not self.verify_victim(rm_path):
+                continue
+            rm_size = self.lru.pop(rm_path)
+            self.total_size -= rm_size
+            self.record(LRUJournal.DELETE, rm_path)
+            if self.unlinker is not None:
+                self.unlinker.submit(rm_path, rm_size)
+            else:
+                try:
+                    os.remove(rm_path)
+                except FileNotFoundError:
+                    # The file was deleted and the DELETE event hasn't been handled
+                    # yet
+                    pass
+            evicted += 1
+            evicted_size += rm_size
             LOGGER.debug(f"evicted {rm_path} {rm_size:,d}")
-            METRICS.incr("diskcache.evict")
 
-        self.total_size -= removed
+        if evicted:
+            self._record_evictions(evicted, evicted_size)
+            METRICS.incr("diskcache.evict", value=evicted, tags=self._metric_tags())
+        return evicted
+
+    def make_room(self, size):
+        """Evicts files so a file of the given size fits under the max size
+
+        :arg int size: size of the file to make room for
+
+        """
+        self.evict(self.max_size - size)
+
+    def evict_batch(self):
+        """Evicts files down to the low watermark if usage is over the high watermark
+
+        :returns: number of files evicted
+
+        """
+        if self.high_watermark is None or self.total_size <= self.high_watermark:
+            return 0
+
+        start_time = time.perf_counter()
+        evicted = self.evict(self.low_watermark)
+        METRICS.histogram(
+            "diskcache.evict_batch",
+            value=(time.perf_counter() - start_time) * 1000.0,
+            tags=self._metric_tags(),
+        )
+        LOGGER.info(
+            f"evicted {evicted} files to get under the low watermark "
+            + f"({self.total_size:,d} bytes)"
+        )
+        return evicted
+
+    def _should_save_snapshot(self):
+        """Returns whether it's time to save a snapshot and compact the journal"""
+        if not self.snapshot_interval or not self._snapshot_dirty:
+            return False
+
+        if time.monotonic() - self._snapshot_time >= self.snapshot_interval:
+            return True
+
+        return self.journal is not None and self.journal.entries > max(
+            JOURNAL_COMPACT_MIN_ENTRIES, len(self.lru)
+        )
 
     def _event_generator(self, nonblocking=False):
         """Returns a generator of inotify events."""
@@ -251,14 +1148,35 @@ class DiskCacheManager:
             timeout = 1000
 
         self.inotify = INotify(nonblocking=nonblocking)
+        if self.high_watermark is not None:
+            self.unlinker = UnlinkWorker()
+            self.unlinker.start()
 
         # Set up watches and LRU with what exists already
         self.watches = OneToOne()
         self.lru = LastUpdatedOrderedDict()
+        self.policy = self.policy_class()
         self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._unverified = set()
+        self._restored = False
         self.inventory_existing()
 
         LOGGER.info(f"found {len(self.lru)} files ({self.total_size:,d} bytes)")
+        self._snapshot_time = time.monotonic()
+        self._snapshot_dirty = not self._restored
+        if self.journal is not None:
+            # Start the journal from a snapshot of the inventory
+            if self._snapshot_dirty:
+                self.save_snapshot()
+            self.journal.open()
+
+        self.evict_batch()
+
+        if self.status_address is not None:
+            self.status_server = StatusServer(self, *self.status_address)
+            self.status_server.start()
 
         LOGGER.info("entering loop")
         self.running = True
@@ -267,77 +1185,84 @@ class DiskCacheManager:
         try:
             while self.running:
                 try:
-                    for event in self.inotify.read(timeout=timeout):
-                        processed_events = True
-                        event_flags = flags.from_mask(event.mask)
-
-                        flags_list = ", ".join([str(flag) for flag in event_flags])
-                        LOGGER.debug(f"EVENT: {event}: {flags_list}")
-
-                        if flags.IGNORED in event_flags:
-                            continue
-
-                        dir_path = self.watches.inv[event.wd]
-                        path = os.path.join(dir_path, event.name)
-
-                        if flags.ISDIR in event_flags:
-                            # Handle directory events which update our watch lists
-                            if flags.CREATE in event_flags:
-                                self.add_watch(path)
-
-                            if flags.DELETE_SELF in event_flags:
-                                if path in self.watches:
-                                    self.remove_watch(path)
-
-                        else:
-                            # Handle file events which update our LRU cache
-                            if flags.CREATE in event_flags:
-                                if path not in self.lru:
-                                    size = os.stat(path).st_size
-                                    self.make_room(size)
-                                    self.lru[path] = size
-                                    self.total_size += size
-
-                            elif flags.ACCESS in event_flags:
-                                if path in self.lru:
-                                    self.lru.touch(path)
-
-                            elif flags.MODIFY in event_flags:
-                                size = self.lru[path]
-                                new_size = os.stat(path).st_size
-                                if size != new_size:
-                                    self.total_size -= size
-                                    self.make_room(new_size)
-                                    self.total_size += new_size
-
-                                self.lru[path] = new_size
-
-                            elif flags.DELETE in event_flags:
-                                if path in self.lru:
-                                    # NOTE(willkg): DELETE can be triggered by an
-                                    # external thing or by the disk cache manager, so it
-                                    # may or may not be in the lru
-                                    size = self.lru.pop(path)
-                                    self.total_size -= size
-
-                            elif flags.MOVED_TO in event_flags:
-                                if path not in self.lru:
-                                    # If the path isn't in self.lru, then treat this
-                                    # like a create
-                                    size = os.stat(path).st_size
-                                    self.make_room(size)
-                                    self.lru[path] = size
-                                    self.total_size += size
-
-                            elif flags.MOVED_FROM in event_flags:
-                                if path in self.lru:
-                                    # If it was moved out of this directory, then treat
-                                    # it like a DELETE
-                                    size = self.lru.pop(path)
-                                    self.total_size -= size
+                    events = self.inotify.read(timeout=timeout)
+                    self._last_read_time = time.monotonic()
+                    with self.lock:
+                        for event in events:
+                            processed_events = True
+                            event_flags = flags.from_mask(event.mask)
+
+                            flags_list = ", ".join([str(flag) for flag in event_flags])
+                            LOGGER.debug(f"EVENT: {event}: {flags_list}")
+
+                            if flags.IGNORED in event_flags:
+                                continue
+
+                            dir_path = self.watches.inv[event.wd]
+                            path = os.path.join(dir_path, event.name)
+
+                            if flags.ISDIR in event_flags:
+                                # Handle directory events which update our watch lists
+                                if flags.CREATE in event_flags:
+                                    self.add_watch(path)
+
+                                if flags.DELETE_SELF in event_flags:
+                                    if path in self.watches:
+                                        self.remove_watch(path)
 
                             else:
-                                LOGGER.debug(f"ignored {path} {event}")
+                                # Handle file events which update our LRU cache
+                                if flags.CREATE in event_flags:
+                                    if path not in self.lru:
+                                        size = os.stat(path).st_size
+                                        self.make_room(size)
+                                        self.add_file(path, size)
+                                        self.record_access(hit=False)
+
+                                elif flags.ACCESS in event_flags:
+                                    if path in self.lru:
+                                        self.touch_file(path)
+                                        self.record_access(hit=True)
+
+                                elif flags.MODIFY in event_flags:
+                                    size = self.lru[path]
+                                    new_size = os.stat(path).st_size
+                                    if size != new_size:
+                                        self.total_size -= size
+                                        self.make_room(new_size)
+                                        self.total_size += new_size
+
+                                    self.lru[path] = new_size
+                                    self._unverified.discard(path)
+                                    self.policy.add(path, new_size)
+                                    self.record(LRUJournal.CREATE, path, new_size)
+
+                                elif flags.DELETE in event_flags:
+                                    if path in self.lru:
+                                        # NOTE(willkg): DELETE can be triggered by an
+                                        # external thing or by the disk cache manager, so it
+                                        # may or may not be in the lru
+                                        self.remove_file(path)
+
+                                elif flags.MOVED_TO in event_flags:
+                                    if path not in self.lru:
+                                        # If the path isn't in self.lru, then treat this
+                                        # like a create
+                                        size = os.stat(path).st_size
+                                        self.make_room(size)
+                                        self.add_file(path, size)
+                                        self.record_access(hit=False)
+
+                                elif flags.MOVED_FROM in event_flags:
+                                    if path in self.lru:
+                                        # If it was moved out of this directory, then treat
+                                        # it like a DELETE
+                                        self.remove_file(path)
+
+                                else:
+                                    LOGGER.debug(f"ignored {path} {event}")
+
+                        self.evict_batch()
 
                 except Exception:
                     LOGGER.exception("Exception thrown while handling events.")
@@ -354,11 +1279,49 @@ class DiskCacheManager:
                         f"lru: count {len(self.lru)}, size {self.total_size:,d}"
                     )
                     METRICS.gauge("diskcache.usage", value=self.total_size)
+                    if self.hit_ratio is not None:
+                        METRICS.gauge(
+                            "diskcache.hit_ratio",
+                            value=self.hit_ratio,
+                            tags=self._metric_tags(),
+                        )
                     processed_events = False
+                    # NOTE(willkg): The status server can trim from another thread,
+                    # so the journal and dirty flag are only changed with the lock
+                    with self.lock:
+                        self._snapshot_dirty = True
+                        if self.journal is not None:
+                            self.journal.flush()
+
+                with self.lock:
+                    if self._should_save_snapshot():
+                        try:
+                            self.save_snapshot()
+                        except Exception:
+                            LOGGER.exception("Exception thrown while saving snapshot.")
+                            self._snapshot_time = time.monotonic()
 
                 yield
 
         finally:
+            if self.status_server is not None:
+                self.status_server.stop()
+                self.status_server = None
+
+            with self.lock:
+                if self._snapshot_dirty:
+                    try:
+                        self.save_snapshot()
+                    except Exception:
+                        LOGGER.exception("Exception thrown while saving snapshot.")
+
+                if self.journal is not None:
+                    self.journal.close()
+
+            if self.unlinker is not None:
+                self.unlinker.stop()
+                self.unlinker = None
+
             all_watches = list(self.watches.inv.keys())
             for wd in all_watches:
                 try:
@@ -371,14 +1334,22 @@ class DiskCacheManager:
         self.inotify.close()
 
     def run_loop(self):
-        """Run cache manager in a loop."""
+        """Run cache manager in a loop.
+
+        This returns after ``running`` is set to False and the current batch of
+        events is handled.
+
+        """
         if self._generator is None:
             self._generator = self._event_generator()
 
-        while True:
-            next(self._generator)
-
-        self.shutdown()
+        try:
+            while True:
+                next(self._generator)
+        except StopIteration:
+            pass
+        finally:
+            self.shutdown()
 
     def run_once(self):
         """Runs a nonblocking event generator once."""
@@ -430,6 +1401,14 @@ def main(print_config):
 
     cache_manager.verify_configuration()
     cache_manager.set_up()
+
+    def handle_sigterm(signum, frame):
+        # NOTE(willkg): Exit the loop after the current batch of events so the LRU
+        # isn't left half-updated and the snapshot gets saved; raising SystemExit
+        # here could interrupt a batch while it holds the lock
+        cache_manager.running = False
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
     cache_manager.run_loop()
 
 
@@ -0,0 +1,156 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Status server for the disk cache manager.
+
+This is a small HTTP server that runs in a thread in the disk cache manager. It
+has no authentication, so it should only listen on localhost.
+
+Endpoints:
+
+* ``GET /status``: JSON with the state of the cache; the ``n`` query string
+  parameter sets how many of the largest and oldest entries to list up to
+  ``MAX_TOP_N``
+* ``POST /trim``: evicts files down to a target size; the ``size`` query string
+  parameter sets the target size and takes units like ``500mb``
+
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+from everett.manager import parse_data_size
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Default and maximum number of largest and oldest entries to list
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 1000
+
+
+def parse_address(value):
+    """Parses a ``host:port`` address
+
+    :arg str value: the address
+
+    :returns: ``(host, port)`` tuple
+
+    :raises ValueError: if the address isn't valid
+
+    """
+    host, _, port = value.rpartition(":")
+    if not host:
+        raise ValueError(f"address {value!r} must be host:port")
+    return host, int(port)
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    """Handles requests for the status server"""
+
+    # The DiskCacheManager; set on the subclass created by the server
+    cache_manager = None
+
+    def log_message(self, format, *args):
+        LOGGER.debug("status server: " + format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_query(self):
+        return {
+            key: values[-1]
+            for key, values in parse_qs(urlsplit(self.path).query).items()
+        }
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/trim":
+            self.send_json(405, {"error": "use POST"})
+            return
+        if path != "/status":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        try:
+            top_n = int(self.get_query().get("n", DEFAULT_TOP_N))
+        except ValueError:
+            self.send_json(400, {"error": "n must be an integer"})
+            return
+        if not 0 <= top_n <= MAX_TOP_N:
+            self.send_json(400, {"error": f"n must be between 0 and {MAX_TOP_N}"})
+            return
+
+        self.send_json(200, self.cache_manager.get_status(top_n=top_n))
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path == "/status":
+            self.send_json(405, {"error": "use GET"})
+            return
+        if path != "/trim":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        target_size = None
+        size = self.get_query().get("size")
+        if size:
+            try:
+                target_size = parse_data_size(size)
+            except ValueError:
+                self.send_json(400, {"error": f"size {size!r} is not valid"})
+                return
+
+        LOGGER.info(f"status server: trim requested (size: {size or 'default'})")
+        self.send_json(200, self.cache_manager.trim(target_size=target_size))
+
+
+class StatusServer:
+    """Serves the status of a disk cache manager in a background thread"""
+
+    def __init__(self, cache_manager, host, port):
+        """
+        :arg cache_manager: the DiskCacheManager
+        :arg str host: host to listen on
+        :arg int port: port to listen on; use 0 to pick a free port
+        """
+        handler_class = type(
+            "BoundStatusRequestHandler",
+            (StatusRequestHandler,),
+            {"cache_manager": cache_manager},
+        )
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        """The ``(host, port)`` the server is listening on"""
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        """Starts serving in a background thread"""
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="eliot-status", daemon=True
+        )
+        self._thread.start()
+        host, port = self.address
+        LOGGER.info(f"status server: listening on {host}:{port}")
+
+    def stop(self):
+        """Stops serving and closes the socket"""
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
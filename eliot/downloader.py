@@ -6,17 +6,52 @@
 Contains code for downloading sym files from one or more sources.
 """
 
-from functools import wraps
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial, wraps
+import inspect
+import logging
+from pathlib import Path
+import tempfile
+import threading
 import time
 
 import backoff
 from requests.exceptions import ConnectionError
 from sentry_sdk import capture_message
 
+from eliot.libcompression import (
+    CompressionError,
+    decompress_data,
+    StreamDecompressor,
+)
+from eliot.libhttpx import (
+    httpx_async_client,
+    RETRYABLE_EXCEPTIONS as HTTPX_RETRYABLE_EXCEPTIONS,
+)
 from eliot.libmarkus import METRICS
 from eliot.librequests import requests_session, RETRYABLE_EXCEPTIONS
 
 
+# Size of chunks to read when streaming a download to a file
+LOGGER = logging.getLogger(__name__)
+
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Strategies for getting a file from multiple sources: try sources one at a time
+# in order, try all sources at the same time, or try the next source if the
+# previous one hasn't responded after a delay
+SEQUENTIAL = "sequential"
+CONCURRENT = "concurrent"
+HEDGED = "hedged"
+STRATEGIES = (SEQUENTIAL, CONCURRENT, HEDGED)
+
+# Maximum number of downloads in flight per source for the concurrent and hedged
+# strategies
+MAX_WORKERS_PER_SOURCE = 8
+
+
 class FileNotFound(Exception):
     """File was not found because it doesn't exist."""
 
@@ -25,6 +60,10 @@ class ErrorFileNotFound(Exception):
     """File was not found because of possible transient error."""
 
 
+class DownloadCancelled(Exception):
+    """Download was stopped because it's no longer needed."""
+
+
 class Source:
     """Defines a source manager
 
@@ -35,12 +74,14 @@ class Source:
     def __init__(self, source_url):
         self.source_url = source_url
 
-    def get(self, debug_filename, debug_id, filename):
+    def get(self, debug_filename, debug_id, filename, cancelled=None):
         """Retrieve a source url.
 
         :arg str debug_filename: the debug_filename
         :arg str debug_id: the debug_id
         :arg str filename: the symbol filename
+        :arg threading.Event cancelled: event that's set when the file is no longer
+            needed or None
 
         :returns: bytes
 
@@ -49,14 +90,157 @@ class Source:
         :raises ErrorFileNotFound: if the file cannot be found because of some possibly
             transient error like a timeout or a connection error
 
+        :raises DownloadCancelled: if cancelled was set
+
+        """
+        raise NotImplementedError
+
+    def get_to_file(self, debug_filename, debug_id, filename, tmpdir, cancelled=None):
+        """Retrieve a source url and save it to a temp file.
+
+        The caller is responsible for deleting the file.
+
+        :arg str debug_filename: the debug_filename
+        :arg str debug_id: the debug_id
+        :arg str filename: the symbol filename
+        :arg Path tmpdir: the directory to create the temp file in
+        :arg threading.Event cancelled: event that's set when the file is no longer
+            needed or None
+
+        :returns: Path of the temp file
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        :raises DownloadCancelled: if cancelled was set
+
         """
         raise NotImplementedError
 
 
+def check_download_size(url, content_length, num_bytes):
+    """Verifies that a download got all the bytes the server said it would send
+
+    :arg str url: the url of the download
+    :arg content_length: the Content-Length header value or None
+    :arg int num_bytes: the number of bytes that came over the wire
+
+    :raises ConnectionError: if the download is incomplete
+
+    """
+    if content_length is not None and num_bytes != int(content_length):
+        raise ConnectionError(
+            f"incomplete download {url}: got {num_bytes} of {content_length} bytes"
+        )
+
+
+def check_cancelled(cancelled):
+    """Stops a download if it's no longer needed
+
+    :arg threading.Event cancelled: the event for the download or None
+
+    :raises DownloadCancelled: if the event is set
+
+    """
+    if cancelled is not None and cancelled.is_set():
+        raise DownloadCancelled("download is no longer needed")
+
+
+def create_download_file(tmpdir):
+    """Creates a temp file for a download
+
+    :arg Path tmpdir: the directory to create the temp file in
+
+    :returns: open file object; the file is not deleted when it's closed
+
+    """
+    return tempfile.NamedTemporaryFile(
+        mode="wb", prefix="download-", suffix=".sym", dir=tmpdir, delete=False
+    )
+
+
+def write_decompressed(fp, decompressor, chunk=None):
+    """Decompresses a chunk of a download and writes it to a file
+
+    :arg fp: the file to write to
+    :arg StreamDecompressor decompressor: the decompressor for the download
+    :arg bytes chunk: the chunk to write or None to flush the decompressor
+
+    :raises CompressionError: if the data isn't valid
+
+    """
+    if chunk is None:
+        fp.write(decompressor.flush())
+    else:
+        fp.write(decompressor.decompress(chunk))
+
+
+def parse_strategy(value):
+    """Parses a strategy for getting a file from multiple sources
+
+    :arg str value: the strategy
+
+    :returns: the strategy
+
+    :raises ValueError: if the strategy is unknown
+
+    """
+    value = value.strip().lower()
+    if value not in STRATEGIES:
+        raise ValueError(f"unknown strategy {value!r}; expected one of {STRATEGIES}")
+    return value
+
+
+def _cleanup_fetch(future, cleanup):
+    if future.cancelled() or future.exception() is not None:
+        return
+    if cleanup is not None:
+        cleanup(future.result())
+
+
+def discard_fetch(future, cleanup=None):
+    """Cancels a fetch that lost and cleans up its result if it finishes anyway
+
+    This works with ``concurrent.futures.Future`` and ``asyncio.Future`` instances.
+
+    :arg future: the future for the fetch
+    :arg cleanup: callable that takes the result of the fetch or None
+
+    """
+    future.cancel()
+    # NOTE(willkg): This also retrieves the exception if there is one so asyncio
+    # doesn't complain about it never being retrieved
+    future.add_done_callback(partial(_cleanup_fetch, cleanup=cleanup))
+
+
+def remove_download_file(path):
+    """Deletes a temp file from a download that's not needed"""
+    path.unlink(missing_ok=True)
+
+
 def time_download(key):
     """Captures timing for a function with success/fail tag."""
 
     def _time_download(fun):
+        if inspect.iscoroutinefunction(fun):
+
+            @wraps(fun)
+            async def _time_download_coroutine(*args, **kwargs):
+                start_time = time.perf_counter()
+                try:
+                    rv = await fun(*args, **kwargs)
+                    delta = (time.perf_counter() - start_time) * 1000.0
+                    METRICS.histogram(key, value=delta, tags=["response:success"])
+                    return rv
+                except Exception:
+                    delta = (time.perf_counter() - start_time) * 1000.0
+                    METRICS.histogram(key, value=delta, tags=["response:fail"])
+                    raise
+
+            return _time_download_coroutine
+
         @wraps(fun)
         def _time_download_fun(*args, **kwargs):
             start_time = time.perf_counter()
@@ -76,12 +260,32 @@ def time_download(key):
 
 
 class HTTPSource(Source):
-    """Source for HTTP/HTTPS requests."""
+    """Source for HTTP/HTTPS requests.
 
-    def __init__(self, source_url):
+    Downloads are decompressed if they're gzip or Zstandard compressed. If
+    ``compressed_suffixes`` is set, compressed variants of the file like
+    ``xul.sym.zst`` are tried in order before the file itself. Any response other
+    than a 200 for a compressed variant moves on to the next one.
+
+    """
+
+    def __init__(self, source_url, compressed_suffixes=()):
         self.source_url = source_url.rstrip("/") + "/"
+        self.compressed_suffixes = list(compressed_suffixes)
         self.session = requests_session()
 
+    def _get_filenames(self, filename):
+        """Returns the filenames to try for a file
+
+        :arg str filename: the symbol filename
+
+        :returns: list of compressed variants of filename followed by filename
+
+        """
+        return [f"{filename}{suffix}" for suffix in self.compressed_suffixes] + [
+            filename
+        ]
+
     def _make_key(self, debug_filename, debug_id, filename):
         """Generates a key from given arguments
 
@@ -101,10 +305,14 @@ class HTTPSource(Source):
         max_tries=5,
         exception=RETRYABLE_EXCEPTIONS,
     )
-    def download_file(self, url):
+    def download_file(self, url, cancelled=None, compressed_variant=False):
         """Downloads file at url and returns bytes
 
         :arg url: the url of the file to download
+        :arg threading.Event cancelled: event that's set when the file is no longer
+            needed or None; this is checked before each try
+        :arg bool compressed_variant: whether this is a compressed variant; see
+            ``_skip_variant``
 
         :returns: bytes
 
@@ -115,30 +323,265 @@ class HTTPSource(Source):
 
         :raises ConnetionError: if status_code is 500 and retries are exhausted
 
+        :raises CompressionError: if the file is compressed and isn't valid
+
+        :raises DownloadCancelled: if cancelled was set
+
         """
+        check_cancelled(cancelled)
         resp = self.session.get(url, allow_redirects=True)
-        if resp.status_code == 200:
-            return resp.content
+        if compressed_variant and resp.status_code != 200:
+            raise self._skip_variant(url, resp.status_code)
+        return decompress_data(self._handle_response(resp.status_code, resp.content))
+
+    @time_download("downloader.download")
+    @backoff.on_exception(
+        wait_gen=backoff.expo,
+        max_tries=5,
+        exception=RETRYABLE_EXCEPTIONS,
+    )
+    def download_file_to_path(
+        self, url, tmpdir, cancelled=None, compressed_variant=False
+    ):
+        """Downloads file at url to a temp file streaming it in chunks
+
+        This doesn't hold the whole file in memory. If the server sent a
+        Content-Length, this verifies the download is complete and retries if it's
+        not.
+
+        :arg url: the url of the file to download
+        :arg Path tmpdir: the directory to create the temp file in
+        :arg threading.Event cancelled: event that's set when the file is no longer
+            needed or None; this is checked before each try and between chunks
+        :arg bool compressed_variant: whether this is a compressed variant; see
+            ``_skip_variant``
+
+        :returns: Path of the temp file
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        :raises ConnetionError: if status_code is 500 or the download is incomplete
+            and retries are exhausted
+
+        :raises CompressionError: if the file is compressed and isn't valid
+
+        :raises DownloadCancelled: if cancelled was set
+
+        """
+        check_cancelled(cancelled)
+        with self.session.get(url, allow_redirects=True, stream=True) as resp:
+            if resp.status_code != 200:
+                if compressed_variant:
+                    raise self._skip_variant(url, resp.status_code)
+                self._handle_response(resp.status_code, resp.content)
+
+            temp_fp = create_download_file(tmpdir)
+            path = Path(temp_fp.name)
+            try:
+                decompressor = StreamDecompressor()
+                with temp_fp:
+                    for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        # Leaving the with block closes the response
+                        check_cancelled(cancelled)
+                        temp_fp.write(decompressor.decompress(chunk))
+                    temp_fp.write(decompressor.flush())
+
+                # NOTE(willkg): Content-Length is the size of the possibly encoded
+                # response, so compare it to the bytes that came over the wire
+                check_download_size(
+                    url, resp.headers.get("Content-Length"), resp.raw.tell()
+                )
+            except BaseException:
+                path.unlink(missing_ok=True)
+                raise
+
+        return path
+
+    def _skip_variant(self, url, status_code):
+        """Returns the error for a compressed variant that wasn't downloaded
+
+        Compressed variants are optional and servers may respond with a 403 or some
+        other error rather than a 404 for files that don't exist, so any response
+        other than a 200 means to try the next variant. This isn't retried or
+        reported.
+
+        :arg str url: the url of the compressed variant
+        :arg int status_code: the HTTP status code of the response
+
+        :returns: ``FileNotFound``
+
+        """
+        LOGGER.info(f"skipping compressed variant {url}: status_code {status_code}")
+        return FileNotFound(f"status_code: {status_code}")
+
+    def _handle_response(self, status_code, content):
+        """Returns content for a successful response or raises an error
+
+        :arg int status_code: the HTTP status code of the response
+        :arg bytes content: the content of the response
+
+        :returns: bytes
+
+        :raises FileNotFound: if the status code is 404
+
+        :raises ErrorFileNotFound: if the status code is some other error
+
+        :raises ConnetionError: if the status code is retryable
+
+        """
+        if status_code == 200:
+            return content
 
         # These status codes are retryable, so raise an exception that will
         # force backoff.on_exception to retry this entire method
-        if resp.status_code in (429, 500, 503, 504):
-            raise ConnectionError(f"retryable status code {resp.status_code}")
+        if status_code in (429, 500, 503, 504):
+            raise ConnectionError(f"retryable status code {status_code}")
 
         # If the status_code is 404, that's a legitimate FileNotFound. Anything else
         # is either fishy or a server error.
-        if resp.status_code == 404:
-            raise FileNotFound(f"status_code: {resp.status_code}")
+        if status_code == 404:
+            raise FileNotFound(f"status_code: {status_code}")
 
         # NOTE(willkg): This might be noisy, but we'll hone it as we get a better
         # feel for what "normal" and "abnormal" errors look like
-        capture_message(
-            f"error: symbol downloader got {resp.status_code}: {resp.content[:100]}"
-        )
+        capture_message(f"error: symbol downloader got {status_code}: {content[:100]}")
 
-        raise ErrorFileNotFound(f"status_code: {resp.status_code}")
+        raise ErrorFileNotFound(f"status_code: {status_code}")
 
-    def get(self, debug_filename, debug_id, filename):
+    def get(self, debug_filename, debug_id, filename, cancelled=None):
+        """Retrieve a source url.
+
+        See ``Source.get``.
+
+        """
+        for variant in self._get_filenames(filename):
+            key = self._make_key(debug_filename, debug_id, variant)
+            url = f"{self.source_url}{key}"
+
+            try:
+                return self.download_file(
+                    url, cancelled=cancelled, compressed_variant=variant != filename
+                )
+            except FileNotFound:
+                continue
+            except RETRYABLE_EXCEPTIONS as exc:
+                raise ErrorFileNotFound(f"status_code: {exc}") from exc
+            except CompressionError as exc:
+                raise ErrorFileNotFound(f"bad compressed data: {exc}") from exc
+
+        raise FileNotFound("status_code: 404")
+
+    def get_to_file(self, debug_filename, debug_id, filename, tmpdir, cancelled=None):
+        """Retrieve a source url and save it to a temp file.
+
+        See ``Source.get_to_file``.
+
+        """
+        for variant in self._get_filenames(filename):
+            key = self._make_key(debug_filename, debug_id, variant)
+            url = f"{self.source_url}{key}"
+
+            try:
+                return self.download_file_to_path(
+                    url,
+                    tmpdir,
+                    cancelled=cancelled,
+                    compressed_variant=variant != filename,
+                )
+            except FileNotFound:
+                continue
+            except RETRYABLE_EXCEPTIONS as exc:
+                raise ErrorFileNotFound(f"status_code: {exc}") from exc
+            except CompressionError as exc:
+                raise ErrorFileNotFound(f"bad compressed data: {exc}") from exc
+
+        raise FileNotFound("status_code: 404")
+
+
+class AsyncHTTPSource(HTTPSource):
+    """Source for HTTP/HTTPS requests using asyncio."""
+
+    def __init__(self, source_url, compressed_suffixes=()):
+        self.source_url = source_url.rstrip("/") + "/"
+        self.compressed_suffixes = list(compressed_suffixes)
+        self.client = httpx_async_client()
+
+    @time_download("downloader.download")
+    @backoff.on_exception(
+        wait_gen=backoff.expo,
+        max_tries=5,
+        exception=RETRYABLE_EXCEPTIONS + HTTPX_RETRYABLE_EXCEPTIONS,
+    )
+    async def download_file(self, url, compressed_variant=False):
+        """Downloads file at url and returns bytes
+
+        :arg url: the url of the file to download
+        :arg bool compressed_variant: whether this is a compressed variant; see
+            ``_skip_variant``
+
+        :returns: bytes
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        :raises ConnetionError: if status_code is 500 and retries are exhausted
+
+        """
+        resp = await self.client.get(url)
+        if compressed_variant and resp.status_code != 200:
+            raise self._skip_variant(url, resp.status_code)
+        return decompress_data(self._handle_response(resp.status_code, resp.content))
+
+    @time_download("downloader.download")
+    @backoff.on_exception(
+        wait_gen=backoff.expo,
+        max_tries=5,
+        exception=RETRYABLE_EXCEPTIONS + HTTPX_RETRYABLE_EXCEPTIONS,
+    )
+    async def download_file_to_path(self, url, tmpdir, compressed_variant=False):
+        """Downloads file at url to a temp file streaming it in chunks
+
+        See ``HTTPSource.download_file_to_path``.
+
+        """
+        async with self.client.stream("GET", url) as resp:
+            if resp.status_code != 200:
+                if compressed_variant:
+                    raise self._skip_variant(url, resp.status_code)
+                await resp.aread()
+                self._handle_response(resp.status_code, resp.content)
+
+            # NOTE(willkg): Creating the file, decompressing, and writing are blocking,
+            # so do them in a thread to keep the event loop free to serve other
+            # requests
+            temp_fp = await asyncio.to_thread(create_download_file, tmpdir)
+            path = Path(temp_fp.name)
+            try:
+                decompressor = StreamDecompressor()
+                try:
+                    async for chunk in resp.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        await asyncio.to_thread(
+                            write_decompressed, temp_fp, decompressor, chunk
+                        )
+                    await asyncio.to_thread(write_decompressed, temp_fp, decompressor)
+                finally:
+                    await asyncio.shield(asyncio.to_thread(temp_fp.close))
+
+                check_download_size(
+                    url, resp.headers.get("Content-Length"), resp.num_bytes_downloaded
+                )
+            except BaseException:
+                path.unlink(missing_ok=True)
+                raise
+
+        return path
+
+    async def get(self, debug_filename, debug_id, filename):
         """Retrieve a source url.
 
         :arg str debug_filename: the debug_filename
@@ -153,26 +596,185 @@ class HTTPSource(Source):
             transient error like a timeout or a connection error
 
         """
-        key = self._make_key(debug_filename, debug_id, filename)
-        url = f"{self.source_url}{key}"
+        for variant in self._get_filenames(filename):
+            key = self._make_key(debug_filename, debug_id, variant)
+            url = f"{self.source_url}{key}"
 
-        try:
-            return self.download_file(url)
-        except RETRYABLE_EXCEPTIONS as exc:
-            raise ErrorFileNotFound(f"status_code: {exc}") from exc
+            try:
+                return await self.download_file(
+                    url, compressed_variant=variant != filename
+                )
+            except FileNotFound:
+                continue
+            except RETRYABLE_EXCEPTIONS + HTTPX_RETRYABLE_EXCEPTIONS as exc:
+                raise ErrorFileNotFound(f"status_code: {exc}") from exc
+            except CompressionError as exc:
+                raise ErrorFileNotFound(f"bad compressed data: {exc}") from exc
+
+        raise FileNotFound("status_code: 404")
+
+    async def get_to_file(self, debug_filename, debug_id, filename, tmpdir):
+        """Retrieve a source url and save it to a temp file.
+
+        See ``Source.get_to_file``.
+
+        """
+        for variant in self._get_filenames(filename):
+            key = self._make_key(debug_filename, debug_id, variant)
+            url = f"{self.source_url}{key}"
+
+            try:
+                return await self.download_file_to_path(
+                    url, tmpdir, compressed_variant=variant != filename
+                )
+            except FileNotFound:
+                continue
+            except RETRYABLE_EXCEPTIONS + HTTPX_RETRYABLE_EXCEPTIONS as exc:
+                raise ErrorFileNotFound(f"status_code: {exc}") from exc
+            except CompressionError as exc:
+                raise ErrorFileNotFound(f"bad compressed data: {exc}") from exc
+
+        raise FileNotFound("status_code: 404")
 
 
 class SymbolFileDownloader:
-    """Handles finding SYM files across one or more sources."""
+    """Handles finding SYM files across one or more sources.
+
+    With the ``sequential`` strategy, sources are tried one at a time in order. With
+    the ``concurrent`` strategy, all sources are tried at the same time. With the
+    ``hedged`` strategy, the next source is tried if the previous ones haven't
+    responded after ``hedge_delay`` seconds or as soon as they fail. With the
+    ``concurrent`` and ``hedged`` strategies, the first source to return the file
+    wins and the rest are cancelled.
+
+    Cancelled downloads stop at the next chunk or before the next retry. A
+    download that's waiting on a response or sleeping between retries keeps its
+    worker until then, so there are at most ``MAX_WORKERS_PER_SOURCE`` downloads
+    per source in flight.
 
-    def __init__(self, source_urls):
+    """
+
+    source_class = HTTPSource
+
+    def __init__(
+        self,
+        source_urls,
+        compressed_suffixes=(),
+        strategy=SEQUENTIAL,
+        hedge_delay=0.5,
+    ):
+        self.strategy = parse_strategy(strategy)
+        self.hedge_delay = 0.0 if self.strategy == CONCURRENT else hedge_delay
+        self._executor = None
         self.sources = []
         for source_url in source_urls:
             if source_url.startswith("http"):
-                self.sources.append(HTTPSource(source_url))
+                self.sources.append(
+                    self.source_class(
+                        source_url, compressed_suffixes=compressed_suffixes
+                    )
+                )
             else:
                 raise ValueError("No source for url: %s" % source_url)
 
+    def _use_sequential(self):
+        return self.strategy == SEQUENTIAL or len(self.sources) < 2
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self.sources) * MAX_WORKERS_PER_SOURCE,
+                thread_name_prefix="eliot-download",
+            )
+        return self._executor
+
+    def close(self):
+        """Shuts down the thread pool used for the concurrent and hedged strategies"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _get_hedged(self, fetch, debug_filename, debug_id, filename, cleanup=None):
+        """Gets a file from sources at the same time
+
+        :arg fetch: callable that takes a source and a ``threading.Event`` that's set
+            when the file is no longer needed and returns the file
+        :arg str debug_filename: the debug_filename
+        :arg str debug_id: the debug_id
+        :arg str filename: the symbol filename
+        :arg cleanup: callable that takes the result of a fetch that lost
+
+        :returns: the result of the first fetch that returns the file
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        """
+        executor = self._get_executor()
+        sources = list(self.sources)
+        pending = set()
+        errors = 0
+        # NOTE(willkg): Future.cancel() only cancels fetches that haven't started, so
+        # this stops the ones that are running
+        cancelled = threading.Event()
+
+        def _start_next():
+            if sources:
+                if pending:
+                    METRICS.incr("downloader.hedge")
+                pending.add(executor.submit(fetch, sources.pop(0), cancelled))
+
+        _start_next()
+        if self.hedge_delay <= 0:
+            while sources:
+                _start_next()
+
+        done = []
+        try:
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=self.hedge_delay if sources else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                if not done:
+                    # None of the sources have responded yet, so try the next one
+                    _start_next()
+                    continue
+
+                done = list(done)
+                while done:
+                    try:
+                        return done.pop(0).result()
+                    except ErrorFileNotFound:
+                        errors += 1
+                    except FileNotFound:
+                        pass
+
+                # The sources that responded don't have it, so try the next one now
+                _start_next()
+
+        finally:
+            # Cancel the fetches that lost and whatever is still running
+            cancelled.set()
+            for future in list(done) + list(pending):
+                discard_fetch(future, cleanup)
+
+        self._raise_not_found(errors, debug_filename, debug_id, filename)
+
+    def _raise_not_found(self, errors, debug_filename, debug_id, filename):
+        if errors:
+            raise ErrorFileNotFound(
+                "Error when retrieving file: %s %s %s"
+                % (debug_filename, debug_id, filename)
+            )
+        else:
+            raise FileNotFound(
+                f"File not found: {debug_filename} {debug_id} {filename}"
+            )
+
     def get(self, debug_filename, debug_id, filename):
         """Retrieve a source url.
 
@@ -188,6 +790,16 @@ class SymbolFileDownloader:
             transient error like a timeout or a connection error
 
         """
+        if not self._use_sequential():
+            return self._get_hedged(
+                lambda source, cancelled: source.get(
+                    debug_filename, debug_id, filename, cancelled=cancelled
+                ),
+                debug_filename,
+                debug_id,
+                filename,
+            )
+
         errors = 0
 
         for source in self.sources:
@@ -198,12 +810,186 @@ class SymbolFileDownloader:
             except FileNotFound:
                 continue
 
-        if errors:
-            raise ErrorFileNotFound(
-                "Error when retrieving file: %s %s %s"
-                % (debug_filename, debug_id, filename)
+        self._raise_not_found(errors, debug_filename, debug_id, filename)
+
+    def get_to_file(self, debug_filename, debug_id, filename, tmpdir):
+        """Retrieve a source url and save it to a temp file.
+
+        The caller is responsible for deleting the file.
+
+        :arg str debug_filename: the debug_filename
+        :arg str debug_id: the debug_id
+        :arg str filename: the symbol filename
+        :arg Path tmpdir: the directory to create the temp file in
+
+        :returns: Path of the temp file
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        """
+        if not self._use_sequential():
+            return self._get_hedged(
+                lambda source, cancelled: source.get_to_file(
+                    debug_filename, debug_id, filename, tmpdir, cancelled=cancelled
+                ),
+                debug_filename,
+                debug_id,
+                filename,
+                cleanup=remove_download_file,
             )
-        else:
-            raise FileNotFound(
-                f"File not found: {debug_filename} {debug_id} {filename}"
+
+        errors = 0
+
+        for source in self.sources:
+            try:
+                return source.get_to_file(debug_filename, debug_id, filename, tmpdir)
+            except ErrorFileNotFound:
+                errors += 1
+            except FileNotFound:
+                continue
+
+        self._raise_not_found(errors, debug_filename, debug_id, filename)
+
+
+class AsyncSymbolFileDownloader(SymbolFileDownloader):
+    """Handles finding SYM files across one or more sources using asyncio."""
+
+    source_class = AsyncHTTPSource
+
+    async def _get_hedged(
+        self, fetch, debug_filename, debug_id, filename, cleanup=None
+    ):
+        """Gets a file from sources at the same time
+
+        See ``SymbolFileDownloader._get_hedged``. Since tasks can be cancelled while
+        they're running, ``fetch`` only takes a source.
+
+        """
+        sources = list(self.sources)
+        pending = set()
+        errors = 0
+
+        def _start_next():
+            if sources:
+                if pending:
+                    METRICS.incr("downloader.hedge")
+                pending.add(asyncio.ensure_future(fetch(sources.pop(0))))
+
+        _start_next()
+        if self.hedge_delay <= 0:
+            while sources:
+                _start_next()
+
+        done = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if sources else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # None of the sources have responded yet, so try the next one
+                    _start_next()
+                    continue
+
+                done = list(done)
+                while done:
+                    try:
+                        return done.pop(0).result()
+                    except ErrorFileNotFound:
+                        errors += 1
+                    except FileNotFound:
+                        pass
+
+                # The sources that responded don't have it, so try the next one now
+                _start_next()
+
+        finally:
+            # Cancel the fetches that lost and whatever is still running; this also
+            # covers the case where this coroutine is cancelled
+            for task in list(done) + list(pending):
+                discard_fetch(task, cleanup)
+
+        self._raise_not_found(errors, debug_filename, debug_id, filename)
+
+    async def get(self, debug_filename, debug_id, filename):
+        """Retrieve a source url.
+
+        :arg str debug_filename: the debug_filename
+        :arg str debug_id: the debug_id
+        :arg str filename: the symbol filename
+
+        :returns: bytes
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        """
+        if not self._use_sequential():
+            return await self._get_hedged(
+                lambda source: source.get(debug_filename, debug_id, filename),
+                debug_filename,
+                debug_id,
+                filename,
             )
+
+        errors = 0
+
+        for source in self.sources:
+            try:
+                return await source.get(debug_filename, debug_id, filename)
+            except ErrorFileNotFound:
+                errors += 1
+            except FileNotFound:
+                continue
+
+        self._raise_not_found(errors, debug_filename, debug_id, filename)
+
+    async def get_to_file(self, debug_filename, debug_id, filename, tmpdir):
+        """Retrieve a source url and save it to a temp file.
+
+        The caller is responsible for deleting the file.
+
+        :arg str debug_filename: the debug_filename
+        :arg str debug_id: the debug_id
+        :arg str filename: the symbol filename
+        :arg Path tmpdir: the directory to create the temp file in
+
+        :returns: Path of the temp file
+
+        :raises FileNotFound: if the file cannot be found
+
+        :raises ErrorFileNotFound: if the file cannot be found because of some possibly
+            transient error like a timeout or a connection error
+
+        """
+        if not self._use_sequential():
+            return await self._get_hedged(
+                lambda source: source.get_to_file(
+                    debug_filename, debug_id, filename, tmpdir
+                ),
+                debug_filename,
+                debug_id,
+                filename,
+                cleanup=remove_download_file,
+            )
+
+        errors = 0
+
+        for source in self.sources:
+            try:
+                return await source.get_to_file(
+                    debug_filename, debug_id, filename, tmpdir
+                )
+            except ErrorFileNotFound:
+                errors += 1
+            except FileNotFound:
+                continue
+
+        self._raise_not_found(errors, debug_filename, debug_id, filename)
@@ -0,0 +1,202 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Eviction policies for the disk cache manager.
+
+A policy keeps track of the files in the cache and decides which file to evict
+next. The cache manager tells the policy when files are added, accessed, and
+removed.
+"""
+
+from collections import OrderedDict
+import heapq
+import itertools
+
+
+class EvictionPolicy:
+    """Defines an eviction policy"""
+
+    name = "base"
+
+    # Whether the policy uses the cost of files; if it doesn't, the cache manager
+    # doesn't look up costs
+    uses_cost = False
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, path):
+        raise NotImplementedError
+
+    def add(self, path, size, cost=None):
+        """Adds a file or updates its size
+
+        :arg str path: path of the file
+        :arg int size: size of the file in bytes
+        :arg float cost: cost of building the file again in seconds or None; if None
+            when updating a file, the file keeps its cost
+
+        """
+        raise NotImplementedError
+
+    def access(self, path):
+        """Records that a file was used
+
+        :arg str path: path of the file
+
+        """
+        raise NotImplementedError
+
+    def remove(self, path):
+        """Removes a file that was deleted by something other than eviction
+
+        :arg str path: path of the file
+
+        """
+        raise NotImplementedError
+
+    def pop_victim(self):
+        """Removes and returns the file to evict next
+
+        :returns: path of the file
+
+        :raises KeyError: if there are no files
+
+        """
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Evicts the least recently used file"""
+
+    name = "lru"
+
+    def __init__(self):
+        self._files = OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, path):
+        return path in self._files
+
+    def add(self, path, size, cost=None):
+        self._files[path] = None
+        self._files.move_to_end(path, last=True)
+
+    def access(self, path):
+        if path in self._files:
+            self._files.move_to_end(path, last=True)
+
+    def remove(self, path):
+        self._files.pop(path, None)
+
+    def pop_victim(self):
+        return self._files.popitem(last=False)[0]
+
+
+class GDSFPolicy(EvictionPolicy):
+    """Greedy-Dual-Size-Frequency policy
+
+    Each file has a priority of ``L + frequency * cost / size`` and the file with
+    the lowest priority is evicted. ``L`` is the priority of the last evicted file,
+    so files that haven't been used in a while age out.
+
+    This keeps small, frequently used files and files that are expensive to build
+    again over large, rarely used files. Files without a cost get
+    ``default_cost``, so if no files have costs, this is a size-aware LFU.
+
+    """
+
+    name = "gdsf"
+    uses_cost = True
+
+    # Rebuild the heap when it has this many times more items than there are files
+    # to clear out stale items
+    HEAP_COMPACT_FACTOR = 4
+
+    def __init__(self, default_cost=1.0):
+        self.default_cost = default_cost
+        # Inflation value; this is the priority of the last evicted file
+        self.inflation = 0.0
+        # path -> [priority, frequency, cost, size, seq]
+        self._files = {}
+        # Heap of (priority, seq, path); items are stale if the seq doesn't match
+        # the file's seq
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, path):
+        return path in self._files
+
+    def _push(self, path, entry):
+        _, frequency, cost, size, _ = entry
+        entry[0] = self.inflation + frequency * cost / max(size, 1)
+        entry[4] = next(self._counter)
+        heapq.heappush(self._heap, (entry[0], entry[4], path))
+
+        if len(self._heap) > self.HEAP_COMPACT_FACTOR * max(len(self._files), 1):
+            self._heap = [
+                (entry[0], entry[4], path) for path, entry in self._files.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def add(self, path, size, cost=None):
+        entry = self._files.get(path)
+        if entry is None:
+            entry = [0.0, 1, self.default_cost if cost is None else cost, size, 0]
+            self._files[path] = entry
+        else:
+            entry[3] = size
+            if cost is not None:
+                entry[2] = cost
+        self._push(path, entry)
+
+    def access(self, path):
+        entry = self._files.get(path)
+        if entry is not None:
+            entry[1] += 1
+            self._push(path, entry)
+
+    def remove(self, path):
+        self._files.pop(path, None)
+
+    def pop_victim(self):
+        while self._heap:
+            priority, seq, path = heapq.heappop(self._heap)
+            entry = self._files.get(path)
+            if entry is not None and entry[4] == seq:
+                del self._files[path]
+                self.inflation = priority
+                return path
+        raise KeyError("pop_victim(): no files")
+
+
+EVICTION_POLICIES = {
+    LRUPolicy.name: LRUPolicy,
+    GDSFPolicy.name: GDSFPolicy,
+}
+
+
+def parse_eviction_policy(value):
+    """Parses an eviction policy name
+
+    :arg str value: name of the policy
+
+    :returns: the policy class
+
+    :raises ValueError: if the policy is unknown
+
+    """
+    name = value.strip().lower()
+    if name not in EVICTION_POLICIES:
+        raise ValueError(
+            f"unknown eviction policy {value!r}; expected one of "
+            + ", ".join(EVICTION_POLICIES)
+        )
+    return EVICTION_POLICIES[name]
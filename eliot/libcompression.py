@@ -0,0 +1,269 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Compression codecs for cache entries and downloads.
+"""
+
+import zlib
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Magic bytes at the start of gzip and Zstandard compressed data
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class CompressionError(Exception):
+    """Exception for errors hit when compressing or decompressing data"""
+
+
+class ZstdCompressor:
+    """Compressor using Zstandard
+
+    Zstandard compresses symcaches several times smaller and decompresses quickly.
+
+    """
+
+    name = "zstd"
+
+    def __init__(self, level=3):
+        """
+        :arg int level: compression level
+        """
+        self.level = level
+
+    def compress(self, data):
+        """Compress data
+
+        :arg data: bytes-like object to compress
+
+        :returns: bytes
+
+        """
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        """Decompress data
+
+        :arg data: bytes-like object to decompress
+
+        :returns: bytes
+
+        :raises CompressionError: if the data isn't valid
+
+        """
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as exc:
+            raise CompressionError(str(exc)) from exc
+
+
+class Lz4Compressor:
+    """Compressor using LZ4
+
+    LZ4 doesn't compress as well as Zstandard, but it's faster at decompressing.
+
+    """
+
+    name = "lz4"
+
+    def compress(self, data):
+        """Compress data
+
+        :arg data: bytes-like object to compress
+
+        :returns: bytes
+
+        """
+        return lz4.frame.compress(data)
+
+    def decompress(self, data):
+        """Decompress data
+
+        :arg data: bytes-like object to decompress
+
+        :returns: bytes
+
+        :raises CompressionError: if the data isn't valid
+
+        """
+        try:
+            return lz4.frame.decompress(data)
+        except RuntimeError as exc:
+            raise CompressionError(str(exc)) from exc
+
+
+COMPRESSORS = {
+    "zstd": ZstdCompressor,
+    "lz4": Lz4Compressor,
+}
+
+
+def get_compressor(name):
+    """Returns a compressor instance
+
+    :arg name: "none", "zstd", or "lz4"
+
+    :returns: compressor instance or None for "none"
+
+    :raises ValueError: if the compressor is unknown or unavailable
+
+    """
+    if name == "none":
+        return None
+
+    if name not in COMPRESSORS:
+        raise ValueError(f"unknown compression {name!r}")
+
+    if (name == "zstd" and zstandard is None) or (name == "lz4" and lz4 is None):
+        raise ValueError(
+            f"compression {name!r} requires a library which is not installed"
+        )
+
+    return COMPRESSORS[name]()
+
+
+class StreamDecompressor:
+    """Decompresses data that might be gzip or Zstandard compressed in chunks
+
+    The compression is detected from the magic bytes at the start of the data.
+    Data that isn't compressed is passed through as is. This lets sym files be
+    decompressed as they're downloaded regardless of how they were stored.
+
+    Compressed data can have multiple gzip members or Zstandard frames like
+    ``gzip`` and ``zstd`` produce when files are concatenated. Anything else after
+    the compressed data is an error.
+
+    """
+
+    def __init__(self):
+        # Data held until there's enough to check the magic bytes
+        self._head = b""
+        self._sniffed = False
+        self._decompressobj = None
+        # Magic bytes of the compression
+        self._magic = None
+        # Data after the end of a gzip member or Zstandard frame held until there's
+        # enough to check the magic bytes of the next one
+        self._tail = b""
+        # Name of the compression of the data or None if it's not compressed
+        self.compression = None
+
+    def _sniff(self, head):
+        if head.startswith(GZIP_MAGIC):
+            self.compression = "gzip"
+            self._magic = GZIP_MAGIC
+        elif head.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise CompressionError("zstd compressed data requires zstandard")
+            self.compression = "zstd"
+            self._magic = ZSTD_MAGIC
+        if self.compression is not None:
+            self._decompressobj = self._new_decompressobj()
+        self._sniffed = True
+
+    def _new_decompressobj(self):
+        if self.compression == "gzip":
+            return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def _decompress(self, data):
+        parts = []
+        while data:
+            if self._decompressobj.eof:
+                # The previous member or frame ended, so this must be the start of
+                # the next one
+                data = self._tail + data
+                if len(data) < len(self._magic):
+                    self._tail = data
+                    break
+                self._tail = b""
+                if not data.startswith(self._magic):
+                    raise CompressionError(
+                        f"trailing data after {self.compression} data"
+                    )
+                self._decompressobj = self._new_decompressobj()
+
+            parts.append(self._decompress_member(data))
+            data = self._decompressobj.unused_data if self._decompressobj.eof else b""
+        return b"".join(parts)
+
+    def _decompress_member(self, data):
+        try:
+            return self._decompressobj.decompress(data)
+        except zlib.error as exc:
+            raise CompressionError(str(exc)) from exc
+        except Exception as exc:
+            if zstandard is not None and isinstance(exc, zstandard.ZstdError):
+                raise CompressionError(str(exc)) from exc
+            raise
+
+    def decompress(self, chunk):
+        """Decompress a chunk of data
+
+        :arg chunk: bytes-like object with the next chunk of data
+
+        :returns: bytes which might be empty
+
+        :raises CompressionError: if the data isn't valid
+
+        """
+        if not self._sniffed:
+            self._head += chunk
+            if len(self._head) < len(ZSTD_MAGIC):
+                return b""
+            chunk, self._head = self._head, b""
+            self._sniff(chunk)
+
+        if self._decompressobj is None:
+            return chunk
+        return self._decompress(chunk)
+
+    def flush(self):
+        """Finish decompressing the data
+
+        :returns: any remaining bytes
+
+        :raises CompressionError: if the compressed data was incomplete
+
+        """
+        if not self._sniffed:
+            # The data was too short to be compressed
+            head, self._head = self._head, b""
+            self._sniffed = True
+            return head
+
+        if self._decompressobj is None:
+            return b""
+
+        data = self._decompressobj.flush()
+        if not self._decompressobj.eof:
+            raise CompressionError(f"incomplete {self.compression} data")
+        if self._tail:
+            raise CompressionError(f"trailing data after {self.compression} data")
+        return data
+
+
+def decompress_data(data):
+    """Decompress data that might be gzip or Zstandard compressed
+
+    :arg data: bytes
+
+    :returns: decompressed bytes or data as is if it's not compressed
+
+    :raises CompressionError: if the data isn't valid
+
+    """
+    decompressor = StreamDecompressor()
+    return decompressor.decompress(data) + decompressor.flush()
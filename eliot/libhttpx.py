@@ -0,0 +1,35 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Utilities for using the httpx library.
+"""
+
+import httpx
+
+
+# Exceptions that indicate an HTTP request should be retried; this covers connection
+# errors, timeouts, protocol errors, and proxy errors
+RETRYABLE_EXCEPTIONS = (httpx.TransportError,)
+
+
+def httpx_async_client(default_timeout=5.0, transport=None):
+    """Returns an httpx AsyncClient that has a default timeout
+
+    :arg varies default_timeout: number of seconds before timing out
+
+        This can be a float or an httpx.Timeout.
+
+    :arg transport: an httpx transport to use; this is helpful for testing
+
+    :returns: an httpx AsyncClient instance
+
+    """
+    return httpx.AsyncClient(
+        # Set the User-Agent header so we can distinguish our stuff from other stuff
+        headers={"User-Agent": "eliot-httpx/1.0"},
+        timeout=default_timeout,
+        follow_redirects=True,
+        transport=transport,
+    )
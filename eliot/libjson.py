@@ -0,0 +1,134 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+JSON codecs for encoding and decoding symbolication API payloads.
+"""
+
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibJSONCodec:
+    """JSON codec using the Python standard library json module"""
+
+    name = "stdlib"
+
+    # Separators used by json.dumps; these are used when encoding in parts
+    item_separator = b", "
+    key_separator = b": "
+
+    def loads(self, data):
+        """Decode JSON
+
+        :arg data: bytes or str
+
+        :returns: decoded value
+
+        :raises json.JSONDecodeError: if the data isn't valid JSON
+
+        """
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """Encode obj as JSON
+
+        :arg obj: the value to encode
+
+        :returns: bytes
+
+        """
+        return json.dumps(obj).encode("utf-8")
+
+
+# Matches numbers with enough digits that they might be integers that don't fit in
+# 64 bits
+LONG_NUMBER_RE = re.compile(rb"\d{19,}")
+
+
+class OrjsonJSONCodec:
+    """JSON codec using orjson
+
+    orjson is several times faster than the json module. Its output is compact and
+    UTF-8 encoded, so it differs from the stdlib codec's output byte for byte, but
+    it's the same JSON.
+
+    """
+
+    name = "orjson"
+
+    item_separator = b","
+    key_separator = b":"
+
+    def loads(self, data):
+        """Decode JSON
+
+        :arg data: bytes or str
+
+        :returns: decoded value
+
+        :raises json.JSONDecodeError: if the data isn't valid JSON
+
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        # NOTE(willkg): orjson decodes integers that don't fit in 64 bits as floats,
+        # so use the json module when there might be any
+        if LONG_NUMBER_RE.search(data):
+            return json.loads(data)
+
+        # NOTE(willkg): orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        """Encode obj as JSON
+
+        :arg obj: the value to encode
+
+        :returns: bytes
+
+        """
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson doesn't handle some values like integers that don't fit in 64
+            # bits, so fall back to the json module for those
+            return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode(
+                "utf-8"
+            )
+
+
+CODECS = {
+    "stdlib": StdlibJSONCodec,
+    "orjson": OrjsonJSONCodec,
+}
+
+
+def get_json_codec(name):
+    """Returns a JSON codec instance
+
+    :arg name: "auto", "orjson", or "stdlib"; "auto" picks the fastest codec that's
+        available
+
+    :returns: JSON codec instance
+
+    :raises ValueError: if the codec is unknown or unavailable
+
+    """
+    if name == "auto":
+        name = "orjson" if orjson is not None else "stdlib"
+
+    if name not in CODECS:
+        raise ValueError(f"unknown JSON codec {name!r}")
+
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON codec 'orjson' requires orjson which is not installed")
+
+    return CODECS[name]()
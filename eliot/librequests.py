@@ -8,7 +8,7 @@ Utilities for using the requests library.
 
 import requests
 from requests.adapters import HTTPAdapter
-from requests.exceptions import ConnectionError, ReadTimeout
+from requests.exceptions import ChunkedEncodingError, ConnectionError, ReadTimeout
 from urllib3.util.retry import (
     ConnectTimeoutError,
     ProtocolError,
@@ -19,6 +19,7 @@ from urllib3.util.retry import (
 
 # Exceptions that indicate an HTTP request should be retried
 RETRYABLE_EXCEPTIONS = (
+    ChunkedEncodingError,
     ConnectionError,
     ConnectTimeoutError,
     ProtocolError,
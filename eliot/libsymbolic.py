@@ -6,8 +6,13 @@
 Utilities for using symbolic library.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 import logging
+import multiprocessing
+import os
+import threading
 
 import symbolic
 
@@ -45,15 +50,26 @@ def get_module_filename(sym_file, debug_filename):
 
     On other platforms, this is the debug_filename.
 
-    :arg bytes sym_file: the sym file as bytes
+    :arg sym_file: the sym file as bytes or the path of the sym file
     :arg str debug_filename: the debug filename
 
     :returns: the module filename
 
     """
+    if isinstance(sym_file, os.PathLike):
+        # Only the first few lines get read, so don't read the whole file
+        with open(sym_file, "rb") as fp:
+            return _get_module_filename_from_lines(fp, debug_filename)
+
+    return _get_module_filename_from_lines(
+        bytes_split_generator(sym_file, b"\n"), debug_filename
+    )
+
+
+def _get_module_filename_from_lines(lines, debug_filename):
     # Iterate through the first few lines of the file until we hit FILE in which
     # case there's no INFO for some reason or we hit the first INFO.
-    for line in bytes_split_generator(sym_file, b"\n"):
+    for line in lines:
         if line.startswith(b"INFO"):
             parts = line.split(b" ")
             if len(parts) == 4:
@@ -82,6 +98,12 @@ class ParseSymFileError(Exception):
     def __init__(self, reason_code, msg):
         super().__init__(f"{reason_code}: {msg}")
         self.reason_code = reason_code
+        self.msg = msg
+
+    def __reduce__(self):
+        # This gets raised in parse pool worker processes, so it needs to survive
+        # pickling
+        return (self.__class__, (self.reason_code, self.msg))
 
 
 def convert_debug_id(debug_id):
@@ -104,9 +126,11 @@ def convert_debug_id(debug_id):
 def parse_sym_file(debug_filename, debug_id, data):
     """Convert sym file to symcache file
 
+    If data is a path, the sym file is mmapped rather than read into memory.
+
     :arg debug_filename: the debug filename
     :arg debug_id: the debug id
-    :arg data: bytes
+    :arg data: the sym file as bytes or the path of the sym file
 
     :returns: symcache or None
 
@@ -119,7 +143,10 @@ def parse_sym_file(debug_filename, debug_id, data):
     sdebug_id = convert_debug_id(debug_id)
 
     try:
-        archive = symbolic.Archive.from_bytes(data)
+        if isinstance(data, os.PathLike):
+            archive = symbolic.Archive.open(os.fspath(data))
+        else:
+            archive = symbolic.Archive.from_bytes(data)
         obj = archive.get_object(debug_id=sdebug_id)
         symcache = obj.make_symcache()
 
@@ -146,6 +173,126 @@ def parse_sym_file(debug_filename, debug_id, data):
     return symcache
 
 
+def parse_sym_file_to_bytes(debug_filename, debug_id, data):
+    """Convert sym file to symcache bytes
+
+    This is the function that runs in parse pool worker processes. It returns bytes
+    because symcache instances can't be pickled.
+
+    :arg debug_filename: the debug filename
+    :arg debug_id: the debug id
+    :arg data: the sym file as bytes or the path of the sym file
+
+    :returns: symcache as bytes
+
+    :raises BadDebugIDError: if the debug_id is invalid
+
+    :raises ParseSymFileError: if the SYM file isn't parseable, doesn't have the debug
+        id, or some other problem
+
+    """
+    return symcache_to_bytes(parse_sym_file(debug_filename, debug_id, data))
+
+
+class ParseSymFilePool:
+    """Process pool for converting sym files to symcaches
+
+    Parsing large sym files is CPU-heavy and holds the GIL. Doing it in worker
+    processes lets the web process continue handling other requests.
+
+    The pool is created lazily on first use so it's not shared across forks.
+
+    :arg size: the number of worker processes
+    :arg max_tasks_per_child: the number of sym files a worker process parses before
+        it's replaced with a new one; 0 means worker processes are never replaced
+    :arg timeout: the number of seconds to wait for a parse; None means wait forever
+
+    """
+
+    def __init__(self, size, max_tasks_per_child=0, timeout=None):
+        self.size = size
+        self.max_tasks_per_child = max_tasks_per_child
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # NOTE(willkg): max_tasks_per_child doesn't work with the "fork" start
+                # method and forking a multi-threaded process is risky anyhow
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=self.max_tasks_per_child or None,
+                )
+            return self._executor
+
+    def _discard_executor(self, executor, terminate=False):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if terminate:
+            # NOTE(willkg): ProcessPoolExecutor can't stop a task that's running, so
+            # kill the worker processes
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def parse_sym_file(self, debug_filename, debug_id, data):
+        """Convert sym file to symcache bytes in a worker process
+
+        If the parse times out, the worker processes are killed and the pool is
+        replaced since a running parse can't be cancelled. Other parses running in
+        the pool at the same time fail.
+
+        Passing the path of the sym file rather than bytes avoids copying the sym
+        file to the worker process.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg data: the sym file as bytes or the path of the sym file
+
+        :returns: symcache as bytes
+
+        :raises BadDebugIDError: if the debug_id is invalid
+
+        :raises ParseSymFileError: if the SYM file isn't parseable, doesn't have the
+            debug id, the parse timed out, or the worker process died
+
+        """
+        executor = self._get_executor()
+        try:
+            future = executor.submit(
+                parse_sym_file_to_bytes, debug_filename, debug_id, data
+            )
+            return future.result(timeout=self.timeout)
+
+        except TimeoutError as exc:
+            self._discard_executor(executor, terminate=True)
+            raise ParseSymFileError(
+                reason_code="sym_parse_timeout",
+                msg=f"timed out parsing sym file {debug_filename!r} {debug_id!r}",
+            ) from exc
+
+        except BrokenProcessPool as exc:
+            # A worker process died--probably killed for using too much memory--so
+            # the pool is unusable and we need a new one
+            self._discard_executor(executor)
+            raise ParseSymFileError(
+                reason_code="sym_parse_pool_error",
+                msg=f"parse pool broke parsing sym file {debug_filename!r} {debug_id!r}",
+            ) from exc
+
+    def shutdown(self):
+        """Shut down worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
 def bytes_to_symcache(data):
     """Convert a bytes into a symcache
 
@@ -157,6 +304,19 @@ def bytes_to_symcache(data):
     return symbolic.SymCache.from_bytes(data)
 
 
+def open_symcache(path):
+    """Open a symcache file using mmap
+
+    The symcache file must start with the symcache data. Trailing data is ignored.
+
+    :arg path: the path of the symcache file
+
+    :returns: a symcache instance
+
+    """
+    return symbolic.SymCache.open(str(path))
+
+
 def symcache_to_bytes(symcache):
     """Convert a symcache to bytes
 
@@ -23,17 +23,23 @@ Resource implementing the Symbolication v4 and v5 APIs.
 
 """
 
+import asyncio
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
-from itertools import groupby
 import json
 import logging
+from pathlib import Path
 import re
+import threading
 import time
+from typing import NamedTuple
 
 import falcon
 
 from eliot import downloader
+from eliot.cache import AccessThrottle, CacheReadError, NegativeCache
+from eliot.libjson import StdlibJSONCodec
 from eliot.libmarkus import METRICS
 from eliot.libsymbolic import (
     BadDebugIDError,
@@ -49,10 +55,15 @@ LOGGER = logging.getLogger(__name__)
 
 
 class DebugStats:
-    """Class for keeping track of metrics and such."""
+    """Class for keeping track of metrics and such.
+
+    This is thread-safe so it can be shared by module fetching threads.
+
+    """
 
     def __init__(self):
         self.data = {}
+        self._lock = threading.RLock()
 
     def _setvalue(self, data, key, value):
         ptr = data
@@ -83,11 +94,13 @@ class DebugStats:
         return self._getvalue(self.data, key=key, default=default)
 
     def set(self, key, value):
-        self._setvalue(self.data, key=key, value=value)
+        with self._lock:
+            self._setvalue(self.data, key=key, value=value)
 
     def incr(self, key, value=1):
-        current_value = self._getvalue(self.data, key=key, default=0)
-        self._setvalue(self.data, key=key, value=current_value + value)
+        with self._lock:
+            current_value = self._getvalue(self.data, key=key, default=0)
+            self._setvalue(self.data, key=key, value=current_value + value)
 
     @contextlib.contextmanager
     def timer(self, key):
@@ -97,7 +110,7 @@ class DebugStats:
 
         end_time = time.perf_counter()
         delta = end_time - start_time
-        self._setvalue(self.data, key, delta)
+        self.set(key, delta)
 
 
 class InvalidModules(Exception):
@@ -118,6 +131,13 @@ VALID_DEBUG_FILENAME = re.compile(r"^([A-Za-z0-9_.+{}@<> -]*)$")
 # Maximum number of symbolication jobs to do in a single request
 MAX_JOBS = 10
 
+# Size in bytes of chunks written when streaming responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# How many levels of a symbolicate/v5 response to encode piece by piece when streaming:
+# response -> results -> result -> stacks; each stack is encoded in one go
+V5_STREAM_DEPTH = 4
+
 
 def validate_modules(modules):
     """Validate modules and raise an error if invalid
@@ -199,30 +219,94 @@ def validate_stacks(stacks, modules):
                 )
 
 
+def get_sym_filename(debug_filename):
+    """Returns the sym filename for a debug filename
+
+    :arg debug_filename: the debug filename
+
+    :returns: the sym filename
+
+    """
+    if debug_filename.endswith(".pdb"):
+        return debug_filename[:-4] + ".sym"
+    return debug_filename + ".sym"
+
+
+def get_cache_key(debug_filename, debug_id):
+    """Returns the cache key for the symcache for a module
+
+    :arg debug_filename: the debug filename
+    :arg debug_id: the debug id
+
+    :returns: the cache key
+
+    """
+    return "%s/%s.symc" % (
+        debug_filename.replace("/", ""),
+        debug_id.upper().replace("/", ""),
+    )
+
+
 class SymbolicateBase:
-    def __init__(self, downloader, cache, tmpdir):
+    def __init__(
+        self,
+        downloader,
+        cache,
+        tmpdir,
+        memory_cache=None,
+        fetch_concurrency=1,
+        singleflight=None,
+        parse_pool=None,
+        negative_cache=None,
+        stream_responses=False,
+        json_codec=None,
+        lookup_cache=None,
+        shared_cache=None,
+        stream_downloads=False,
+    ):
         self.downloader = downloader
         self.cache = cache
         self.tmpdir = tmpdir
+        self.memory_cache = memory_cache
+        self.fetch_concurrency = fetch_concurrency
+        self.singleflight = singleflight
+        self.parse_pool = parse_pool
+        self.negative_cache = negative_cache
+        self.stream_responses = stream_responses
+        self.json_codec = json_codec or StdlibJSONCodec()
+        self.lookup_cache = lookup_cache
+        self.shared_cache = shared_cache
+        self.stream_downloads = stream_downloads
+        # Memory cache hits don't read the file in the disk cache, so accesses have
+        # to be recorded for the Disk Cache Manager
+        self.access_throttle = AccessThrottle()
+        self._fetch_executor = None
 
     def download_sym_file(self, debug_filename, debug_id):
         """Download a symbol file.
 
+        If ``stream_downloads`` is True, the sym file is streamed to a temp file in
+        ``tmpdir`` rather than held in memory. The caller is responsible for deleting
+        the temp file.
+
         :arg debug_filename: the debug filename
         :arg debug_id: the debug id
 
-        :returns: sym file as bytes or None
+        :returns: sym file as bytes, Path of the sym file, or None
 
         """
-        if debug_filename.endswith(".pdb"):
-            sym_filename = debug_filename[:-4] + ".sym"
-        else:
-            sym_filename = debug_filename + ".sym"
+        sym_filename = get_sym_filename(debug_filename)
 
         try:
-            data = self.downloader.get(debug_filename, debug_id, sym_filename)
+            if self.stream_downloads:
+                data = self.downloader.get_to_file(
+                    debug_filename, debug_id, sym_filename, self.tmpdir
+                )
+            else:
+                data = self.downloader.get(debug_filename, debug_id, sym_filename)
 
         except downloader.FileNotFound:
+            self.set_missing(debug_filename, debug_id, NegativeCache.NOT_FOUND)
             return None
 
         except downloader.ErrorFileNotFound:
@@ -230,11 +314,45 @@ class SymbolicateBase:
             # raise a HTTP 500 because the symbolication request can't be fulfilled.
             # The downloader will capture these issues and at some point, we'll feel
             # stable and can switch this then.
+            self.set_missing(debug_filename, debug_id, NegativeCache.ERROR)
             return None
 
         return data
 
-    @METRICS.timer_decorator("symbolicate.parse_sym_file.parse")
+    def set_missing(self, debug_filename, debug_id, reason):
+        """Records that the sym file for a module couldn't be downloaded.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg reason: ``NegativeCache.NOT_FOUND`` or ``NegativeCache.ERROR``
+
+        """
+        if self.negative_cache is not None:
+            self.negative_cache.set(get_cache_key(debug_filename, debug_id), reason)
+
+    def close(self):
+        """Shuts down the thread pool used to get symcaches."""
+        if self._fetch_executor is not None:
+            self._fetch_executor.shutdown(wait=True)
+            self._fetch_executor = None
+
+    def is_missing(self, cache_key, debug_stats):
+        """Returns whether the sym file for a module is known to be missing.
+
+        :arg cache_key: the cache key for the symcache
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: bool
+
+        """
+        if self.negative_cache is None:
+            return False
+
+        missing = self.negative_cache.get(cache_key) is not None
+        debug_stats.incr("cache_lookups.negative_hits", 1 if missing else 0)
+        return missing
+
     def parse_sym_file(self, debug_filename, debug_id, data):
         """Convert sym file to symcache file
 
@@ -244,9 +362,39 @@ class SymbolicateBase:
 
         :returns: symcache or None
 
+        """
+        ret = self.build_symcache_data(debug_filename, debug_id, data)
+        if ret is None:
+            return None
+
+        symcache, symcache_data = ret
+        if symcache is None:
+            symcache = bytes_to_symcache(symcache_data)
+        return symcache
+
+    @METRICS.timer_decorator("symbolicate.parse_sym_file.parse")
+    def build_symcache_data(self, debug_filename, debug_id, data):
+        """Parse a sym file into a symcache or symcache bytes
+
+        If there's a parse pool, the sym file is parsed in a worker process which
+        returns the symcache as bytes. Those bytes can be written to the cache as is,
+        so they're not converted to a symcache in this process.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg data: bytes or the Path of the sym file
+
+        :returns: ``(symcache, None)`` if parsed in this process, ``(None,
+            symcache_data)`` if parsed in the parse pool, or None if the sym file
+            couldn't be parsed
+
         """
         try:
-            return parse_sym_file(debug_filename, debug_id, data)
+            if self.parse_pool is not None:
+                return None, self.parse_pool.parse_sym_file(
+                    debug_filename, debug_id, data
+                )
+            return parse_sym_file(debug_filename, debug_id, data), None
 
         except BadDebugIDError:
             # If the debug id isn't valid, then there's nothing to parse, so
@@ -266,7 +414,9 @@ class SymbolicateBase:
     def get_symcache(self, debug_filename, debug_id, debug_stats):
         """Gets the symcache for a given module.
 
-        This uses the cachemanager and downloader to get the symcache.
+        This uses the memory cache, disk cache, and downloader to get the symcache.
+        If a singleflight is set, only one thread or process on the node builds the
+        symcache for a module at a time and the others wait and use the result.
 
         :arg debug_filename: the debug filename
         :arg debug_id: the debug id
@@ -281,6 +431,46 @@ class SymbolicateBase:
             # download, so return None
             return
 
+        cache_key = get_cache_key(debug_filename, debug_id)
+
+        ret = self.get_cached_symcache(cache_key, debug_stats)
+        if ret is not None:
+            return ret
+
+        # If we recently failed to download the sym file for this module, don't try
+        # again until the negative cache entry expires
+        if self.is_missing(cache_key, debug_stats):
+            return
+
+        if self.singleflight is None:
+            return self.build_symcache(debug_filename, debug_id, cache_key, debug_stats)
+
+        # Only one thread or process on this node should download and parse a given
+        # module at a time. If we had to wait for the lock, then someone else was
+        # building the symcache, so check the caches again before building it.
+        with self.singleflight.lock(cache_key) as waited:
+            if waited:
+                ret = self.get_cached_symcache(cache_key, debug_stats)
+                if ret is not None:
+                    return ret
+
+                if self.is_missing(cache_key, debug_stats):
+                    return
+
+            return self.build_symcache(debug_filename, debug_id, cache_key, debug_stats)
+
+    def get_cached_symcache(self, cache_key, debug_stats):
+        """Gets the symcache for a given cache key from the caches.
+
+        This checks the memory cache, the shared cache, and then the disk cache.
+
+        :arg cache_key: the cache key for the symcache
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: ``(symcache, filename)`` or ``None``
+
+        """
         symcache = None
         module_filename = None
 
@@ -288,15 +478,40 @@ class SymbolicateBase:
         start_time = time.perf_counter()
         debug_stats.incr("cache_lookups.count", 1)
 
-        cache_key = "%s/%s.symc" % (
-            debug_filename.replace("/", ""),
-            debug_id.upper().replace("/", ""),
-        )
+        if self.memory_cache is not None:
+            # Pull the symcache from the memory cache if we can; this avoids reading
+            # and converting the symcache file for hot modules
+            ret = self.memory_cache.get(cache_key)
+            if ret is not None:
+                if self.access_throttle.should_record(cache_key):
+                    self.cache.touch(cache_key)
+                debug_stats.incr("cache_lookups.hits", 1)
+                debug_stats.incr("cache_lookups.memory_hits", 1)
+                end_time = time.perf_counter()
+                debug_stats.incr("cache_lookups.time", end_time - start_time)
+                return ret
+
+            debug_stats.incr("cache_lookups.memory_hits", 0)
+
+        if self.shared_cache is not None:
+            # Map the symcache file from the disk cache if we can; the mapped pages
+            # are shared with the other processes on the node. These don't go in the
+            # memory cache so that the shared cache can let go of files that get
+            # evicted.
+            ret = self.shared_cache.get(cache_key)
+            if ret is not None:
+                debug_stats.incr("cache_lookups.hits", 1)
+                debug_stats.incr("cache_lookups.shared_hits", 1)
+                end_time = time.perf_counter()
+                debug_stats.incr("cache_lookups.time", end_time - start_time)
+                return ret
+
+            debug_stats.incr("cache_lookups.shared_hits", 0)
 
         try:
             # Pull the symcache file from cache if we can
-            data = self.cache.get(cache_key)
-            symcache = bytes_to_symcache(data["symcache"])
+            data = self.cache.get_symcache(cache_key)
+            symcache = data["symcache"]
             module_filename = data["filename"]
             debug_stats.incr("cache_lookups.hits", 1)
         except KeyError:
@@ -306,13 +521,83 @@ class SymbolicateBase:
         debug_stats.incr("cache_lookups.time", end_time - start_time)
 
         if symcache:
+            if self.memory_cache is not None:
+                self.memory_cache.set(
+                    cache_key, (symcache, module_filename), data["size"]
+                )
+                # Reading the file was recorded as an access
+                self.access_throttle.recorded(cache_key)
             return symcache, module_filename
 
+    def build_symcache(self, debug_filename, debug_id, cache_key, debug_stats):
+        """Downloads and parses the sym file for a module and caches the symcache.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg cache_key: the cache key for the symcache
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: ``(symcache, filename)`` or ``None``
+
+        """
         # We didn't find it in the cache, so try to download it
         download_start_time = time.perf_counter()
         sym_file = self.download_sym_file(debug_filename, debug_id)
         download_end_time = time.perf_counter()
 
+        try:
+            return self.process_sym_file(
+                debug_filename,
+                debug_id,
+                cache_key,
+                sym_file,
+                download_end_time - download_start_time,
+                debug_stats,
+            )
+        finally:
+            if isinstance(sym_file, Path):
+                sym_file.unlink(missing_ok=True)
+
+    def open_written_symcache(self, cache_key, symcache_data):
+        """Opens a symcache that was just written to the disk cache
+
+        Uncompressed symcache files are mapped, so the symcache bytes from the parse
+        pool don't have to be converted in this process.
+
+        :arg cache_key: the cache key for the symcache
+        :arg symcache_data: the symcache bytes that were written
+
+        :returns: symcache
+
+        """
+        if self.cache.compressor is None:
+            try:
+                return self.cache.read_symcache_from_file(
+                    self.cache.key_to_filepath(cache_key)
+                )["symcache"]
+            except CacheReadError:
+                LOGGER.exception("Cache error on read")
+
+        return bytes_to_symcache(symcache_data)
+
+    def process_sym_file(
+        self, debug_filename, debug_id, cache_key, sym_file, download_time, debug_stats
+    ):
+        """Parses a downloaded sym file and caches the symcache.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg cache_key: the cache key for the symcache
+        :arg sym_file: the sym file as bytes, the Path of the sym file, or None if
+            it wasn't downloaded
+        :arg download_time: how long the download took in seconds
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: ``(symcache, filename)`` or ``None``
+
+        """
         debug_stats.incr("downloads.count", 1)
 
         if sym_file is None:
@@ -324,7 +609,7 @@ class SymbolicateBase:
                     "fail_time_per_module",
                     f"{debug_filename}/{debug_id}",
                 ],
-                download_end_time - download_start_time,
+                download_time,
             )
             return
 
@@ -334,7 +619,7 @@ class SymbolicateBase:
                 "size_per_module",
                 f"{debug_filename}/{debug_id}",
             ],
-            len(sym_file),
+            sym_file.stat().st_size if isinstance(sym_file, Path) else len(sym_file),
         )
         debug_stats.incr(
             [
@@ -342,7 +627,7 @@ class SymbolicateBase:
                 "time_per_module",
                 f"{debug_filename}/{debug_id}",
             ],
-            download_end_time - download_start_time,
+            download_time,
         )
 
         # Extract the module filename--this is either debug_filename or
@@ -351,10 +636,10 @@ class SymbolicateBase:
 
         # Parse the SYM file into a symcache
         parse_start_time = time.perf_counter()
-        symcache = self.parse_sym_file(debug_filename, debug_id, sym_file)
+        parsed = self.build_symcache_data(debug_filename, debug_id, sym_file)
         parse_end_time = time.perf_counter()
 
-        if symcache is None:
+        if parsed is None:
             # The sym file we downloaded isn't valid, so capture timings and return None
             debug_stats.incr(
                 [
@@ -377,12 +662,32 @@ class SymbolicateBase:
 
         # If we have a valid symcache file, cache it to disk, capture some debug stats,
         # and then return it
+        symcache, data = parsed
         save_start_time = time.perf_counter()
-        data = symcache_to_bytes(symcache)
+        if data is None:
+            data = symcache_to_bytes(symcache)
         save_end_time = time.perf_counter()
 
-        data = {"symcache": data, "filename": module_filename}
-        self.cache.set(cache_key, data)
+        # What it'd cost to build this symcache again if it got evicted
+        cost = download_time + (parse_end_time - parse_start_time)
+
+        shared_ret = None
+        if self.shared_cache is not None:
+            # Publish the symcache and use the mapped copy that's shared with the
+            # other processes on the node instead of this process's private copy
+            shared_ret = self.shared_cache.publish(
+                cache_key, data, module_filename, cost=cost
+            )
+        else:
+            self.cache.set_symcache(cache_key, data, module_filename, cost=cost)
+
+        if shared_ret is not None:
+            symcache, module_filename = shared_ret
+        else:
+            if symcache is None:
+                symcache = self.open_written_symcache(cache_key, data)
+            if self.memory_cache is not None:
+                self.memory_cache.set(cache_key, (symcache, module_filename), len(data))
 
         debug_stats.incr(
             [
@@ -395,6 +700,48 @@ class SymbolicateBase:
 
         return symcache, module_filename
 
+    def get_symcaches(self, modules, debug_stats):
+        """Gets the symcaches for a list of modules.
+
+        If ``fetch_concurrency`` is greater than 1, this gets the symcaches for
+        modules in a bounded thread pool so that downloads and parsing for cold modules
+        happen at the same time.
+
+        :arg modules: list of ``(debug_filename, debug_id)`` tuples
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: map of ``(debug_filename, debug_id)`` -> ``(symcache, filename)`` or
+            ``None``
+
+        """
+
+        def _get_symcache(module_info):
+            debug_filename, debug_id = module_info
+            start_time = time.perf_counter()
+            ret = self.get_symcache(debug_filename, debug_id, debug_stats)
+            end_time = time.perf_counter()
+            debug_stats.incr(
+                ["fetch", "time_per_module", f"{debug_filename}/{debug_id}"],
+                end_time - start_time,
+            )
+            return ret
+
+        start_time = time.perf_counter()
+        if self.fetch_concurrency > 1 and len(modules) > 1:
+            if self._fetch_executor is None:
+                self._fetch_executor = ThreadPoolExecutor(
+                    max_workers=self.fetch_concurrency,
+                    thread_name_prefix="eliot-fetch",
+                )
+            results = list(self._fetch_executor.map(_get_symcache, modules))
+        else:
+            results = [_get_symcache(module_info) for module_info in modules]
+        end_time = time.perf_counter()
+        debug_stats.incr("fetch.time", end_time - start_time)
+
+        return dict(zip(modules, results, strict=True))
+
     def symbolicate(self, jobs, debug_stats):
         """Takes jobs and returns symbolicated results.
 
@@ -406,155 +753,379 @@ class SymbolicateBase:
             symbolication v5 response
 
         """
+        module_offsets = self.collect_frames(jobs)
+        symcaches = self.get_symcaches(list(module_offsets), debug_stats)
+        return self.lookup_frames(jobs, module_offsets, symcaches)
 
-        # List of:
-        #
-        # ((debug_filename, debug_id), frame_info)
-        #
-        # tuples
-        frames = []
+    def collect_frames(self, jobs):
+        """Goes through jobs and collects the offsets to symbolicate by module.
 
-        job_results = []
+        This doesn't build anything per frame. Frames are grouped by module as they're
+        seen and the job results are built from the original stacks in
+        ``lookup_frames`` after all the lookups are done.
+
+        :arg jobs: list of jobs containing stack and module information
+
+        :returns: dict of ``(debug_filename, debug_id)`` -> set of module offsets as
+            ints for all the modules to get symcaches for in the order they were
+            first seen
+
+        """
+        module_offsets = {}
 
-        # Go through jobs, stacks, and frames and build a list of all the things to
-        # symbolicate
         for job in jobs:
-            # List of stacks
-            stacks = job["stacks"]
+            # List of [debug_filename, debug_id] lists
+            memorymap = job["memoryMap"]
+
+            # Module info for each module in the memory map; modules without debug
+            # information are never looked up, so they get None
+            modules_by_index = [
+                (debug_filename, debug_id) if debug_filename and debug_id else None
+                for debug_filename, debug_id in memorymap
+            ]
+
+            num_modules = len(modules_by_index)
+            for stack in job["stacks"]:
+                for module_index, module_offset in stack:
+                    if 0 <= module_index < num_modules:
+                        module_info = modules_by_index[module_index]
+                        if module_info is not None:
+                            offsets = module_offsets.get(module_info)
+                            if offsets is None:
+                                offsets = module_offsets[module_info] = set()
+                            offsets.add(module_offset)
+
+        return module_offsets
+
+    def lookup_module_offsets(self, module_info, symcache, module_offsets):
+        """Looks up symbol information for offsets in a module.
+
+        This uses the lookup cache if there is one and looks up the rest in the
+        symcache.
+
+        :arg module_info: ``(debug_filename, debug_id)`` of the module
+        :arg symcache: the symcache for the module
+        :arg module_offsets: set of offsets in the module as ints
+
+        :returns: dict of module_offset -> SymbolInfo or None; negative offsets are
+            skipped
+
+        """
+        if self.lookup_cache is None:
+            return lookup_symbols(symcache, module_offsets)
+
+        module_offsets = [
+            module_offset for module_offset in module_offsets if module_offset >= 0
+        ]
+        symbol_infos = self.lookup_cache.get_many(module_info, module_offsets)
+        if len(symbol_infos) < len(module_offsets):
+            new_symbol_infos = lookup_symbols(
+                symcache,
+                [
+                    module_offset
+                    for module_offset in module_offsets
+                    if module_offset not in symbol_infos
+                ],
+            )
+            self.lookup_cache.set_many(module_info, new_symbol_infos)
+            symbol_infos.update(new_symbol_infos)
+
+        return symbol_infos
+
+    def lookup_frames(self, jobs, module_offsets, symcaches):
+        """Looks up symbols for frames and builds the job results.
+
+        :arg jobs: list of jobs containing stack and module information
+        :arg module_offsets: the dict of module -> offsets from ``collect_frames``
+        :arg symcaches: map of ``(debug_filename, debug_id)`` -> ``(symcache,
+            filename)`` or ``None``
+
+        :returns: list of result dicts with "stacks" and "found_modules" keys per the
+            symbolication v5 response
+
+        """
+        # Map of (debug_filename, debug_id) -> (module_filename, frame_fields) or
+        # None if the sym file wasn't found
+        module_symbols = {}
+
+        # Look up all the offsets module-by-module; stacks often have the same offset
+        # many times, so this only looks up each offset once
+        for module_info, offsets in module_offsets.items():
+            ret = symcaches[module_info]
+            if ret is None:
+                module_symbols[module_info] = None
+                continue
+
+            symcache, module_filename = ret
+            symbol_infos = self.lookup_module_offsets(module_info, symcache, offsets)
+
+            # Build the frame fields once per offset and share them between frames
+            # with that offset
+            frame_fields = {
+                module_offset: symbol_info_to_dict(symbol_info)
+                for module_offset, symbol_info in symbol_infos.items()
+                if symbol_info is not None
+            }
+            module_symbols[module_info] = (module_filename, frame_fields)
+
+        return self.build_job_results(jobs, module_symbols)
+
+    def build_job_results(self, jobs, module_symbols):
+        """Builds the job results from the stacks and the looked-up symbols.
 
+        This is where the frame dicts get built.
+
+        :arg jobs: list of jobs containing stack and module information
+        :arg module_symbols: map of ``(debug_filename, debug_id)`` ->
+            ``(module_filename, frame_fields)`` or ``None`` if the sym file wasn't
+            found
+
+        :returns: list of result dicts with "stacks" and "found_modules" keys per the
+            symbolication v5 response
+
+        """
+        job_results = []
+        frames_count = 0
+
+        for job in jobs:
             # List of [debug_filename, debug_id] lists
             memorymap = job["memoryMap"]
 
+            # Module name and frame fields for each module in the memory map
+            modules_by_index = []
+
+            # Map of debug_filename/debug_id -> True/False/None on whether we found
+            # the sym file (True), didn't find it (False), or never looked for it
+            # (None)
+            found_modules = {}
+
+            for debug_filename, debug_id in memorymap:
+                module_info = (debug_filename, debug_id)
+                if module_info in module_symbols:
+                    symbols = module_symbols[module_info]
+                    found_modules[f"{debug_filename}/{debug_id}"] = symbols is not None
+                else:
+                    symbols = None
+                    found_modules[f"{debug_filename}/{debug_id}"] = None
+
+                if symbols is None:
+                    modules_by_index.append((debug_filename or "<unknown>", None))
+                else:
+                    modules_by_index.append(symbols)
+
+            num_modules = len(modules_by_index)
             stacks_results = []
-            for stack in stacks:
+            for stack in job["stacks"]:
                 stack_results = []
-                for frame_i, frame in enumerate(stack):
-                    module_index, module_offset = frame
-
-                    if 0 <= module_index < len(memorymap):
-                        debug_filename, debug_id = memorymap[module_index]
+                for frame_i, (module_index, module_offset) in enumerate(stack):
+                    if 0 <= module_index < num_modules:
+                        module_name, frame_fields = modules_by_index[module_index]
                     else:
-                        debug_filename = ""
-                        debug_id = ""
+                        module_name, frame_fields = "<unknown>", None
 
                     frame_info = {
                         "frame": frame_i,
-                        "module": debug_filename or "<unknown>",
+                        "module": module_name,
                         "module_offset": hex(module_offset),
                     }
+                    if frame_fields is not None:
+                        fields = frame_fields.get(module_offset)
+                        if fields is not None:
+                            frame_info.update(fields)
 
                     stack_results.append(frame_info)
-                    frames.append(
-                        (
-                            # module information
-                            (debug_filename, debug_id),
-                            # frame information--since this is a mutable structure, when
-                            # we update it here, we're updating it in job_results as
-                            # well
-                            frame_info,
-                        )
-                    )
+
+                frames_count += len(stack_results)
                 stacks_results.append(stack_results)
 
             job_results.append(
                 {
                     "stacks": stacks_results,
-                    "found_modules": None,
+                    "found_modules": found_modules,
                 }
             )
 
-        # Map of (debug_filename, debug_id) -> lookup result
-        module_lookup = {}
+        # Total number of frames we symbolicated in this request
+        METRICS.histogram("symbolicate.frames_count", value=frames_count)
 
-        # Sort all the frames to symbolicate by module info. Then iterate
-        # module-by-module through all the frames to symbolicate and lookup symbols for
-        # them
-        frames.sort(key=lambda frame: frame[0])
+        return job_results
 
-        for module_info, frames_group in groupby(frames, key=lambda frame: frame[0]):
-            debug_filename, debug_id = module_info
-            if not debug_filename or not debug_id:
-                continue
 
-            ret = self.get_symcache(debug_filename, debug_id, debug_stats)
-            if ret is None:
-                module_lookup[(debug_filename, debug_id)] = False
-                continue
+class SymbolInfo(NamedTuple):
+    """Symbol information for an address in a module
 
-            module_lookup[(debug_filename, debug_id)] = True
-            symcache, module_filename = ret
+    ``file`` and ``line`` are None if unknown. ``inlines`` is a tuple of
+    ``(function, file, line)`` tuples for inline frames starting with the innermost.
 
-            for _, frame_info in frames_group:
-                module_offset = int(frame_info["module_offset"], 16)
-
-                frame_info["module"] = module_filename
-
-                if module_offset < 0:
-                    continue
-
-                sourceloc_list = symcache.lookup(module_offset)
-                if not sourceloc_list:
-                    continue
-
-                # sourceloc_list can have multiple entries: It starts with the innermost
-                # inline stack frame, and then advances to its caller, and then its
-                # caller, and so on, until it gets to the outer function.
-                # We process the outer function first, and then add inline stack frames
-                # afterwards. The outer function is the last item in sourceloc_list.
-                sourceloc = sourceloc_list[-1]
-
-                frame_info["function"] = sourceloc.symbol
-                frame_info["function_offset"] = hex(module_offset - sourceloc.sym_addr)
-                if sourceloc.full_path:
-                    frame_info["file"] = sourceloc.full_path
-
-                # Only add a "line" if it's non-zero and not None, and if there's a
-                # file--otherwise the line doesn't mean anything
-                if sourceloc.line and frame_info.get("file"):
-                    frame_info["line"] = sourceloc.line
-
-                if len(sourceloc_list) > 1:
-                    # We have inline information. Add an "inlines" property with a list
-                    # of { function, file, line } entries.
-                    inlines = []
-                    for inline_sourceloc in sourceloc_list[:-1]:
-                        inline_data = {
-                            "function": inline_sourceloc.symbol,
-                        }
-
-                        if inline_sourceloc.full_path:
-                            inline_data["file"] = inline_sourceloc.full_path
-
-                        if inline_sourceloc.line and inline_data.get("file"):
-                            inline_data["line"] = inline_sourceloc.line
-
-                        inlines.append(inline_data)
-
-                    frame_info["inlines"] = inlines
-
-        # Update found_modules in the results
-        for job_index, job_result in enumerate(job_results):
-            # Convert modules to a map of debug_filename/debug_id -> True/False/None on
-            # whether we found the sym file (True), didn't find it (False), or never
-            # looked for it (None)
-            found_modules = {
-                f"{debug_filename}/{debug_id}": module_lookup.get(
-                    (debug_filename, debug_id)
-                )
-                for debug_filename, debug_id in jobs[job_index]["memoryMap"]
-            }
+    """
 
-            job_result["found_modules"] = found_modules
+    function: str
+    function_offset: str
+    file: str | None
+    line: int | None
+    inlines: tuple
 
-        # Total number of frames we symbolicated in this request
-        METRICS.histogram("symbolicate.frames_count", value=len(frames))
 
-        return job_results
+def lookup_symbol_info(symcache, module_offset):
+    """Looks up symbol information for an offset in a module
+
+    :arg symcache: the symcache for the module
+    :arg module_offset: the offset in the module as an int
+
+    :returns: SymbolInfo or None if there's no symbol information for the offset
+
+    """
+    sourceloc_list = symcache.lookup(module_offset)
+    if not sourceloc_list:
+        return None
+
+    # sourceloc_list can have multiple entries: It starts with the innermost inline
+    # stack frame, and then advances to its caller, and then its caller, and so on,
+    # until it gets to the outer function. The outer function is the last item in
+    # sourceloc_list.
+    sourceloc = sourceloc_list[-1]
+
+    # Only add a "line" if it's non-zero and not None, and if there's a
+    # file--otherwise the line doesn't mean anything
+    file = sourceloc.full_path or None
+    line = (sourceloc.line or None) if file else None
+
+    inlines = tuple(
+        (
+            inline_sourceloc.symbol,
+            inline_sourceloc.full_path or None,
+            (inline_sourceloc.line or None) if inline_sourceloc.full_path else None,
+        )
+        for inline_sourceloc in sourceloc_list[:-1]
+    )
+
+    return SymbolInfo(
+        function=sourceloc.symbol,
+        function_offset=hex(module_offset - sourceloc.sym_addr),
+        file=file,
+        line=line,
+        inlines=inlines,
+    )
+
+
+def lookup_symbols(symcache, module_offsets):
+    """Looks up symbol information for a batch of offsets in a module
+
+    Duplicate offsets are looked up once. Offsets are looked up in ascending order
+    which walks the symcache's address ranges in order.
+
+    :arg symcache: the symcache for the module
+    :arg module_offsets: iterable of offsets in the module as ints
 
+    :returns: dict of module_offset -> SymbolInfo or None; negative offsets are
+        skipped
 
-def _load_payload(req):
+    """
+    return {
+        module_offset: lookup_symbol_info(symcache, module_offset)
+        for module_offset in sorted(set(module_offsets))
+        if module_offset >= 0
+    }
+
+
+def symbol_info_to_dict(symbol_info):
+    """Converts a SymbolInfo to symbolicate/v5 frame fields
+
+    :arg symbol_info: the SymbolInfo
+
+    :returns: dict of frame fields
+
+    """
+    data = {
+        "function": symbol_info.function,
+        "function_offset": symbol_info.function_offset,
+    }
+    if symbol_info.file:
+        data["file"] = symbol_info.file
+    if symbol_info.line:
+        data["line"] = symbol_info.line
+
+    if symbol_info.inlines:
+        # We have inline information. Add an "inlines" property with a list of
+        # { function, file, line } entries.
+        inlines = []
+        for function, file, line in symbol_info.inlines:
+            inline_data = {"function": function}
+            if file:
+                inline_data["file"] = file
+            if line:
+                inline_data["line"] = line
+            inlines.append(inline_data)
+
+        data["inlines"] = inlines
+
+    return data
+
+
+def iter_json(obj, depth, codec):
+    """Generates the JSON encoding of obj in parts
+
+    Dicts and lists up to ``depth`` levels deep are encoded item by item. Anything
+    deeper is encoded in one go. Joining the parts produces the same output as
+    ``codec.dumps(obj)``.
+
+    :arg obj: the object to encode
+    :arg depth: how many levels of dicts and lists to encode item by item
+    :arg codec: the JSON codec to encode with
+
+    :returns: generator of bytes
+
+    """
+    if depth > 0 and isinstance(obj, dict):
+        yield b"{"
+        for i, (key, val) in enumerate(obj.items()):
+            if i:
+                yield codec.item_separator
+            yield codec.dumps(str(key))
+            yield codec.key_separator
+            yield from iter_json(val, depth - 1, codec)
+        yield b"}"
+
+    elif depth > 0 and isinstance(obj, list):
+        yield b"["
+        for i, item in enumerate(obj):
+            if i:
+                yield codec.item_separator
+            yield from iter_json(item, depth - 1, codec)
+        yield b"]"
+
+    else:
+        yield codec.dumps(obj)
+
+
+def iter_json_chunks(obj, depth, codec, chunk_size=STREAM_CHUNK_SIZE):
+    """Generates the JSON encoding of obj as chunks for streaming
+
+    :arg obj: the object to encode
+    :arg depth: how many levels of dicts and lists to encode item by item
+    :arg codec: the JSON codec to encode with
+    :arg chunk_size: the minimum size of chunks to generate except for the last one
+
+    :returns: generator of bytes
+
+    """
+    parts = []
+    size = 0
+    for part in iter_json(obj, depth, codec):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b"".join(parts)
+            parts = []
+            size = 0
+
+    if parts:
+        yield b"".join(parts)
+
+
+def _load_payload(req, codec):
     try:
-        return json.load(req.bounded_stream)
+        return codec.loads(req.bounded_stream.read())
     except json.JSONDecodeError as exc:
         METRICS.incr("symbolicate.request_error", tags=["reason:bad_json"])
         raise falcon.HTTPBadRequest(title="Payload is not valid JSON") from exc
@@ -605,6 +1176,161 @@ def _validate_and_measure_jobs(jobs, api_version):
         )
 
 
+def _build_v4_response(payload, symdata):
+    """Converts symbolicate output to a symbolicate/v4 response
+
+    :arg payload: the request payload
+    :arg symdata: the symbolicate result for the single job in the payload
+
+    :returns: response as a dict
+
+    """
+
+    # Convert the symbolicate output to symbolicate/v4 output
+    def frame_to_function(frame):
+        if "function" not in frame:
+            try:
+                function = hex(frame["module_offset"])
+            except TypeError:
+                # Happens if 'module_offset' is not an int16 and thus can't be
+                # represented in hex.
+                function = str(frame["module_offset"])
+        else:
+            function = frame["function"]
+        return f"{function} (in {frame['module']})"
+
+    symbolicated_stacks = [
+        [frame_to_function(frame) for frame in stack] for stack in symdata["stacks"]
+    ]
+    known_modules = [
+        symdata["found_modules"].get(f"{debug_filename}/{debug_id}", None)
+        for debug_filename, debug_id in payload["memoryMap"]
+    ]
+
+    results = {
+        "symbolicatedStacks": symbolicated_stacks,
+        "knownModules": known_modules,
+    }
+    return results
+
+
+def _get_v5_jobs(payload):
+    """Returns the list of jobs in a symbolicate/v5 payload
+
+    :arg payload: the request payload
+
+    :returns: list of jobs
+
+    :raises falcon.HTTPBadRequest: if there are too many jobs
+
+    """
+    if "jobs" in payload:
+        jobs = payload["jobs"]
+    else:
+        jobs = [payload]
+
+    if len(jobs) > MAX_JOBS:
+        METRICS.incr("symbolicate.request_error", tags=["reason:too_many_jobs"])
+        raise falcon.HTTPBadRequest(
+            title=f"please limit number of jobs in a single request to <= {MAX_JOBS}"
+        )
+
+    METRICS.histogram("symbolicate.jobs_count", value=len(jobs), tags=["version:v5"])
+    LOGGER.debug(f"Number of jobs: {len(jobs)}")
+    return jobs
+
+
+def _build_v5_response(jobs, results, debug_stats, is_debug):
+    """Builds a symbolicate/v5 response
+
+    :arg jobs: the list of jobs in the request
+    :arg results: the symbolicate results for the jobs
+    :arg debug_stats: DebugStats instance for keeping track of timings and other
+        useful things
+    :arg is_debug: whether to add debug information to the response
+
+    :returns: response as a dict
+
+    """
+    response = {"results": results}
+
+    # Add debug information to response if requested
+    if is_debug:
+        # Calculate modules
+        all_modules = Counter()
+        for result in results:
+            all_modules.update(
+                [key for key, val in result["found_modules"].items() if val is not None]
+            )
+        debug_stats.set("modules.count", value=sum(all_modules.values()))
+        for key, count in all_modules.items():
+            debug_stats.set(["modules", "stacks_per_module", key], count)
+
+        # Calculate aggregates
+        debug_stats.set(
+            ["downloads", "size"],
+            sum(
+                [0]
+                + list(
+                    debug_stats.get(
+                        ["downloads", "size_per_module"], default={}
+                    ).values()
+                )
+            ),
+        )
+        debug_stats.set(
+            ["downloads", "time"],
+            sum(
+                [0]
+                + list(
+                    debug_stats.get(
+                        ["downloads", "time_per_module"], default={}
+                    ).values()
+                )
+            ),
+        )
+        debug_stats.set(
+            ["parse_sym", "time"],
+            sum(
+                [0]
+                + list(
+                    debug_stats.get(
+                        ["parse_sym", "time_per_module"], default={}
+                    ).values()
+                )
+            ),
+        )
+        debug_stats.set(
+            ["save_symcache", "time"],
+            sum(
+                [0]
+                + list(
+                    debug_stats.get(
+                        ["save_symcache", "time_per_module"], default={}
+                    ).values()
+                )
+            ),
+        )
+
+        # Set values to 0 if they're missing by incrementing them by 0
+        debug_stats.incr("cache_lookups.count", 0)
+        debug_stats.incr("cache_lookups.time", 0.0)
+        debug_stats.incr("downloads.count", 0)
+
+        # Add debug stats to response
+        response["debug"] = debug_stats.data
+
+    num_jobs = len(jobs)
+    num_symbols = sum([sum([len(stack) for stack in job["stacks"]]) for job in jobs])
+    LOGGER.info(
+        "symbolicate/v5: jobs: %s, symbols: %s, time: %s",
+        num_jobs,
+        num_symbols,
+        debug_stats.get("time"),
+    )
+    return response
+
+
 # NOTE(Willkg): This API endpoint version is deprecated. We shouldn't add new features
 # or fix bugs with it.
 class SymbolicateV4(SymbolicateBase):
@@ -616,7 +1342,7 @@ class SymbolicateV4(SymbolicateBase):
         # results because this API is deprecated
         debug_stats = DebugStats()
 
-        payload = _load_payload(req)
+        payload = _load_payload(req, self.json_codec)
 
         # Convert to a list of jobs, validate and measure the jobs, symbolicate and then
         # unwrap that to a single symdata result
@@ -624,32 +1350,7 @@ class SymbolicateV4(SymbolicateBase):
         _validate_and_measure_jobs(jobs, api_version="v4")
         symdata = self.symbolicate(jobs, debug_stats)[0]
 
-        # Convert the symbolicate output to symbolicate/v4 output
-        def frame_to_function(frame):
-            if "function" not in frame:
-                try:
-                    function = hex(frame["module_offset"])
-                except TypeError:
-                    # Happens if 'module_offset' is not an int16 and thus can't be
-                    # represented in hex.
-                    function = str(frame["module_offset"])
-            else:
-                function = frame["function"]
-            return f"{function} (in {frame['module']})"
-
-        symbolicated_stacks = [
-            [frame_to_function(frame) for frame in stack] for stack in symdata["stacks"]
-        ]
-        known_modules = [
-            symdata["found_modules"].get(f"{debug_filename}/{debug_id}", None)
-            for debug_filename, debug_id in payload["memoryMap"]
-        ]
-
-        results = {
-            "symbolicatedStacks": symbolicated_stacks,
-            "knownModules": known_modules,
-        }
-        resp.text = json.dumps(results)
+        resp.data = self.json_codec.dumps(_build_v4_response(payload, symdata))
 
 
 class SymbolicateV5(SymbolicateBase):
@@ -657,25 +1358,11 @@ class SymbolicateV5(SymbolicateBase):
     def on_post(self, req, resp):
         METRICS.incr("pageview", tags=["path:/symbolicate/v5", "method:post"])
 
-        payload = _load_payload(req)
+        payload = _load_payload(req, self.json_codec)
 
         is_debug = req.get_header("Debug", default=False)
 
-        if "jobs" in payload:
-            jobs = payload["jobs"]
-        else:
-            jobs = [payload]
-
-        if len(jobs) > MAX_JOBS:
-            METRICS.incr("symbolicate.request_error", tags=["reason:too_many_jobs"])
-            raise falcon.HTTPBadRequest(
-                title=f"please limit number of jobs in a single request to <= {MAX_JOBS}"
-            )
-
-        METRICS.histogram(
-            "symbolicate.jobs_count", value=len(jobs), tags=["version:v5"]
-        )
-        LOGGER.debug(f"Number of jobs: {len(jobs)}")
+        jobs = _get_v5_jobs(payload)
 
         debug_stats = DebugStats()
 
@@ -683,86 +1370,271 @@ class SymbolicateV5(SymbolicateBase):
         with debug_stats.timer("time"):
             _validate_and_measure_jobs(jobs, api_version="v5")
             results = self.symbolicate(jobs, debug_stats)
-        response = {"results": results}
-
-        # Add debug information to response if requested
-        if is_debug:
-            # Calculate modules
-            all_modules = Counter()
-            for result in results:
-                all_modules.update(
-                    [
-                        key
-                        for key, val in result["found_modules"].items()
-                        if val is not None
-                    ]
+
+        response = _build_v5_response(jobs, results, debug_stats, is_debug)
+        if self.stream_responses:
+            # Encode the response stack by stack as it's sent rather than building a
+            # potentially very large string
+            #
+            # NOTE(willkg): This only saves the memory for the encoded response. The
+            # results are built before anything is sent because lookups are done
+            # module by module across all the jobs and the debug information needs
+            # all the results.
+            resp.content_type = falcon.MEDIA_JSON
+            resp.stream = iter_json_chunks(
+                response, depth=V5_STREAM_DEPTH, codec=self.json_codec
+            )
+        else:
+            resp.data = self.json_codec.dumps(response)
+
+
+class AsyncSymbolicateBase(SymbolicateBase):
+    """Symbolication for the ASGI app
+
+    Downloads are done with an asyncio downloader so they overlap with other requests.
+    Cache reads, parsing sym files, and saving symcaches are CPU and disk bound, so
+    those are run in a thread pool executor.
+
+    """
+
+    def _get_executor(self):
+        if self._fetch_executor is None:
+            self._fetch_executor = ThreadPoolExecutor(
+                max_workers=max(self.fetch_concurrency, 1),
+                thread_name_prefix="eliot-fetch",
+            )
+        return self._fetch_executor
+
+    async def run_in_executor(self, fun, *args):
+        """Runs a function in the thread pool executor and returns the result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fun, *args)
+
+    async def download_sym_file_async(self, debug_filename, debug_id):
+        """Download a symbol file.
+
+        See ``download_sym_file``.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+
+        :returns: sym file as bytes, Path of the sym file, or None
+
+        """
+        sym_filename = get_sym_filename(debug_filename)
+
+        try:
+            if self.stream_downloads:
+                data = await self.downloader.get_to_file(
+                    debug_filename, debug_id, sym_filename, self.tmpdir
                 )
-            debug_stats.set("modules.count", value=sum(all_modules.values()))
-            for key, count in all_modules.items():
-                debug_stats.set(["modules", "stacks_per_module", key], count)
-
-            # Calculate aggregates
-            debug_stats.set(
-                ["downloads", "size"],
-                sum(
-                    [0]
-                    + list(
-                        debug_stats.get(
-                            ["downloads", "size_per_module"], default={}
-                        ).values()
-                    )
-                ),
+            else:
+                data = await self.downloader.get(debug_filename, debug_id, sym_filename)
+
+        except downloader.FileNotFound:
+            await self.run_in_executor(
+                self.set_missing, debug_filename, debug_id, NegativeCache.NOT_FOUND
             )
-            debug_stats.set(
-                ["downloads", "time"],
-                sum(
-                    [0]
-                    + list(
-                        debug_stats.get(
-                            ["downloads", "time_per_module"], default={}
-                        ).values()
-                    )
-                ),
+            return None
+
+        except downloader.ErrorFileNotFound:
+            await self.run_in_executor(
+                self.set_missing, debug_filename, debug_id, NegativeCache.ERROR
             )
-            debug_stats.set(
-                ["parse_sym", "time"],
-                sum(
-                    [0]
-                    + list(
-                        debug_stats.get(
-                            ["parse_sym", "time_per_module"], default={}
-                        ).values()
-                    )
-                ),
+            return None
+
+        return data
+
+    async def build_symcache_async(
+        self, debug_filename, debug_id, cache_key, debug_stats
+    ):
+        """Downloads and parses the sym file for a module and caches the symcache.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg cache_key: the cache key for the symcache
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: ``(symcache, filename)`` or ``None``
+
+        """
+        download_start_time = time.perf_counter()
+        sym_file = await self.download_sym_file_async(debug_filename, debug_id)
+        download_end_time = time.perf_counter()
+
+        try:
+            return await self.run_in_executor(
+                self.process_sym_file,
+                debug_filename,
+                debug_id,
+                cache_key,
+                sym_file,
+                download_end_time - download_start_time,
+                debug_stats,
             )
-            debug_stats.set(
-                ["save_symcache", "time"],
-                sum(
-                    [0]
-                    + list(
-                        debug_stats.get(
-                            ["save_symcache", "time_per_module"], default={}
-                        ).values()
-                    )
-                ),
+        finally:
+            if isinstance(sym_file, Path):
+                sym_file.unlink(missing_ok=True)
+
+    async def get_symcache_async(self, debug_filename, debug_id, debug_stats):
+        """Gets the symcache for a given module.
+
+        See ``get_symcache``.
+
+        :arg debug_filename: the debug filename
+        :arg debug_id: the debug id
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: ``(symcache, filename)`` or ``None``
+
+        """
+        if not debug_filename or not debug_id:
+            return
+
+        cache_key = get_cache_key(debug_filename, debug_id)
+
+        ret = await self.run_in_executor(
+            self.get_cached_symcache, cache_key, debug_stats
+        )
+        if ret is not None:
+            return ret
+
+        if await self.run_in_executor(self.is_missing, cache_key, debug_stats):
+            return
+
+        if self.singleflight is None:
+            return await self.build_symcache_async(
+                debug_filename, debug_id, cache_key, debug_stats
+            )
+
+        # NOTE(willkg): Waiting for the lock doesn't use the default executor or the
+        # fetch executor, which the lock holder may need to finish its work
+        async with self.singleflight.lock_async(cache_key) as waited:
+            if waited:
+                ret = await self.run_in_executor(
+                    self.get_cached_symcache, cache_key, debug_stats
+                )
+                if ret is not None:
+                    return ret
+
+                if await self.run_in_executor(self.is_missing, cache_key, debug_stats):
+                    return
+
+            return await self.build_symcache_async(
+                debug_filename, debug_id, cache_key, debug_stats
             )
 
-            # Set values to 0 if they're missing by incrementing them by 0
-            debug_stats.incr("cache_lookups.count", 0)
-            debug_stats.incr("cache_lookups.time", 0.0)
-            debug_stats.incr("downloads.count", 0)
+    async def get_symcaches_async(self, modules, debug_stats):
+        """Gets the symcaches for a list of modules.
+
+        This gets up to ``fetch_concurrency`` symcaches at the same time.
+
+        :arg modules: list of ``(debug_filename, debug_id)`` tuples
+        :arg debug_stats: DebugStats instance for keeping track of timings and other
+            useful things
+
+        :returns: map of ``(debug_filename, debug_id)`` -> ``(symcache, filename)`` or
+            ``None``
 
-            # Add debug stats to response
-            response["debug"] = debug_stats.data
+        """
+        semaphore = asyncio.Semaphore(max(self.fetch_concurrency, 1))
+
+        async def _get_symcache(module_info):
+            debug_filename, debug_id = module_info
+            async with semaphore:
+                start_time = time.perf_counter()
+                ret = await self.get_symcache_async(
+                    debug_filename, debug_id, debug_stats
+                )
+                end_time = time.perf_counter()
+            debug_stats.incr(
+                ["fetch", "time_per_module", f"{debug_filename}/{debug_id}"],
+                end_time - start_time,
+            )
+            return ret
 
-        num_jobs = len(jobs)
-        num_symbols = sum(
-            [sum([len(stack) for stack in job["stacks"]]) for job in jobs]
+        start_time = time.perf_counter()
+        results = await asyncio.gather(
+            *[_get_symcache(module_info) for module_info in modules]
         )
-        LOGGER.info(
-            "symbolicate/v5: jobs: %s, symbols: %s, time: %s",
-            num_jobs,
-            num_symbols,
-            debug_stats.get("time"),
+        end_time = time.perf_counter()
+        debug_stats.incr("fetch.time", end_time - start_time)
+
+        return dict(zip(modules, results, strict=True))
+
+    async def symbolicate_async(self, jobs, debug_stats):
+        """Takes jobs and returns symbolicated results.
+
+        See ``symbolicate``.
+
+        """
+        module_offsets = self.collect_frames(jobs)
+        symcaches = await self.get_symcaches_async(list(module_offsets), debug_stats)
+        return await self.run_in_executor(
+            self.lookup_frames, jobs, module_offsets, symcaches
         )
-        resp.text = json.dumps(response)
+
+
+async def _aiter_chunks(chunks):
+    """Wraps a generator of chunks in an async generator for ASGI streaming"""
+    for chunk in chunks:
+        yield chunk
+
+
+async def _load_payload_async(req, codec):
+    try:
+        data = await req.bounded_stream.read()
+        return codec.loads(data)
+    except json.JSONDecodeError as exc:
+        METRICS.incr("symbolicate.request_error", tags=["reason:bad_json"])
+        raise falcon.HTTPBadRequest(title="Payload is not valid JSON") from exc
+
+
+# NOTE(Willkg): This API endpoint version is deprecated. We shouldn't add new features
+# or fix bugs with it.
+class AsyncSymbolicateV4(AsyncSymbolicateBase):
+    async def on_post(self, req, resp):
+        with METRICS.timer("symbolicate.api", tags=["version:v4"]):
+            METRICS.incr("pageview", tags=["path:/symbolicate/v4", "method:post"])
+
+            debug_stats = DebugStats()
+
+            payload = await _load_payload_async(req, self.json_codec)
+
+            jobs = [payload]
+            _validate_and_measure_jobs(jobs, api_version="v4")
+            symdata = (await self.symbolicate_async(jobs, debug_stats))[0]
+
+            resp.data = self.json_codec.dumps(_build_v4_response(payload, symdata))
+
+
+class AsyncSymbolicateV5(AsyncSymbolicateBase):
+    async def on_post(self, req, resp):
+        with METRICS.timer("symbolicate.api", tags=["version:v5"]):
+            METRICS.incr("pageview", tags=["path:/symbolicate/v5", "method:post"])
+
+            payload = await _load_payload_async(req, self.json_codec)
+
+            is_debug = req.get_header("Debug", default=False)
+
+            jobs = _get_v5_jobs(payload)
+
+            debug_stats = DebugStats()
+
+            # Validate, measure, and symbolicate jobs
+            with debug_stats.timer("time"):
+                _validate_and_measure_jobs(jobs, api_version="v5")
+                results = await self.symbolicate_async(jobs, debug_stats)
+
+            response = _build_v5_response(jobs, results, debug_stats, is_debug)
+            if self.stream_responses:
+                resp.content_type = falcon.MEDIA_JSON
+                resp.stream = _aiter_chunks(
+                    iter_json_chunks(
+                        response, depth=V5_STREAM_DEPTH, codec=self.json_codec
+                    )
+                )
+            else:
+                resp.data = self.json_codec.dumps(response)
@@ -0,0 +1,196 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Warms up the disk cache by downloading and parsing sym files for a list of modules
+before the webapp needs them.
+
+The list of modules can come from a file, the keys of an existing cache directory,
+or access logs for a symbols server.
+
+To run::
+
+    $ bin/warm-cache.py --help
+
+"""
+
+from collections import Counter
+from concurrent.futures import as_completed, ThreadPoolExecutor
+import logging
+from pathlib import Path
+import re
+import time
+
+from eliot.app import build_config_manager, EliotApp
+from eliot.symbolicate_resource import DebugStats
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Matches sym file paths like "/xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2/xul.sym"
+SYM_PATH_RE = re.compile(r"/([^/\s?\"]+)/([0-9A-Fa-f]{33,40})/[^/\s?\"]+\.sym\b")
+
+
+class WarmUpResult:
+    """Results of warming up the cache for a module"""
+
+    # The symcache was already in the cache
+    CACHED = "cached"
+    # The sym file was downloaded and parsed and the symcache was saved to the cache
+    BUILT = "built"
+    # The sym file couldn't be downloaded or parsed
+    MISSING = "missing"
+    # There was an unexpected error
+    ERROR = "error"
+
+
+def read_modules_file(path):
+    """Reads modules from a file
+
+    Each line has a debug filename and debug id separated by whitespace or a ``/``.
+    Blank lines and lines starting with ``#`` are skipped.
+
+    :arg path: path of the file
+
+    :returns: list of ``(debug_filename, debug_id)`` tuples
+
+    :raises ValueError: if a line is malformed
+
+    """
+    modules = []
+    with open(path, "r") as fp:
+        for line_no, line in enumerate(fp, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            parts = line.replace("/", " ").split()
+            if len(parts) != 2:
+                raise ValueError(f"{path}:{line_no}: expected debug_filename debug_id")
+            modules.append((parts[0], parts[1]))
+    return modules
+
+
+def read_modules_from_cachedir(cachedir):
+    """Reads modules from the keys of an existing disk cache directory
+
+    This is helpful for copying the working set of one node to another.
+
+    :arg cachedir: path of the directory with symcache files
+
+    :returns: list of ``(debug_filename, debug_id)`` tuples ordered by most
+        recently used first
+
+    """
+    symcache_files = []
+    for path in Path(cachedir).glob("*/*.symc"):
+        try:
+            stat = path.stat()
+            # NOTE(willkg): atime isn't updated on volumes mounted with noatime, so
+            # use whichever is more recent like the disk cache manager does
+            symcache_files.append((max(stat.st_atime, stat.st_mtime), path))
+        except FileNotFoundError:
+            # The file was evicted while we were looking at the directory
+            continue
+
+    symcache_files.sort(key=lambda item: item[0], reverse=True)
+    return [(path.parent.name, path.stem) for _, path in symcache_files]
+
+
+def read_modules_from_logs(path):
+    """Reads modules from access logs for a symbols server
+
+    This finds all the sym file paths in the log lines.
+
+    :arg path: path of the log file
+
+    :returns: list of ``(debug_filename, debug_id)`` tuples ordered by most
+        requested first
+
+    """
+    counts = Counter()
+    with open(path, "r", errors="replace") as fp:
+        for line in fp:
+            for debug_filename, debug_id in SYM_PATH_RE.findall(line):
+                counts[(debug_filename, debug_id.upper())] += 1
+
+    return [module_info for module_info, _ in counts.most_common()]
+
+
+def build_symbolicate_base(config_manager=None):
+    """Builds a symbolicate resource configured the same way as the webapp
+
+    This uses the webapp configuration so the warmed up symcaches end up in the
+    same cache with the same layout.
+
+    :arg config_manager: Everett ConfigManager to use; if None, it will build one
+
+    :returns: SymbolicateBase instance
+
+    """
+    if config_manager is None:
+        config_manager = build_config_manager()
+
+    app = EliotApp(config_manager)
+    app.verify_configuration()
+    app.set_up()
+    return app.get_resource_by_name("symbolicate_v5")
+
+
+def warm_up(base, modules, concurrency=4, progress=None):
+    """Gets symcaches for modules so they're in the cache
+
+    :arg base: SymbolicateBase to get symcaches with
+    :arg modules: list of ``(debug_filename, debug_id)`` tuples
+    :arg concurrency: maximum number of modules to download and parse at the same
+        time
+    :arg progress: callable that's called with ``(index, total, module_info,
+        result, duration)`` after each module is done
+
+    :returns: dict of ``WarmUpResult`` value -> count
+
+    """
+    # Remove duplicates but keep the order
+    modules = list(dict.fromkeys(tuple(module_info) for module_info in modules))
+
+    def _warm_up_module(module_info):
+        debug_filename, debug_id = module_info
+        debug_stats = DebugStats()
+        start_time = time.perf_counter()
+        try:
+            ret = base.get_symcache(debug_filename, debug_id, debug_stats)
+        except Exception:
+            LOGGER.exception("error warming up %s/%s", debug_filename, debug_id)
+            return WarmUpResult.ERROR, time.perf_counter() - start_time
+        duration = time.perf_counter() - start_time
+
+        if ret is None:
+            result = WarmUpResult.MISSING
+        elif debug_stats.data["cache_lookups"]["hits"]:
+            result = WarmUpResult.CACHED
+        else:
+            result = WarmUpResult.BUILT
+        return result, duration
+
+    counts = {
+        WarmUpResult.CACHED: 0,
+        WarmUpResult.BUILT: 0,
+        WarmUpResult.MISSING: 0,
+        WarmUpResult.ERROR: 0,
+    }
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="eliot-warmup"
+    ) as executor:
+        futures = {
+            executor.submit(_warm_up_module, module_info): module_info
+            for module_info in modules
+        }
+        for index, future in enumerate(as_completed(futures), start=1):
+            module_info = futures[future]
+            result, duration = future.result()
+            counts[result] += 1
+            if progress is not None:
+                progress(index, len(modules), module_info, result, duration)
+
+    return counts
@@ -21,7 +21,7 @@ SYMROOT = str(Path(__file__).parent.parent)
 sys.path.insert(0, SYMROOT)
 
 
-from eliot.app import build_config_manager, EliotApp, get_app  # noqa
+from eliot.app import build_config_manager, EliotApp, get_app, get_asgi_app  # noqa
 from eliot.liblogging import set_up_logging  # noqa
 from eliot.libmarkus import set_up_metrics  # noqa
 
@@ -93,9 +93,9 @@ class EliotTestClient(TestClient):
 
     def get_resource_by_name(self, name):
         """Retrieves the Falcon API resource by name"""
-        # NOTE(willkg): The "app" here is a middleware which should have an .application
+        # NOTE(willkg): The "app" here is a middleware which should have an .app
         # attribute which is the actual EliotApp that we want.
-        return self.app.application.get_resource_by_name(name)
+        return self.app.app.get_resource_by_name(name)
 
 
 @pytest.fixture
@@ -118,6 +118,19 @@ def client():
     return EliotTestClient(get_app(EliotTestClient.build_config()))
 
 
+@pytest.fixture
+def asgi_client():
+    """Test client for the Eliot ASGI app
+
+    This creates an EliotASGIApp with configuration defaults and a test client that
+    uses that app to submit HTTP requests.
+
+    """
+    # NOTE(willkg): The Falcon TestClient can't introspect the Sentry ASGI middleware,
+    # so this uses the EliotASGIApp it wraps
+    return TestClient(get_asgi_app(EliotTestClient.build_config()).app)
+
+
 @pytest.fixture
 def metricsmock():
     """Returns MetricsMock that a context to record metrics records
@@ -2,15 +2,53 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import socketserver
+import threading
+import time
+from unittest import mock
 
 import pytest
 
-from eliot.cache import DiskCache
+from eliot.cache import (
+    AccessThrottle,
+    DirectorySecondTierCache,
+    DiskCache,
+    get_cost,
+    get_second_tier_cache,
+    LookupCache,
+    MemoryCache,
+    NegativeCache,
+    RedisSecondTierCache,
+    SharedSymcacheCache,
+    SingleFlight,
+    SYMCACHE_MAGIC,
+)
+from eliot.libcompression import get_compressor
+from eliot.libsymbolic import parse_sym_file, symcache_to_bytes
 
 from tests.utils import counter
 
 
+TESTPROJ_SYM = b"""\
+MODULE Linux x86_64 D48F191186D67E69DF025AD71FB91E1F0 testproj
+FILE 0 /home/willkg/projects/testproj/src/main.rs
+FUNC 5380 44 0 testproj::main
+5380 9 1 0
+5389 36 2 0
+53bf 5 3 0
+"""
+
+
+def build_symcache_data():
+    symcache = parse_sym_file(
+        "testproj", "D48F191186D67E69DF025AD71FB91E1F0", TESTPROJ_SYM
+    )
+    return symcache_to_bytes(symcache)
+
+
 @pytest.mark.parametrize(
     argnames=("key", "filepath"),
     argvalues=[
@@ -107,3 +145,865 @@ class TestDiskCache:
 
         diskcache.set(key, data2)
         assert diskcache.read_from_file(filepath) == data2
+
+    def test_set_symcache(self, tmpcachedir, tmpdir):
+        """DiskCache.set_symcache writes the raw symcache followed by a trailer"""
+        diskcache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        symcache_data = build_symcache_data()
+
+        diskcache.set_symcache(key, symcache_data, "testproj")
+        filedata = diskcache.key_to_filepath(key).read_bytes()
+        assert filedata.startswith(symcache_data)
+        assert filedata.endswith(SYMCACHE_MAGIC)
+
+    def test_set_symcache_cost(self, tmpcachedir, tmpdir):
+        """DiskCache.set_symcache records the cost in an extended attribute"""
+        diskcache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        symcache_data = build_symcache_data()
+
+        diskcache.set_symcache(key, symcache_data, "testproj", cost=1.5)
+        filepath = diskcache.key_to_filepath(key)
+        assert get_cost(filepath) == 1.5
+
+        # Files without a cost return None
+        diskcache.set_symcache(key, symcache_data, "testproj")
+        assert get_cost(filepath) is None
+
+    def test_get_symcache(self, tmpcachedir, tmpdir):
+        """DiskCache.get_symcache returns a working symcache"""
+        diskcache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        symcache_data = build_symcache_data()
+
+        diskcache.set_symcache(key, symcache_data, "testproj.so")
+        data = diskcache.get_symcache(key)
+        assert data["filename"] == "testproj.so"
+        assert data["size"] == len(symcache_data)
+        assert data["symcache"].lookup(0x5380)[0].symbol == "testproj::main"
+
+    def test_get_symcache_legacy(self, tmpcachedir, tmpdir):
+        """DiskCache.get_symcache reads msgpack-encoded symcache files"""
+        diskcache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        symcache_data = build_symcache_data()
+
+        diskcache.set(key, {"symcache": symcache_data, "filename": "testproj"})
+        data = diskcache.get_symcache(key)
+        assert data["filename"] == "testproj"
+        assert data["size"] == len(symcache_data)
+        assert data["symcache"].lookup(0x5380)[0].symbol == "testproj::main"
+
+    @pytest.mark.parametrize("compression", ["zstd", "lz4"])
+    def test_symcache_compression(self, metricsmock, tmpcachedir, tmpdir, compression):
+        """DiskCache compresses symcaches and reads them back"""
+        diskcache = DiskCache(
+            cachedir=Path(tmpcachedir),
+            tmpdir=Path(tmpdir),
+            compressor=get_compressor(compression),
+        )
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        symcache_data = build_symcache_data()
+
+        with metricsmock as mm:
+            diskcache.set_symcache(key, symcache_data, "testproj.so")
+            mm.assert_histogram(
+                "eliot.diskcache.compression_ratio",
+                tags=[f"compression:{compression}", "host:testnode"],
+            )
+        filedata = diskcache.key_to_filepath(key).read_bytes()
+        assert not filedata.startswith(symcache_data)
+        assert filedata.endswith(SYMCACHE_MAGIC)
+
+        with metricsmock as mm:
+            data = diskcache.get_symcache(key)
+            mm.assert_histogram(
+                "eliot.diskcache.decompress",
+                tags=[f"compression:{compression}", "host:testnode"],
+            )
+        assert data["filename"] == "testproj.so"
+        assert data["size"] == len(symcache_data)
+        assert data["symcache"].lookup(0x5380)[0].symbol == "testproj::main"
+
+    def test_symcache_compression_mixed(self, tmpcachedir, tmpdir):
+        """Compressed and uncompressed entries can be read with any setting"""
+        uncompressed_cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        zstd_cache = DiskCache(
+            cachedir=Path(tmpcachedir),
+            tmpdir=Path(tmpdir),
+            compressor=get_compressor("zstd"),
+        )
+        symcache_data = build_symcache_data()
+
+        uncompressed_cache.set_symcache("key1.symc", symcache_data, "testproj.so")
+        zstd_cache.set_symcache("key2.symc", symcache_data, "testproj.so")
+
+        for diskcache in [uncompressed_cache, zstd_cache]:
+            for key in ["key1.symc", "key2.symc"]:
+                data = diskcache.get_symcache(key)
+                assert data["symcache"].lookup(0x5380)[0].symbol == "testproj::main"
+
+    def test_symcache_compression_error(self, metricsmock, tmpcachedir, tmpdir):
+        """DiskCache treats compressed files that can't be decompressed as errors"""
+        diskcache = DiskCache(
+            cachedir=Path(tmpcachedir),
+            tmpdir=Path(tmpdir),
+            compressor=get_compressor("zstd"),
+        )
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        diskcache.set_symcache(key, build_symcache_data(), "testproj.so")
+
+        # Truncate the compressed data, but leave the metadata and trailer
+        filepath = diskcache.key_to_filepath(key)
+        with filepath.open("rb") as fp:
+            compressed_size, _ = diskcache.read_symcache_trailer(fp)
+        filedata = filepath.read_bytes()
+        filepath.write_bytes(filedata[:10] + filedata[compressed_size:])
+
+        with metricsmock as mm:
+            assert diskcache.get_symcache(key, default=None) is None
+            mm.assert_histogram(
+                "eliot.diskcache.get", tags=["result:error", "host:testnode"]
+            )
+
+    def test_get_symcache_error(self, metricsmock, tmpcachedir, tmpdir):
+        """DiskCache.get_symcache treats malformed files as errors"""
+        diskcache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        key = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+
+        diskcache.set_symcache(key, b"this is junk", "testproj")
+        with metricsmock as mm:
+            assert diskcache.get_symcache(key, default=None) is None
+            mm.assert_histogram(
+                "eliot.diskcache.get", tags=["result:error", "host:testnode"]
+            )
+
+        with pytest.raises(KeyError, match="not in cache"):
+            diskcache.get_symcache("foo.symc")
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+
+            self.server.commands.append(args)
+            command = args[0].upper()
+            if command == b"GET":
+                value = self.server.data.get(args[1])
+                if value is None:
+                    self.wfile.write(b"$-1\r\n")
+                else:
+                    self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"SET":
+                self.server.data[args[1]] = args[2]
+                self.wfile.write(b"+OK\r\n")
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Stand-in server that speaks enough of the Redis protocol for GET and SET"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.commands = []
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+@pytest.fixture
+def fake_redis():
+    with FakeRedisServer() as server:
+        yield server
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("", type(None)),
+        ("redis://localhost:6379/0", RedisSecondTierCache),
+        ("unix:///tmp/redis.sock", RedisSecondTierCache),
+        ("file:///mnt/eliot", DirectorySecondTierCache),
+        ("/mnt/eliot", DirectorySecondTierCache),
+    ],
+)
+def test_get_second_tier_cache(url, expected):
+    assert isinstance(get_second_tier_cache(url), expected)
+
+
+def test_get_second_tier_cache_bad_url():
+    with pytest.raises(ValueError):
+        get_second_tier_cache("http://example.com/")
+
+
+class TestDirectorySecondTierCache:
+    def test_get_set(self, metricsmock, tmpdir):
+        second_tier = DirectorySecondTierCache(Path(tmpdir))
+        with metricsmock as mm:
+            assert second_tier.get("foo/bar.symc") is None
+            mm.assert_histogram(
+                "eliot.secondtiercache.get",
+                tags=["backend:directory", "result:miss", "host:testnode"],
+            )
+
+        assert second_tier.set("foo/bar.symc", b"abcde") is True
+        with metricsmock as mm:
+            assert second_tier.get("foo/bar.symc") == b"abcde"
+            mm.assert_histogram(
+                "eliot.secondtiercache.get",
+                tags=["backend:directory", "result:hit", "host:testnode"],
+            )
+
+        # No temp files are left behind
+        assert [path.name for path in (Path(tmpdir) / "foo").iterdir()] == ["bar.symc"]
+
+    def test_set_from_file(self, tmp_path):
+        second_tier = DirectorySecondTierCache(tmp_path / "second_tier")
+        path = tmp_path / "bar.symc"
+        path.write_bytes(b"abcde")
+        assert second_tier.set_from_file("foo/bar.symc", path) is True
+        assert second_tier.get("foo/bar.symc") == b"abcde"
+
+        path.write_bytes(b"")
+        assert second_tier.set_from_file("foo/bar.symc", path) is True
+        assert second_tier.get("foo/bar.symc") == b""
+
+        assert second_tier.set_from_file("foo/bar.symc", tmp_path / "missing") is False
+
+    def test_set_error(self, metricsmock, tmpdir):
+        # The path is a file, so it can't make directories in it
+        path = Path(tmpdir) / "file"
+        path.write_bytes(b"")
+        second_tier = DirectorySecondTierCache(path)
+
+        with metricsmock as mm:
+            assert second_tier.set("foo/bar.symc", b"abcde") is False
+            mm.assert_histogram(
+                "eliot.secondtiercache.set",
+                tags=["backend:directory", "result:fail", "host:testnode"],
+            )
+
+
+class TestRedisSecondTierCache:
+    def test_get_set(self, metricsmock, fake_redis):
+        second_tier = RedisSecondTierCache(fake_redis.url, ttl=60)
+        assert second_tier.get("foo/bar.symc") is None
+
+        with metricsmock as mm:
+            assert second_tier.set("foo/bar.symc", b"abcde") is True
+            mm.assert_histogram(
+                "eliot.secondtiercache.set",
+                tags=["backend:redis", "result:success", "host:testnode"],
+            )
+        assert fake_redis.commands[-1] == [
+            b"SET",
+            b"eliot:foo/bar.symc",
+            b"abcde",
+            b"EX",
+            b"60",
+        ]
+
+        with metricsmock as mm:
+            assert second_tier.get("foo/bar.symc") == b"abcde"
+            mm.assert_histogram(
+                "eliot.secondtiercache.get",
+                tags=["backend:redis", "result:hit", "host:testnode"],
+            )
+
+    def test_set_from_file(self, fake_redis, tmp_path):
+        second_tier = RedisSecondTierCache(fake_redis.url)
+        path = tmp_path / "bar.symc"
+        path.write_bytes(b"abcde" * 10_000)
+        assert second_tier.set_from_file("foo/bar.symc", path) is True
+        assert fake_redis.data[b"eliot:foo/bar.symc"] == b"abcde" * 10_000
+
+    def test_connection_error(self, metricsmock, fake_redis):
+        second_tier = RedisSecondTierCache(fake_redis.url, timeout=1.0)
+        fake_redis.shutdown()
+        fake_redis.server_close()
+
+        with metricsmock as mm:
+            assert second_tier.get("foo/bar.symc") is None
+            mm.assert_histogram(
+                "eliot.secondtiercache.get",
+                tags=["backend:redis", "result:error", "host:testnode"],
+            )
+        assert second_tier.set("foo/bar.symc", b"abcde") is False
+
+
+class TestDiskCacheSecondTier:
+    KEY = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+
+    def test_set_symcache_publishes(self, tmpcachedir, tmpdir, fake_redis):
+        second_tier = RedisSecondTierCache(fake_redis.url)
+        diskcache = DiskCache(
+            cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir), second_tier=second_tier
+        )
+        diskcache.set_symcache(self.KEY, build_symcache_data(), "testproj.so")
+        diskcache.close()
+
+        # The second tier gets the same file that's on disk
+        assert (
+            fake_redis.data[b"eliot:" + self.KEY.encode("utf-8")]
+            == diskcache.key_to_filepath(self.KEY).read_bytes()
+        )
+
+    def test_set_symcache_publishes_in_background(self, tmp_path):
+        """Publishing to a slow second tier doesn't hold up setting the symcache"""
+        publishing = threading.Event()
+        release = threading.Event()
+
+        class SlowSecondTierCache(DirectorySecondTierCache):
+            def set_data(self, key, data):
+                publishing.set()
+                release.wait(timeout=10)
+                super().set_data(key, data)
+
+        (tmp_path / "cache").mkdir()
+        second_tier = SlowSecondTierCache(tmp_path / "second_tier")
+        diskcache = DiskCache(
+            cachedir=tmp_path / "cache", tmpdir=tmp_path, second_tier=second_tier
+        )
+        try:
+            diskcache.set_symcache(self.KEY, build_symcache_data(), "testproj.so")
+            assert publishing.wait(timeout=10)
+            assert diskcache.key_to_filepath(self.KEY).is_file()
+            assert second_tier.get(self.KEY) is None
+        finally:
+            release.set()
+            diskcache.close()
+
+        assert (
+            second_tier.get(self.KEY)
+            == diskcache.key_to_filepath(self.KEY).read_bytes()
+        )
+
+    def test_get_symcache_from_second_tier(self, tmp_path, tmpdir, fake_redis):
+        """A symcache one node built can be used by another node"""
+        second_tier = RedisSecondTierCache(fake_redis.url)
+        (tmp_path / "node1").mkdir()
+        (tmp_path / "node2").mkdir()
+        diskcache1 = DiskCache(
+            cachedir=tmp_path / "node1", tmpdir=Path(tmpdir), second_tier=second_tier
+        )
+        diskcache2 = DiskCache(
+            cachedir=tmp_path / "node2", tmpdir=Path(tmpdir), second_tier=second_tier
+        )
+
+        with pytest.raises(KeyError):
+            diskcache2.get_symcache(self.KEY)
+
+        diskcache1.set_symcache(self.KEY, build_symcache_data(), "testproj.so")
+        diskcache1.close()
+
+        data = diskcache2.get_symcache(self.KEY)
+        assert data["filename"] == "testproj.so"
+        assert data["symcache"].lookup(0x5380)[0].symbol == "testproj::main"
+
+        # The symcache file gets saved to disk on the second node
+        assert diskcache2.key_to_filepath(self.KEY).is_file()
+
+    def test_get_symcache_bad_data(self, tmpcachedir, tmpdir):
+        """Junk in the second tier cache is treated as a miss"""
+        second_tier = DirectorySecondTierCache(Path(tmpdir))
+        second_tier.set(self.KEY, b"this is junk")
+        (Path(tmpcachedir) / "node").mkdir()
+        diskcache = DiskCache(
+            cachedir=Path(tmpcachedir) / "node",
+            tmpdir=Path(tmpdir),
+            second_tier=second_tier,
+        )
+        assert diskcache.get_symcache(self.KEY, default=None) is None
+        assert not diskcache.key_to_filepath(self.KEY).exists()
+
+
+class TestMemoryCache:
+    def test_get_set(self, metricsmock):
+        memory_cache = MemoryCache(max_size=100)
+        with metricsmock as mm:
+            assert memory_cache.get("foo") is None
+            mm.assert_incr(
+                "eliot.memorycache.get", tags=["result:miss", "host:testnode"]
+            )
+
+        memory_cache.set("foo", "foo_value", 10)
+        with metricsmock as mm:
+            assert memory_cache.get("foo") == "foo_value"
+            mm.assert_incr(
+                "eliot.memorycache.get", tags=["result:hit", "host:testnode"]
+            )
+
+        assert memory_cache.total_size == 10
+
+    def test_get_default(self):
+        memory_cache = MemoryCache(max_size=100)
+        assert memory_cache.get("foo", default="bar") == "bar"
+
+    def test_set_overwrite(self):
+        memory_cache = MemoryCache(max_size=100)
+        memory_cache.set("foo", "foo_value", 10)
+        memory_cache.set("foo", "foo_value2", 20)
+        assert memory_cache.get("foo") == "foo_value2"
+        assert memory_cache.total_size == 20
+        assert len(memory_cache) == 1
+
+    def test_evict_lru(self, metricsmock):
+        memory_cache = MemoryCache(max_size=30)
+        memory_cache.set("key1", "value1", 10)
+        memory_cache.set("key2", "value2", 10)
+        memory_cache.set("key3", "value3", 10)
+
+        # Touch key1 so that key2 and key3 are the least recently used
+        memory_cache.get("key1")
+
+        with metricsmock as mm:
+            memory_cache.set("key4", "value4", 15)
+            mm.assert_incr("eliot.memorycache.evict", value=2, tags=["host:testnode"])
+
+        assert "key1" in memory_cache
+        assert "key2" not in memory_cache
+        assert "key3" not in memory_cache
+        assert "key4" in memory_cache
+        assert memory_cache.total_size == 25
+
+    def test_too_big(self):
+        memory_cache = MemoryCache(max_size=10)
+        memory_cache.set("foo", "foo_value", 11)
+        assert "foo" not in memory_cache
+        assert memory_cache.total_size == 0
+
+
+def test_access_throttle():
+    throttle = AccessThrottle(interval=60, max_items=2)
+    assert throttle.should_record("a") is True
+    assert throttle.should_record("a") is False
+
+    throttle.forget("a")
+    assert throttle.should_record("a") is True
+
+    # Keys noted as recorded some other way wait for the interval
+    throttle.recorded("b")
+    assert throttle.should_record("b") is False
+
+    # The oldest keys are forgotten when there are too many
+    throttle.recorded("c")
+    assert throttle.should_record("a") is True
+
+
+class TestSharedSymcacheCache:
+    KEY = "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+
+    @pytest.fixture
+    def diskcache(self, tmpcachedir, tmpdir):
+        return DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+
+    @pytest.fixture
+    def make_shared_cache(self, diskcache):
+        """Returns a function that builds shared caches and closes them afterwards"""
+        shared_caches = []
+
+        def _make_shared_cache(max_items=10):
+            shared_cache = SharedSymcacheCache(diskcache=diskcache, max_items=max_items)
+            shared_caches.append(shared_cache)
+            return shared_cache
+
+        yield _make_shared_cache
+
+        for shared_cache in shared_caches:
+            shared_cache.close()
+
+    def test_get(self, metricsmock, diskcache, make_shared_cache):
+        shared_cache = make_shared_cache()
+        symcache_data = build_symcache_data()
+
+        with metricsmock as mm:
+            assert shared_cache.get(self.KEY) is None
+            mm.assert_incr(
+                "eliot.sharedcache.get", tags=["result:miss", "host:testnode"]
+            )
+
+        # The first get maps the file from the disk cache and the second uses the
+        # mapped symcache
+        diskcache.set_symcache(self.KEY, symcache_data, "testproj.so")
+        with metricsmock as mm:
+            symcache, filename = shared_cache.get(self.KEY)
+            mm.assert_incr(
+                "eliot.sharedcache.get", tags=["result:mapped", "host:testnode"]
+            )
+        assert filename == "testproj.so"
+        assert symcache.lookup(0x5380)[0].symbol == "testproj::main"
+
+        with metricsmock as mm:
+            assert shared_cache.get(self.KEY) == (symcache, filename)
+            mm.assert_incr(
+                "eliot.sharedcache.get", tags=["result:hit", "host:testnode"]
+            )
+        assert shared_cache.total_size == len(symcache_data)
+
+    def test_get_legacy(self, diskcache, make_shared_cache):
+        """Legacy msgpack-encoded files can't be mapped"""
+        shared_cache = make_shared_cache()
+
+        diskcache.set(self.KEY, {"symcache": build_symcache_data(), "filename": "foo"})
+        assert shared_cache.get(self.KEY) is None
+
+    def test_publish(self, diskcache, make_shared_cache):
+        shared_cache = make_shared_cache()
+
+        symcache, filename = shared_cache.publish(
+            self.KEY, build_symcache_data(), "testproj.so"
+        )
+        assert filename == "testproj.so"
+        assert symcache.lookup(0x5380)[0].symbol == "testproj::main"
+        assert diskcache.key_to_filepath(self.KEY).exists()
+        assert self.KEY in shared_cache
+
+    def test_evicted_file(self, metricsmock, diskcache, make_shared_cache):
+        """Entries for files that were evicted are dropped, but stay usable"""
+        shared_cache = make_shared_cache()
+        symcache, _ = shared_cache.publish(
+            self.KEY, build_symcache_data(), "testproj.so"
+        )
+
+        diskcache.key_to_filepath(self.KEY).unlink()
+        with metricsmock as mm:
+            assert shared_cache.get(self.KEY) is None
+            mm.assert_incr(
+                "eliot.sharedcache.evict", tags=["reason:stale", "host:testnode"]
+            )
+        assert len(shared_cache) == 0
+        assert shared_cache.total_size == 0
+
+        # The mapping is still valid for anything still using it
+        assert symcache.lookup(0x5380)[0].symbol == "testproj::main"
+
+    def test_get_compressed(self, tmpcachedir, tmpdir, make_shared_cache):
+        """Compressed files can't be mapped"""
+        zstd_cache = DiskCache(
+            cachedir=Path(tmpcachedir),
+            tmpdir=Path(tmpdir),
+            compressor=get_compressor("zstd"),
+        )
+        shared_cache = make_shared_cache()
+
+        zstd_cache.set_symcache(self.KEY, build_symcache_data(), "testproj.so")
+        assert shared_cache.get(self.KEY) is None
+
+    def test_replaced_file(self, diskcache, make_shared_cache):
+        """Entries for files that were replaced get mapped again"""
+        shared_cache = make_shared_cache()
+        symcache_data = build_symcache_data()
+        shared_cache.publish(self.KEY, symcache_data, "testproj.so")
+
+        diskcache.set_symcache(self.KEY, symcache_data, "testproj2.so")
+        _, filename = shared_cache.get(self.KEY)
+        assert filename == "testproj2.so"
+
+    def test_evict_lru(self, metricsmock, diskcache, make_shared_cache):
+        shared_cache = make_shared_cache(max_items=2)
+        symcache_data = build_symcache_data()
+        for key in ["key1.symc", "key2.symc"]:
+            shared_cache.publish(key, symcache_data, "testproj.so")
+
+        # Touch key1 so that key2 is the least recently used
+        shared_cache.get("key1.symc")
+
+        with metricsmock as mm:
+            shared_cache.publish("key3.symc", symcache_data, "testproj.so")
+            mm.assert_incr(
+                "eliot.sharedcache.evict", tags=["reason:lru", "host:testnode"]
+            )
+
+        assert "key1.symc" in shared_cache
+        assert "key2.symc" not in shared_cache
+        assert "key3.symc" in shared_cache
+
+        # Evicting unmaps the file, but leaves it in the disk cache
+        assert diskcache.key_to_filepath("key2.symc").exists()
+
+
+class TestLookupCache:
+    def test_get_set(self, metricsmock):
+        lookup_cache = LookupCache(max_items=10)
+        module_info = ("xul.pdb", "ABCDE")
+        lookup_cache.set_many(module_info, {1: "one", 2: None})
+
+        with metricsmock as mm:
+            assert lookup_cache.get_many(module_info, [1, 2, 3]) == {1: "one", 2: None}
+            mm.assert_incr(
+                "eliot.lookupcache.get", value=2, tags=["result:hit", "host:testnode"]
+            )
+            mm.assert_incr(
+                "eliot.lookupcache.get", value=1, tags=["result:miss", "host:testnode"]
+            )
+
+        # Offsets are per module
+        assert lookup_cache.get_many(("xul.pdb", "FFFFF"), [1, 2]) == {}
+
+    def test_evict_lru(self, metricsmock):
+        lookup_cache = LookupCache(max_items=3)
+        module_info = ("xul.pdb", "ABCDE")
+        lookup_cache.set_many(module_info, {1: "one", 2: "two", 3: "three"})
+
+        # Touch 1 so that 2 is the least recently used
+        lookup_cache.get_many(module_info, [1])
+
+        with metricsmock as mm:
+            lookup_cache.set_many(module_info, {4: "four"})
+            mm.assert_incr("eliot.lookupcache.evict", value=1, tags=["host:testnode"])
+
+        assert len(lookup_cache) == 3
+        assert lookup_cache.get_many(module_info, [1, 2, 3, 4]) == {
+            1: "one",
+            3: "three",
+            4: "four",
+        }
+
+
+class TestNegativeCache:
+    def test_get_set(self, metricsmock):
+        negative_cache = NegativeCache(ttl=60, error_ttl=10)
+        with metricsmock as mm:
+            assert negative_cache.get("xul.pdb/ABCDE.symc") is None
+            mm.assert_incr(
+                "eliot.negativecache.get", tags=["result:miss", "host:testnode"]
+            )
+
+        with metricsmock as mm:
+            negative_cache.set("xul.pdb/ABCDE.symc", NegativeCache.NOT_FOUND)
+            mm.assert_incr(
+                "eliot.negativecache.set", tags=["reason:not_found", "host:testnode"]
+            )
+
+        with metricsmock as mm:
+            assert negative_cache.get("xul.pdb/ABCDE.symc") == NegativeCache.NOT_FOUND
+            mm.assert_incr(
+                "eliot.negativecache.get",
+                tags=["result:hit", "reason:not_found", "host:testnode"],
+            )
+
+    def test_ttls(self):
+        negative_cache = NegativeCache(ttl=60, error_ttl=10)
+        negative_cache.set("notfound", NegativeCache.NOT_FOUND)
+        negative_cache.set("error", NegativeCache.ERROR)
+
+        now = time.time()
+        with mock.patch("eliot.cache.time.time", return_value=now + 30):
+            assert negative_cache.get("notfound") == NegativeCache.NOT_FOUND
+            assert negative_cache.get("error") is None
+
+        with mock.patch("eliot.cache.time.time", return_value=now + 61):
+            assert negative_cache.get("notfound") is None
+
+    def test_error_ttl_zero(self):
+        negative_cache = NegativeCache(ttl=60, error_ttl=0)
+        negative_cache.set("error", NegativeCache.ERROR)
+        assert negative_cache.get("error") is None
+
+    def test_max_items(self):
+        negative_cache = NegativeCache(ttl=60, error_ttl=10, max_items=2)
+        negative_cache.set("key1", NegativeCache.NOT_FOUND)
+        negative_cache.set("key2", NegativeCache.NOT_FOUND)
+        negative_cache.set("key3", NegativeCache.NOT_FOUND)
+        assert len(negative_cache) == 2
+        assert negative_cache.get("key1") is None
+        assert negative_cache.get("key3") == NegativeCache.NOT_FOUND
+
+    def test_diskcache(self, tmpcachedir, tmpdir):
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        negative_cache = NegativeCache(ttl=60, error_ttl=10, diskcache=cache)
+        negative_cache.set("xul.pdb/ABCDE.symc", NegativeCache.NOT_FOUND)
+
+        filepath = Path(tmpcachedir) / "xul.pdb" / "ABCDE.symc.missing"
+        assert filepath.exists()
+
+        # Another process with its own memory can see the entry
+        negative_cache2 = NegativeCache(ttl=60, error_ttl=10, diskcache=cache)
+        assert negative_cache2.get("xul.pdb/ABCDE.symc") == NegativeCache.NOT_FOUND
+
+        # Expired entries get removed from disk
+        negative_cache3 = NegativeCache(ttl=60, error_ttl=10, diskcache=cache)
+        with mock.patch("eliot.cache.time.time", return_value=time.time() + 61):
+            assert negative_cache3.get("xul.pdb/ABCDE.symc") is None
+        assert not filepath.exists()
+
+    @pytest.mark.parametrize("data", [b"\xc1", b"\x92\x01", b"\x92\x01\x02", b""])
+    def test_diskcache_bad_file(self, tmpcachedir, tmpdir, data):
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        filepath = Path(tmpcachedir) / "xul.pdb" / "ABCDE.symc.missing"
+        filepath.parent.mkdir(parents=True)
+        filepath.write_bytes(data)
+
+        # Bad files are treated as misses and removed
+        negative_cache = NegativeCache(ttl=60, error_ttl=10, diskcache=cache)
+        assert negative_cache.get("xul.pdb/ABCDE.symc") is None
+        assert not filepath.exists()
+
+
+class TestSingleFlight:
+    def test_lock(self, tmpdir):
+        singleflight = SingleFlight(lockdir=Path(tmpdir))
+        lockpath = singleflight.key_to_lockpath("foo")
+
+        with singleflight.lock("foo") as waited:
+            assert waited is False
+            assert lockpath.exists()
+
+        # The lock file and the in-process lock are cleaned up
+        assert not lockpath.exists()
+        assert singleflight._locks == {}
+
+    def test_lock_waits_threads(self, tmpdir):
+        singleflight = SingleFlight(lockdir=Path(tmpdir))
+        results = []
+
+        def worker():
+            with singleflight.lock("foo") as waited:
+                results.append(waited)
+
+        with singleflight.lock("foo"):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            time.sleep(0.1)
+            assert results == []
+
+        thread.join()
+        assert results == [True]
+
+    def test_lock_async(self, tmpdir):
+        singleflight = SingleFlight(lockdir=Path(tmpdir))
+
+        async def use_lock():
+            async with singleflight.lock_async("foo") as waited:
+                assert singleflight.key_to_lockpath("foo").exists()
+                return waited
+
+        assert asyncio.run(use_lock()) is False
+        assert not singleflight.key_to_lockpath("foo").exists()
+        assert singleflight._async_locks == {}
+
+    def test_lock_async_cancelled(self, tmpdir):
+        """Cancelling a coroutine waiting for the lock doesn't leave it locked"""
+        singleflight = SingleFlight(lockdir=Path(tmpdir))
+        held = threading.Event()
+        release = threading.Event()
+
+        def holder():
+            with singleflight.lock("foo"):
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        held.wait()
+
+        async def wait_for_lock():
+            async with singleflight.lock_async("foo"):
+                pass
+
+        async def cancel_waiter():
+            task = asyncio.create_task(wait_for_lock())
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            # Let the holder go; the cancelled waiter's thread gets the lock and
+            # releases it right away, so the lock is available again
+            release.set()
+            async with asyncio.timeout(5):
+                async with singleflight.lock_async("foo") as waited:
+                    return waited
+
+        asyncio.run(cancel_waiter())
+        thread.join()
+        assert not singleflight.key_to_lockpath("foo").exists()
+        assert singleflight._locks == {}
+        assert singleflight._async_locks == {}
+
+    def test_lock_async_more_waiters_than_threads(self, tmpdir):
+        """Waiters don't use up the threads the lock holder needs to finish"""
+        singleflight = SingleFlight(lockdir=Path(tmpdir))
+        # A second instance with the same lockdir acts like another process
+        other_process = SingleFlight(lockdir=Path(tmpdir))
+        results = []
+
+        async def waiter():
+            loop = asyncio.get_running_loop()
+            async with singleflight.lock_async("foo") as waited:
+                # The holder needs the default executor to do its work
+                await loop.run_in_executor(None, time.sleep, 0.01)
+                results.append(waited)
+
+        async def run_waiters():
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=2))
+
+            # Another process holds the lock at first, so waiting for the lock file
+            # needs a thread
+            fd, _ = other_process._acquire_file_lock("foo")
+            tasks = [asyncio.create_task(waiter()) for _ in range(20)]
+            await asyncio.sleep(0.1)
+            other_process._release_file_lock("foo", fd)
+
+            async with asyncio.timeout(10):
+                await asyncio.gather(*tasks)
+
+        asyncio.run(run_waiters())
+        singleflight.close()
+        assert results == [True] * 20
+        assert not singleflight.key_to_lockpath("foo").exists()
+        assert singleflight._async_locks == {}
+
+    def test_lock_waits_processes(self, tmpdir):
+        # Two SingleFlight instances with the same lockdir act like separate
+        # processes
+        singleflight_a = SingleFlight(lockdir=Path(tmpdir))
+        singleflight_b = SingleFlight(lockdir=Path(tmpdir))
+        results = []
+
+        def worker():
+            with singleflight_b.lock("foo") as waited:
+                results.append(waited)
+
+        with singleflight_a.lock("foo"):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            time.sleep(0.1)
+            assert results == []
+
+        thread.join()
+        assert results == [True]
+
+    def test_different_keys(self, tmpdir):
+        singleflight = SingleFlight(lockdir=Path(tmpdir))
+        with singleflight.lock("foo"):
+            with singleflight.lock("bar") as waited:
+                assert waited is False
@@ -2,7 +2,11 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+from collections import OrderedDict
+import os
 import pathlib
+import shutil
+import threading
 import time
 from unittest.mock import ANY
 
@@ -10,12 +14,20 @@ from everett.manager import ConfigManager, ConfigDictEnv, ConfigOSEnv
 from fillmore.test import diff_structure
 from markus.testing import MetricsMock
 import pytest
+import requests
 
+from eliot.cache import COST_XATTR, DiskCache, SharedSymcacheCache
 from eliot.cache_manager import (
     count_sentry_scrub_error,
     get_cache_manager,
     LastUpdatedOrderedDict,
+    LRUJournal,
+    scan_directory,
+    UnlinkWorker,
 )
+from eliot.cache_status import MAX_TOP_N
+
+from tests.test_cache import build_symcache_data
 
 
 class TestLastUpdatedOrderedDict:
@@ -117,6 +129,374 @@ def test_existing_files(cm_client, tmpdir):
     assert cm.total_size == 11
 
 
+def test_existing_files_ordered_by_last_used(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    (cachedir / "xul").mkdir()
+    paths = []
+    for name in ["rose", "dandelion", "orchid", "iris"]:
+        path = cachedir / "xul" / f"{name}.symc"
+        path.write_bytes(b"ab")
+        paths.append(path)
+
+    # Set last used times so the order is different than the order the files were
+    # created in and listed in
+    now = time.time()
+    for path, age in zip(paths, [10, 40, 20, 30], strict=True):
+        os.utime(path, (now - age, now - age))
+
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    assert list(cm.lru) == [str(paths[1]), str(paths[3]), str(paths[2]), str(paths[0])]
+    assert cm.total_size == 8
+
+
+def test_existing_nested_directories(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    for i in range(10):
+        subdir = cachedir / f"dir{i}" / "sub"
+        subdir.mkdir(parents=True)
+        (subdir / "file.symc").write_bytes(b"a" * i)
+
+    cm_client.rebuild(
+        {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir),
+            "ELIOT_SYMBOLS_CACHE_INVENTORY_CONCURRENCY": "3",
+        }
+    )
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    assert len(cm.lru) == 10
+    assert cm.total_size == sum(range(10))
+    # cache dir, 10 dirs, and 10 subdirs
+    assert len(cm.watches) == 21
+
+
+def test_scan_directory(tmpdir):
+    cachedir = pathlib.Path(tmpdir)
+    (cachedir / "dir1").mkdir()
+    (cachedir / "file1.symc").write_bytes(b"abc")
+    (cachedir / "file2.symc").write_bytes(b"abcde")
+
+    # Known files get the size they're known to have and aren't stat'd
+    known = {str(cachedir / "file2.symc"): 100}
+    subdirs, files = scan_directory(str(cachedir), known)
+    assert subdirs == [str(cachedir / "dir1")]
+    assert sorted(files) == [
+        (str(cachedir / "file1.symc"), 3, ANY),
+        (str(cachedir / "file2.symc"), 100, None),
+    ]
+
+    assert scan_directory(str(cachedir / "missing")) == ([], [])
+
+
+def test_snapshot_restore(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    config = {"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)}
+    cm_client.rebuild(config)
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    file1 = cachedir / "file1.symc"
+    file1.write_bytes(b"abcde")
+    file2 = cachedir / "file2.symc"
+    file2.write_bytes(b"abcd")
+    file3 = cachedir / "file3.symc"
+    file3.write_bytes(b"abc")
+    cm.run_once()
+
+    # Access file1 so it's most recently used
+    file1.read_bytes()
+    cm.run_once()
+    assert list(cm.lru) == [str(file2), str(file3), str(file1)]
+
+    # Shutting down saves the snapshot
+    cm.shutdown()
+    assert (pathlib.Path(tmpdir) / "lru.snapshot").exists()
+
+    # Change things while the cache manager is down
+    file3.unlink()
+    file4 = cachedir / "file4.symc"
+    file4.write_bytes(b"ab")
+
+    # The LRU order comes from the snapshot and new files are added after
+    cm_client.rebuild(config)
+    cm = cm_client.cache_manager
+    cm.run_once()
+    assert list(cm.lru.items()) == [(str(file2), 4), (str(file1), 5), (str(file4), 2)]
+    assert cm.total_size == 11
+
+
+def test_snapshot_restore_verifies_on_evict(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    config = {"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)}
+    cm_client.rebuild(config)
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    file1 = cachedir / "file1.symc"
+    file1.write_bytes(b"abcde")
+    file2 = cachedir / "file2.symc"
+    file2.write_bytes(b"abcd")
+    file3 = cachedir / "file3.symc"
+    file3.write_bytes(b"abc")
+    cm.run_once()
+    cm.shutdown()
+
+    # Set times so files are older than the snapshot and then replace file1 with a
+    # bigger file while the cache manager is down
+    snapshot_time = (pathlib.Path(tmpdir) / "lru.snapshot").stat().st_mtime
+    for i, path in enumerate([file1, file2, file3]):
+        os.utime(path, (snapshot_time - 100 + i, snapshot_time - 100 + i))
+    file1.write_bytes(b"abcdefghij")
+    os.utime(file1, (snapshot_time + 10, snapshot_time + 10))
+
+    # Files in the snapshot aren't stat'd at startup, so file1 has its old size and
+    # the snapshot isn't saved again since nothing changed
+    snapshot_path = pathlib.Path(tmpdir) / "lru.snapshot"
+    snapshot_stat = snapshot_path.stat()
+    cm_client.rebuild(config)
+    cm = cm_client.cache_manager
+    cm.run_once()
+    assert list(cm.lru.items()) == [(str(file1), 5), (str(file2), 4), (str(file3), 3)]
+    assert cm.total_size == 12
+    assert snapshot_path.stat().st_ino == snapshot_stat.st_ino
+    assert snapshot_path.stat().st_mtime_ns == snapshot_stat.st_mtime_ns
+
+    # When file1 comes up for eviction, it's stat'd and kept since it changed
+    # after the snapshot; the other files are evicted
+    cm.evict(10)
+    assert list(cm.lru.items()) == [(str(file1), 10)]
+    assert cm.total_size == 10
+    assert sorted(cachedir.iterdir()) == [file1]
+
+
+def test_run_loop_stops(cm_client, tmpdir):
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+    cm = cm_client.cache_manager
+
+    def stop():
+        # Wait for the loop to start and then do what the SIGTERM handler does; the
+        # loop exits after the current batch and saves the snapshot
+        while not getattr(cm, "running", False):
+            time.sleep(0.01)
+        cm.running = False
+
+    thread = threading.Thread(target=stop, daemon=True)
+    thread.start()
+    cm.run_loop()
+    thread.join()
+
+    assert cm._generator is None
+    assert (pathlib.Path(tmpdir) / "lru.snapshot").exists()
+
+
+def test_snapshot_disabled(cm_client, tmpdir):
+    cm_client.rebuild(
+        {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir),
+            "ELIOT_SYMBOLS_CACHE_SNAPSHOT_INTERVAL": "0",
+        }
+    )
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+    (pathlib.Path(tmpdir) / "cache" / "file1.symc").write_bytes(b"abcde")
+    cm.run_once()
+    cm.shutdown()
+
+    assert not (pathlib.Path(tmpdir) / "lru.snapshot").exists()
+
+
+def test_snapshot_bad(cm_client, tmpdir):
+    (pathlib.Path(tmpdir) / "lru.snapshot").write_text("junk\n")
+    (pathlib.Path(tmpdir) / "cache" / "file1.symc").write_bytes(b"abcde")
+
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+    assert cm.total_size == 5
+
+
+class TestLRUJournal:
+    def test_replay(self, tmpdir):
+        cachedir = pathlib.Path(tmpdir) / "cache"
+        journal = LRUJournal(
+            path=pathlib.Path(tmpdir) / "lru.journal", cachedir=cachedir
+        )
+        journal.open()
+        journal.record(LRUJournal.CREATE, str(cachedir / "xul" / "a.symc"), 5)
+        journal.record(LRUJournal.CREATE, str(cachedir / "xul" / "b.symc"), 4)
+        journal.record(LRUJournal.CREATE, str(cachedir / "xul" / "c.symc"), 3)
+        journal.record(LRUJournal.ACCESS, str(cachedir / "xul" / "a.symc"))
+        journal.record(LRUJournal.DELETE, str(cachedir / "xul" / "b.symc"))
+        journal.close()
+        assert journal.entries == 5
+
+        lru = OrderedDict([(str(cachedir / "old.symc"), 1)])
+        assert journal.replay(lru) == 5
+        assert list(lru.items()) == [
+            (str(cachedir / "old.symc"), 1),
+            (str(cachedir / "xul" / "c.symc"), 3),
+            (str(cachedir / "xul" / "a.symc"), 5),
+        ]
+
+    def test_replay_bad_entries(self, tmpdir):
+        cachedir = pathlib.Path(tmpdir) / "cache"
+        path = pathlib.Path(tmpdir) / "lru.journal"
+        # Unknown op, bad size, and a partially written last entry
+        path.write_text("C 5 a.symc\nX b.symc\nC junk c.symc\nA a.symc\nC 4 d.sy")
+
+        journal = LRUJournal(path=path, cachedir=cachedir)
+        lru = OrderedDict()
+        assert journal.replay(lru) == 2
+        assert journal.skipped == 2
+        assert lru == {str(cachedir / "a.symc"): 5}
+
+    def test_truncate(self, tmpdir):
+        cachedir = pathlib.Path(tmpdir) / "cache"
+        path = pathlib.Path(tmpdir) / "lru.journal"
+        journal = LRUJournal(path=path, cachedir=cachedir)
+        journal.open()
+        journal.record(LRUJournal.CREATE, str(cachedir / "a.symc"), 5)
+        journal.truncate()
+        journal.record(LRUJournal.CREATE, str(cachedir / "b.symc"), 4)
+        journal.close()
+
+        assert path.read_text() == "C 4 b.symc\n"
+        assert journal.entries == 1
+
+
+def test_journal_restores_lru_after_crash(cm_client, tmpdir):
+    basedir = pathlib.Path(tmpdir) / "node"
+    cachedir = basedir / "cache"
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(basedir)})
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    file1 = cachedir / "file1.symc"
+    file1.write_bytes(b"abcde")
+    file2 = cachedir / "file2.symc"
+    file2.write_bytes(b"abcd")
+    file3 = cachedir / "file3.symc"
+    file3.write_bytes(b"abc")
+    cm.run_once()
+    file1.read_bytes()
+    cm.run_once()
+    file3.unlink()
+    cm.run_once()
+    assert list(cm.lru) == [str(file2), str(file1)]
+
+    # Copy the cache without shutting down the cache manager like it crashed; paths
+    # in the snapshot and journal are relative to the cachedir
+    crashdir = pathlib.Path(tmpdir) / "crashed"
+    shutil.copytree(basedir, crashdir)
+    cm.shutdown()
+    # Set last used times so a full rescan would get the order wrong; they're before
+    # the journal was last written, so the files are unchanged
+    now = time.time()
+    os.utime(crashdir / "cache" / "file1.symc", (now - 100, now - 100))
+    os.utime(crashdir / "cache" / "file2.symc", (now - 50, now - 50))
+
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(crashdir)})
+    cm = cm_client.cache_manager
+    cm.run_once()
+    assert list(cm.lru.items()) == [
+        (str(crashdir / "cache" / "file2.symc"), 4),
+        (str(crashdir / "cache" / "file1.symc"), 5),
+    ]
+
+
+def test_journal_compacted_on_snapshot(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    (cachedir / "file1.symc").write_bytes(b"abcde")
+    cm.run_once()
+    journal_path = pathlib.Path(tmpdir) / "lru.journal"
+    # Writing the file triggers CREATE and MODIFY events which are both recorded
+    assert set(journal_path.read_text().splitlines()) == {"C 5 file1.symc"}
+
+    cm.save_snapshot()
+    assert journal_path.read_text() == ""
+    assert (pathlib.Path(tmpdir) / "lru.snapshot").read_text().splitlines() == [
+        "eliot-lru-snapshot 1",
+        "5 file1.symc",
+    ]
+
+
+def test_journal_flushed_with_lock(cm_client, tmpdir):
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    # The status server can trim and write to the journal from another thread, so
+    # the loop has to hold the lock when it flushes the journal
+    locked = []
+    flush = cm.journal.flush
+
+    def _flush():
+        locked.append(cm.lock.locked())
+        flush()
+
+    cm.journal.flush = _flush
+    (pathlib.Path(tmpdir) / "cache" / "file1.symc").write_bytes(b"abcde")
+    cm.run_once()
+    assert locked == [True]
+    assert cm._snapshot_dirty
+
+
+@pytest.mark.parametrize(
+    "break_journal",
+    [
+        pytest.param(lambda path: path.unlink(), id="missing"),
+        pytest.param(lambda path: path.write_text("X junk\n"), id="corrupt"),
+    ],
+)
+def test_journal_bad_falls_back_to_scan(cm_client, tmpdir, break_journal):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    config = {"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)}
+    cm_client.rebuild(config)
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    file1 = cachedir / "file1.symc"
+    file1.write_bytes(b"abcde")
+    file2 = cachedir / "file2.symc"
+    file2.write_bytes(b"abcd")
+    cm.run_once()
+    cm.shutdown()
+
+    # Change file1 while the cache manager is down without changing its last used
+    # time and break the journal so changes to the LRU could be missing
+    snapshot_time = (pathlib.Path(tmpdir) / "lru.snapshot").stat().st_mtime
+    file1.write_bytes(b"abcdefghij")
+    for i, path in enumerate([file1, file2]):
+        os.utime(path, (snapshot_time - 100 + i, snapshot_time - 100 + i))
+    break_journal(pathlib.Path(tmpdir) / "lru.journal")
+
+    # Every file is stat'd, but the order still comes from the snapshot
+    cm_client.rebuild(config)
+    cm = cm_client.cache_manager
+    cm.run_once()
+    assert list(cm.lru.items()) == [(str(file1), 10), (str(file2), 4)]
+    assert cm.total_size == 14
+    assert cm._unverified == set()
+
+
 def test_addfiles(cm_client, tmpdir):
     # Rebuild with the tmpdir we're using
     cm_client.rebuild(
@@ -254,6 +634,308 @@ def test_eviction_of_least_recently_used(cm_client, tmpdir):
     assert sorted(files) == sorted([str(file1), str(file4), str(file5)])
 
 
+def test_gdsf_evicts_cheap_files(cm_client, tmpdir):
+    basedir = pathlib.Path(tmpdir)
+    cachedir = basedir / "cache"
+    cm_client.rebuild(
+        {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(basedir),
+            "ELIOT_SYMBOLS_CACHE_MAX_SIZE": "10",
+            "ELIOT_SYMBOLS_CACHE_EVICTION_POLICY": "gdsf",
+        }
+    )
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    def add_file(name, data, cost):
+        # Write the file with the cost somewhere else and move it into the cache
+        # like DiskCache does
+        path = basedir / name
+        path.write_bytes(data)
+        os.setxattr(path, COST_XATTR, str(cost).encode())
+        path.rename(cachedir / name)
+        return cachedir / name
+
+    expensive = add_file("expensive.symc", b"abcd", 5.0)
+    cheap = add_file("cheap.symc", b"abcd", 0.1)
+    cm.run_once()
+    assert list(cm.lru) == [str(expensive), str(cheap)]
+
+    # The least recently used file is expensive, but the cheap one gets evicted
+    new = add_file("new.symc", b"abcd", 1.0)
+    cm.run_once()
+    assert cm.lru == {str(expensive): 4, str(new): 4}
+    assert not cheap.exists()
+
+
+def test_access_metrics(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+
+    with MetricsMock() as metricsmock:
+        cm = cm_client.cache_manager
+        cm.run_once()
+        assert cm.hit_ratio is None
+
+        file1 = cachedir / "file1.symc"
+        file1.write_bytes(b"abcde")
+        cm.run_once()
+        file1.read_bytes()
+        cm.run_once()
+
+        assert cm.hits == 1
+        assert cm.misses == 1
+        metricsmock.assert_incr(
+            "eliot.diskcache.access",
+            tags=["result:miss", "policy:lru", "host:testnode"],
+        )
+        metricsmock.assert_incr(
+            "eliot.diskcache.access",
+            tags=["result:hit", "policy:lru", "host:testnode"],
+        )
+        metricsmock.assert_gauge(
+            "eliot.diskcache.hit_ratio",
+            value=0.5,
+            tags=["policy:lru", "host:testnode"],
+        )
+
+
+class TestUnlinkWorker:
+    def test_unlink(self, tmpdir):
+        path = pathlib.Path(tmpdir) / "file1.symc"
+        path.write_bytes(b"abcde")
+
+        worker = UnlinkWorker()
+        worker.start()
+        worker.submit(str(path), 5)
+        # Removing a file that's already gone is fine
+        worker.submit(str(pathlib.Path(tmpdir) / "missing.symc"), 5)
+        worker.stop()
+        assert not path.exists()
+        assert worker.pending_count == 0
+
+    def test_cancel(self, tmpdir):
+        path = pathlib.Path(tmpdir) / "file1.symc"
+        path.write_bytes(b"abcde")
+
+        # Submit before starting so cancel happens before the worker gets to it
+        worker = UnlinkWorker()
+        worker.submit(str(path), 5)
+        assert worker.pending_size == 5
+        assert worker.cancel(str(path)) is True
+        worker.start()
+        worker.stop()
+        assert path.exists()
+
+
+def test_batch_eviction(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    cm_client.rebuild(
+        {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir),
+            "ELIOT_SYMBOLS_CACHE_MAX_SIZE": "10",
+            "ELIOT_SYMBOLS_CACHE_HIGH_WATERMARK": "0.8",
+            "ELIOT_SYMBOLS_CACHE_LOW_WATERMARK": "0.5",
+        }
+    )
+
+    cm = cm_client.cache_manager
+    assert cm.high_watermark == 8
+    assert cm.low_watermark == 5
+    cm.run_once()
+
+    files = []
+    for i in range(4):
+        files.append(cachedir / f"file{i}.symc")
+        files[-1].write_bytes(b"ab")
+    cm.run_once()
+    # At the high watermark, but not over it, so nothing is evicted
+    assert cm.total_size == 8
+
+    # Going over the high watermark evicts down to the low watermark
+    files.append(cachedir / "file4.symc")
+    files[-1].write_bytes(b"ab")
+    cm.run_once()
+    assert cm.lru == {str(files[3]): 2, str(files[4]): 2}
+    assert cm.total_size == 4
+
+    # The files are removed in the background
+    cm.unlinker.stop()
+    assert sorted(cachedir.iterdir()) == [files[3], files[4]]
+
+
+def test_status_server(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    cm_client.rebuild(
+        {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir),
+            "ELIOT_SYMBOLS_CACHE_MAX_SIZE": "20",
+            "ELIOT_SYMBOLS_CACHE_STATUS_ADDRESS": "127.0.0.1:0",
+        }
+    )
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+    (cachedir / "file1.symc").write_bytes(b"abcde")
+    (cachedir / "file2.symc").write_bytes(b"abc")
+    (cachedir / "file3.symc").write_bytes(b"abcdefg")
+    cm.run_once()
+
+    host, port = cm.status_server.address
+    url = f"http://{host}:{port}"
+
+    resp = requests.get(f"{url}/status?n=2")
+    assert resp.status_code == 200
+    status = resp.json()
+    assert status["entries"] == 3
+    assert status["total_size"] == 15
+    assert status["max_size"] == 20
+    assert status["inotify"]["watches"] == 1
+    assert status["largest"] == [
+        {"path": "file3.symc", "size": 7},
+        {"path": "file1.symc", "size": 5},
+    ]
+    assert status["oldest"] == [
+        {"path": "file1.symc", "size": 5},
+        {"path": "file2.symc", "size": 3},
+    ]
+    assert status["evictions"]["files"] == 0
+
+    resp = requests.post(f"{url}/trim?size=10")
+    assert resp.status_code == 200
+    assert resp.json() == {"evicted": 1, "total_size": 10}
+    assert not (cachedir / "file1.symc").exists()
+
+    status = requests.get(f"{url}/status").json()
+    assert status["evictions"]["files"] == 1
+    assert status["evictions"]["bytes"] == 5
+
+    assert requests.get(f"{url}/trim").status_code == 405
+    assert requests.post(f"{url}/trim?size=bad").status_code == 400
+    assert requests.get(f"{url}/status?n=-1").status_code == 400
+    assert requests.get(f"{url}/status?n={MAX_TOP_N + 1}").status_code == 400
+    assert requests.get(f"{url}/missing").status_code == 404
+
+
+def test_status_server_trim_while_evicting(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    cm_client.rebuild(
+        {
+            "ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir),
+            "ELIOT_SYMBOLS_CACHE_MAX_SIZE": "100",
+            "ELIOT_SYMBOLS_CACHE_STATUS_ADDRESS": "127.0.0.1:0",
+        }
+    )
+
+    cm = cm_client.cache_manager
+    cm.run_once()
+    for i in range(10):
+        (cachedir / f"file{i}.symc").write_bytes(b"a" * 10)
+    cm.run_once()
+    assert cm.total_size == 100
+
+    # Slow down eviction and trim once the loop starts evicting
+    evicting = threading.Event()
+    pop_victim = cm.policy.pop_victim
+
+    def slow_pop_victim():
+        evicting.set()
+        time.sleep(0.05)
+        return pop_victim()
+
+    cm.policy.pop_victim = slow_pop_victim
+
+    host, port = cm.status_server.address
+    responses = []
+
+    def trim():
+        evicting.wait(timeout=10)
+        responses.append(requests.post(f"http://{host}:{port}/trim?size=0"))
+
+    thread = threading.Thread(target=trim)
+    thread.start()
+
+    # Adding a 50 byte file makes the loop evict 5 files
+    (cachedir / "new.symc").write_bytes(b"a" * 50)
+    cm.run_once()
+    thread.join(timeout=10)
+
+    # The trim waited for the loop to finish evicting and then evicted the rest
+    assert responses[0].status_code == 200
+    assert responses[0].json() == {"evicted": 6, "total_size": 0}
+    assert cm.lru == {}
+    assert cm.total_size == 0
+    assert cm.evicted_files == 11
+    assert list(cachedir.iterdir()) == []
+
+    # The journal matches the LRU
+    cm.journal.flush()
+    lru = OrderedDict()
+    cm.journal.replay(lru)
+    assert lru == {}
+
+
+def test_trim_file_already_deleted(cm_client, tmpdir):
+    cachedir = pathlib.Path(tmpdir) / "cache"
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir)})
+    cm = cm_client.cache_manager
+    cm.run_once()
+
+    (cachedir / "file1.symc").write_bytes(b"abcde")
+    (cachedir / "file2.symc").write_bytes(b"abcd")
+    cm.run_once()
+
+    # Delete a file before the cache manager handles the DELETE event
+    (cachedir / "file1.symc").unlink()
+    assert cm.trim(target_size=0) == {"evicted": 2, "total_size": 0}
+    assert list(cachedir.iterdir()) == []
+
+
+def test_shared_cache_hits_keep_files(cm_client, tmpdir):
+    """Hits on mapped symcaches count as uses so hot files don't get evicted"""
+    basedir = pathlib.Path(tmpdir)
+    cm_client.rebuild({"ELIOT_SYMBOLS_CACHE_DIR": str(basedir)})
+    cm = cm_client.cache_manager
+
+    (basedir / "tmp").mkdir()
+    diskcache = DiskCache(cachedir=basedir / "cache", tmpdir=basedir / "tmp")
+    shared_cache = SharedSymcacheCache(
+        diskcache=diskcache, max_items=10, access_interval=0
+    )
+    symcache_data = build_symcache_data()
+    hot_key = "testproj/AAAA.symc"
+    cold_key = "testproj/BBBB.symc"
+    new_key = "testproj/CCCC.symc"
+
+    try:
+        # Create the directory and let the cache manager start watching it
+        (basedir / "cache" / "testproj").mkdir()
+        cm.run_once()
+
+        shared_cache.publish(hot_key, symcache_data, "testproj")
+        shared_cache.publish(cold_key, symcache_data, "testproj")
+        cm.run_once()
+        assert list(cm.lru) == [
+            str(diskcache.key_to_filepath(hot_key)),
+            str(diskcache.key_to_filepath(cold_key)),
+        ]
+
+        # Only room for two files
+        cm.max_size = cm.total_size + 1
+
+        # Use the mapped hot symcache, then add a new file
+        assert shared_cache.get(hot_key) is not None
+        cm.run_once()
+        shared_cache.publish(new_key, symcache_data, "testproj")
+        cm.run_once()
+
+        assert diskcache.key_to_filepath(hot_key).exists()
+        assert not diskcache.key_to_filepath(cold_key).exists()
+    finally:
+        shared_cache.close()
+
+
 def test_add_file(cm_client, tmpdir):
     cachedir = pathlib.Path(tmpdir)
 
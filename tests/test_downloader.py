@@ -2,20 +2,83 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+import gzip
+import threading
+import time
+from unittest import mock
+
+import httpx
 import pytest
 
 from eliot.downloader import (
+    AsyncHTTPSource,
+    AsyncSymbolFileDownloader,
+    DOWNLOAD_CHUNK_SIZE,
+    DownloadCancelled,
     ErrorFileNotFound,
     FileNotFound,
     HTTPSource,
+    parse_strategy,
+    Source,
     SymbolFileDownloader,
+    write_decompressed as real_write_decompressed,
 )
+from eliot.libcompression import ZstdCompressor
+from eliot.libhttpx import httpx_async_client
 
 
 FAKE_HOST = "http://example.com"
 FAKE_HOST2 = "http://2.example.com"
 
 
+class FakeSource(Source):
+    """Source that returns data after a delay
+
+    NOTE(willkg): requests_mock handles one request at a time, so this is used
+    for testing things that need slow sources.
+
+    """
+
+    def __init__(self, data, delay=0.0):
+        self.data = data
+        self.delay = delay
+
+    def get(self, debug_filename, debug_id, filename, cancelled=None):
+        if cancelled is None:
+            time.sleep(self.delay)
+        elif cancelled.wait(self.delay):
+            raise DownloadCancelled("cancelled")
+        return self.data
+
+    def get_to_file(self, debug_filename, debug_id, filename, tmpdir, cancelled=None):
+        data = self.get(debug_filename, debug_id, filename, cancelled=cancelled)
+        path = tmpdir / f"{self.data.decode('utf-8')}.sym"
+        path.write_bytes(data)
+        return path
+
+
+def mock_transport(responses):
+    """Returns an httpx MockTransport that serves responses
+
+    :arg responses: dict of url -> (status_code, content)
+
+    :returns: httpx.MockTransport
+
+    """
+
+    def handler(request):
+        status_code, content = responses.get(str(request.url), (404, b""))
+        # Stream the content like a response from the network would
+        return httpx.Response(
+            status_code,
+            headers={"Content-Length": str(len(content))},
+            stream=httpx.ByteStream(content),
+        )
+
+    return httpx.MockTransport(handler)
+
+
 class TestHTTPSource:
     def test_get(self, requestsmock):
         data = b"abcde"
@@ -42,6 +105,182 @@ class TestHTTPSource:
         with pytest.raises(ErrorFileNotFound):
             source.get("xul.so", "ABCDE", "xul.sym")
 
+    def test_get_content_encoding(self, requestsmock):
+        # requests decodes the Content-Encoding, so the data is only decompressed once
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n"
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym",
+            status_code=200,
+            content=gzip.compress(data),
+            headers={"Content-Encoding": "gzip"},
+        )
+
+        source = HTTPSource(FAKE_HOST)
+        assert source.get("xul.so", "ABCDE", "xul.sym") == data
+
+    def test_get_compressed_variant(self, requestsmock):
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n"
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym.zst", status_code=404)
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym.gz",
+            status_code=200,
+            content=gzip.compress(data),
+        )
+
+        source = HTTPSource(FAKE_HOST, compressed_suffixes=[".zst", ".gz"])
+        assert source.get("xul.so", "ABCDE", "xul.sym") == data
+        assert [req.path for req in requestsmock.request_history] == [
+            "/xul.so/abcde/xul.sym.zst",
+            "/xul.so/abcde/xul.sym.gz",
+        ]
+
+    def test_get_compressed_variant_fallback(self, requestsmock):
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n"
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym.zst", status_code=404)
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=200, content=data
+        )
+
+        source = HTTPSource(FAKE_HOST, compressed_suffixes=[".zst"])
+        assert source.get("xul.so", "ABCDE", "xul.sym") == data
+
+    @pytest.mark.parametrize("status_code", [403, 500])
+    def test_get_compressed_variant_error(
+        self, requestsmock, tmp_path, caplog, status_code
+    ):
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n"
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym.zst", status_code=status_code
+        )
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=200, content=data
+        )
+
+        source = HTTPSource(FAKE_HOST, compressed_suffixes=[".zst"])
+        assert source.get("xul.so", "ABCDE", "xul.sym") == data
+        path = source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+        assert path.read_bytes() == data
+
+        # Errors for compressed variants aren't retried and move on to the next one
+        assert [req.path for req in requestsmock.request_history] == [
+            "/xul.so/abcde/xul.sym.zst",
+            "/xul.so/abcde/xul.sym",
+        ] * 2
+        assert f"xul.sym.zst: status_code {status_code}" in caplog.text
+
+    def test_get_compressed_variant_404(self, requestsmock):
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym.zst", status_code=404)
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=404)
+
+        source = HTTPSource(FAKE_HOST, compressed_suffixes=[".zst"])
+        with pytest.raises(FileNotFound):
+            source.get("xul.so", "ABCDE", "xul.sym")
+
+    def test_get_bad_compressed_data(self, requestsmock):
+        data = gzip.compress(b"MODULE Linux x86_64 ABCDE xul.so\n")
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=200, content=data[:-10]
+        )
+
+        source = HTTPSource(FAKE_HOST)
+        with pytest.raises(ErrorFileNotFound):
+            source.get("xul.so", "ABCDE", "xul.sym")
+
+    def test_get_to_file_compressed_variant(self, requestsmock, tmp_path):
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n" * 100
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym.zst",
+            status_code=200,
+            content=ZstdCompressor().compress(data),
+        )
+
+        source = HTTPSource(FAKE_HOST, compressed_suffixes=[".zst"])
+        path = source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+        assert path.read_bytes() == data
+
+    def test_get_to_file(self, requestsmock, tmp_path):
+        data = b"abcde"
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym",
+            status_code=200,
+            content=data,
+            headers={"Content-Length": str(len(data))},
+        )
+
+        source = HTTPSource(FAKE_HOST)
+        path = source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+        assert path.parent == tmp_path
+        assert path.read_bytes() == data
+
+    def test_get_to_file_404(self, requestsmock, tmp_path):
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=404)
+
+        source = HTTPSource(FAKE_HOST)
+        with pytest.raises(FileNotFound):
+            source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_get_to_file_incomplete(self, requestsmock, tmp_path):
+        # The first response is cut short, so it should get retried
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym",
+            [
+                {
+                    "status_code": 200,
+                    "content": b"ab",
+                    "headers": {"Content-Length": "5"},
+                },
+                {"status_code": 200, "content": b"abcde"},
+            ],
+        )
+
+        source = HTTPSource(FAKE_HOST)
+        path = source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+        assert path.read_bytes() == b"abcde"
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_get_to_file_cancelled(self, requestsmock, tmp_path):
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=200, content=b"abcde"
+        )
+
+        # Nothing is downloaded if it's cancelled before it starts
+        cancelled = threading.Event()
+        cancelled.set()
+        source = HTTPSource(FAKE_HOST)
+        with pytest.raises(DownloadCancelled):
+            source.get_to_file(
+                "xul.so", "ABCDE", "xul.sym", tmp_path, cancelled=cancelled
+            )
+        assert requestsmock.call_count == 0
+        assert list(tmp_path.iterdir()) == []
+
+    def test_get_to_file_cancelled_between_chunks(self, requestsmock, tmp_path):
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym",
+            status_code=200,
+            content=b"a" * (DOWNLOAD_CHUNK_SIZE * 3),
+        )
+
+        class CancelAfterChecks:
+            """Event that's set after it's been checked some number of times"""
+
+            def __init__(self, checks):
+                self.checks = checks
+
+            def is_set(self):
+                self.checks -= 1
+                return self.checks < 0
+
+        # Cancel after the check before the request and the first chunk
+        source = HTTPSource(FAKE_HOST)
+        with pytest.raises(DownloadCancelled):
+            source.get_to_file(
+                "xul.so", "ABCDE", "xul.sym", tmp_path, cancelled=CancelAfterChecks(2)
+            )
+        assert requestsmock.call_count == 1
+        assert list(tmp_path.iterdir()) == []
+
 
 class TestSymbolFileDownloader:
     def test_get(self, requestsmock):
@@ -76,3 +315,272 @@ class TestSymbolFileDownloader:
         downloader = SymbolFileDownloader(source_urls=[FAKE_HOST, FAKE_HOST2])
         with pytest.raises(FileNotFound):
             downloader.get("xul.so", "ABCDE", "xul.sym")
+
+    def test_get_to_file_from_second(self, requestsmock, tmp_path):
+        data = b"abcde"
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=404)
+        requestsmock.get(
+            FAKE_HOST2 + "/xul.so/ABCDE/xul.sym", status_code=200, content=data
+        )
+
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST, FAKE_HOST2])
+        path = downloader.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+        assert path.read_bytes() == data
+
+    @pytest.mark.parametrize("strategy", ["concurrent", "hedged"])
+    def test_get_first_positive_wins(self, metricsmock, strategy):
+        downloader = SymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy=strategy, hedge_delay=0.05
+        )
+        downloader.sources = [
+            FakeSource(b"abcde", delay=1.0),
+            FakeSource(b"12345"),
+        ]
+        with metricsmock:
+            start_time = time.perf_counter()
+            ret = downloader.get("xul.so", "ABCDE", "xul.sym")
+        assert ret == b"12345"
+        assert time.perf_counter() - start_time < 1.0
+
+    def test_get_hedged_after_fail(self, metricsmock, requestsmock):
+        requestsmock.get(FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=404)
+        requestsmock.get(
+            FAKE_HOST2 + "/xul.so/ABCDE/xul.sym", status_code=200, content=b"12345"
+        )
+
+        # The second source is tried as soon as the first one fails rather than
+        # after the hedge delay
+        downloader = SymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy="hedged", hedge_delay=10.0
+        )
+        with metricsmock as mm:
+            ret = downloader.get("xul.so", "ABCDE", "xul.sym")
+            assert ret == b"12345"
+            assert not mm.filter_records("incr", stat="eliot.downloader.hedge")
+
+    @pytest.mark.parametrize(
+        "status_codes, expected",
+        [((404, 404), FileNotFound), ((400, 404), ErrorFileNotFound)],
+    )
+    @pytest.mark.parametrize("strategy", ["concurrent", "hedged"])
+    def test_get_not_found(self, requestsmock, strategy, status_codes, expected):
+        requestsmock.get(
+            FAKE_HOST + "/xul.so/ABCDE/xul.sym", status_code=status_codes[0]
+        )
+        requestsmock.get(
+            FAKE_HOST2 + "/xul.so/ABCDE/xul.sym", status_code=status_codes[1]
+        )
+
+        downloader = SymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy=strategy, hedge_delay=0.05
+        )
+        with pytest.raises(expected):
+            downloader.get("xul.so", "ABCDE", "xul.sym")
+
+    def test_get_to_file_concurrent(self, metricsmock, tmp_path):
+        downloader = SymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy="concurrent"
+        )
+        downloader.sources = [
+            FakeSource(b"abcde", delay=0.5),
+            FakeSource(b"12345"),
+        ]
+        with metricsmock as mm:
+            path = downloader.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+            assert path.read_bytes() == b"12345"
+            mm.assert_incr("eliot.downloader.hedge", tags=["host:testnode"])
+
+        # The download that lost is cancelled and doesn't leave a file behind
+        downloader.close()
+        assert list(tmp_path.iterdir()) == [path]
+
+    @pytest.mark.parametrize("strategy", ["concurrent", "hedged"])
+    def test_losers_are_cancelled(self, metricsmock, strategy):
+        downloader = SymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy=strategy, hedge_delay=0.05
+        )
+        downloader.sources = [
+            FakeSource(b"abcde", delay=10.0),
+            FakeSource(b"12345"),
+        ]
+        with metricsmock:
+            start_time = time.perf_counter()
+            assert downloader.get("xul.so", "ABCDE", "xul.sym") == b"12345"
+
+            # The download that lost stops rather than running out its delay, so
+            # shutting down the thread pool doesn't wait for it
+            downloader.close()
+        assert time.perf_counter() - start_time < 5.0
+        assert downloader._executor is None
+
+
+def test_parse_strategy():
+    assert parse_strategy("Hedged") == "hedged"
+    with pytest.raises(ValueError):
+        parse_strategy("fastest")
+
+
+class TestAsyncHTTPSource:
+    def test_get(self):
+        data = b"abcde"
+        source = AsyncHTTPSource(FAKE_HOST)
+        source.client = httpx_async_client(
+            transport=mock_transport({FAKE_HOST + "/xul.so/ABCDE/xul.sym": (200, data)})
+        )
+        ret = asyncio.run(source.get("xul.so", "ABCDE", "xul.sym"))
+        assert ret == data
+
+    def test_get_404(self):
+        source = AsyncHTTPSource(FAKE_HOST)
+        source.client = httpx_async_client(transport=mock_transport({}))
+        with pytest.raises(FileNotFound):
+            asyncio.run(source.get("xul.so", "ABCDE", "xul.sym"))
+
+    def test_get_400(self):
+        source = AsyncHTTPSource(FAKE_HOST)
+        source.client = httpx_async_client(
+            transport=mock_transport({FAKE_HOST + "/xul.so/ABCDE/xul.sym": (400, b"")})
+        )
+        with pytest.raises(ErrorFileNotFound):
+            asyncio.run(source.get("xul.so", "ABCDE", "xul.sym"))
+
+    def test_get_to_file(self, tmp_path):
+        data = b"abcde"
+        source = AsyncHTTPSource(FAKE_HOST)
+        source.client = httpx_async_client(
+            transport=mock_transport({FAKE_HOST + "/xul.so/ABCDE/xul.sym": (200, data)})
+        )
+        path = asyncio.run(source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path))
+        assert path.parent == tmp_path
+        assert path.read_bytes() == data
+
+    def test_get_compressed_variant(self, tmp_path):
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n" * 100
+        source = AsyncHTTPSource(FAKE_HOST, compressed_suffixes=[".zst", ".gz"])
+        source.client = httpx_async_client(
+            transport=mock_transport(
+                {FAKE_HOST + "/xul.so/ABCDE/xul.sym.gz": (200, gzip.compress(data))}
+            )
+        )
+        ret = asyncio.run(source.get("xul.so", "ABCDE", "xul.sym"))
+        assert ret == data
+
+        path = asyncio.run(source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path))
+        assert path.read_bytes() == data
+
+    @pytest.mark.parametrize("status_code", [403, 500])
+    def test_get_compressed_variant_error(self, tmp_path, caplog, status_code):
+        data = b"MODULE Linux x86_64 ABCDE xul.so\n"
+        requested = []
+        transport = mock_transport(
+            {
+                FAKE_HOST + "/xul.so/ABCDE/xul.sym.zst": (status_code, b""),
+                FAKE_HOST + "/xul.so/ABCDE/xul.sym": (200, data),
+            }
+        )
+
+        def handler(request):
+            requested.append(request.url.path)
+            return transport.handle_request(request)
+
+        source = AsyncHTTPSource(FAKE_HOST, compressed_suffixes=[".zst"])
+        source.client = httpx_async_client(transport=httpx.MockTransport(handler))
+        ret = asyncio.run(source.get("xul.so", "ABCDE", "xul.sym"))
+        assert ret == data
+        path = asyncio.run(source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path))
+        assert path.read_bytes() == data
+
+        # Errors for compressed variants aren't retried and move on to the next one
+        assert requested == ["/xul.so/ABCDE/xul.sym.zst", "/xul.so/ABCDE/xul.sym"] * 2
+        assert f"xul.sym.zst: status_code {status_code}" in caplog.text
+
+    def test_get_to_file_writes_off_loop(self, tmp_path):
+        data = b"abcde"
+        source = AsyncHTTPSource(FAKE_HOST)
+        source.client = httpx_async_client(
+            transport=mock_transport({FAKE_HOST + "/xul.so/ABCDE/xul.sym": (200, data)})
+        )
+
+        write_threads = []
+
+        def write_decompressed(fp, decompressor, chunk=None):
+            write_threads.append(threading.get_ident())
+            real_write_decompressed(fp, decompressor, chunk)
+
+        async def get_to_file():
+            return (
+                threading.get_ident(),
+                await source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path),
+            )
+
+        with mock.patch("eliot.downloader.write_decompressed", write_decompressed):
+            loop_thread, path = asyncio.run(get_to_file())
+
+        assert path.read_bytes() == data
+        # The chunk and the flush were written in a thread
+        assert len(write_threads) == 2
+        assert loop_thread not in write_threads
+
+    def test_get_to_file_404(self, tmp_path):
+        source = AsyncHTTPSource(FAKE_HOST)
+        source.client = httpx_async_client(transport=mock_transport({}))
+        with pytest.raises(FileNotFound):
+            asyncio.run(source.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path))
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestAsyncSymbolFileDownloader:
+    def test_get_from_second(self):
+        data = b"abcde"
+        transport = mock_transport({FAKE_HOST2 + "/xul.so/ABCDE/xul.sym": (200, data)})
+        downloader = AsyncSymbolFileDownloader(source_urls=[FAKE_HOST, FAKE_HOST2])
+        for source in downloader.sources:
+            source.client = httpx_async_client(transport=transport)
+
+        ret = asyncio.run(downloader.get("xul.so", "ABCDE", "xul.sym"))
+        assert ret == data
+
+    def test_404(self):
+        transport = mock_transport({})
+        downloader = AsyncSymbolFileDownloader(source_urls=[FAKE_HOST, FAKE_HOST2])
+        for source in downloader.sources:
+            source.client = httpx_async_client(transport=transport)
+
+        with pytest.raises(FileNotFound):
+            asyncio.run(downloader.get("xul.so", "ABCDE", "xul.sym"))
+
+    @pytest.mark.parametrize("strategy", ["concurrent", "hedged"])
+    def test_get_to_file_first_positive_wins(self, metricsmock, tmp_path, strategy):
+        async def handler(request):
+            if request.url.host == "example.com":
+                await asyncio.sleep(5.0)
+                return httpx.Response(200, stream=httpx.ByteStream(b"abcde"))
+            return httpx.Response(200, stream=httpx.ByteStream(b"12345"))
+
+        downloader = AsyncSymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy=strategy, hedge_delay=0.05
+        )
+        for source in downloader.sources:
+            source.client = httpx_async_client(transport=httpx.MockTransport(handler))
+
+        with metricsmock:
+            start_time = time.perf_counter()
+            path = asyncio.run(
+                downloader.get_to_file("xul.so", "ABCDE", "xul.sym", tmp_path)
+            )
+        assert time.perf_counter() - start_time < 5.0
+        assert path.read_bytes() == b"12345"
+        # The slow download was cancelled
+        assert list(tmp_path.iterdir()) == [path]
+
+    @pytest.mark.parametrize("strategy", ["concurrent", "hedged"])
+    def test_404_strategy(self, strategy):
+        transport = mock_transport({})
+        downloader = AsyncSymbolFileDownloader(
+            source_urls=[FAKE_HOST, FAKE_HOST2], strategy=strategy, hedge_delay=0.05
+        )
+        for source in downloader.sources:
+            source.client = httpx_async_client(transport=transport)
+
+        with pytest.raises(FileNotFound):
+            asyncio.run(downloader.get("xul.so", "ABCDE", "xul.sym"))
@@ -0,0 +1,119 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from eliot.eviction import GDSFPolicy, LRUPolicy, parse_eviction_policy
+
+
+class TestLRUPolicy:
+    def test_evicts_least_recently_used(self):
+        policy = LRUPolicy()
+        policy.add("a", 10)
+        policy.add("b", 10)
+        policy.add("c", 10)
+        policy.access("a")
+
+        assert policy.pop_victim() == "b"
+        assert policy.pop_victim() == "c"
+        assert policy.pop_victim() == "a"
+        assert len(policy) == 0
+
+    def test_remove(self):
+        policy = LRUPolicy()
+        policy.add("a", 10)
+        policy.add("b", 10)
+        policy.remove("a")
+        policy.remove("missing")
+
+        assert "a" not in policy
+        assert policy.pop_victim() == "b"
+
+    def test_empty(self):
+        with pytest.raises(KeyError):
+            LRUPolicy().pop_victim()
+
+
+class TestGDSFPolicy:
+    def test_evicts_large_files_first(self):
+        policy = GDSFPolicy()
+        policy.add("small", 10)
+        policy.add("large", 1_000)
+
+        assert policy.pop_victim() == "large"
+
+    def test_keeps_frequently_used_files(self):
+        policy = GDSFPolicy()
+        policy.add("popular", 100)
+        policy.add("unpopular", 50)
+        for _ in range(3):
+            policy.access("popular")
+
+        assert policy.pop_victim() == "unpopular"
+
+    def test_keeps_expensive_files(self):
+        policy = GDSFPolicy()
+        policy.add("cheap", 10, cost=0.1)
+        policy.add("expensive", 10, cost=5.0)
+
+        assert policy.pop_victim() == "cheap"
+
+    def test_update_keeps_cost(self):
+        policy = GDSFPolicy()
+        policy.add("a", 10, cost=5.0)
+        policy.add("b", 10, cost=1.0)
+        # Updating the size without a cost keeps the cost
+        policy.add("a", 10)
+
+        assert policy.pop_victim() == "b"
+
+    def test_aging(self):
+        policy = GDSFPolicy()
+        policy.add("old", 1)
+        policy.access("old")
+        policy.access("old")
+        policy.add("victim", 1, cost=2.5)
+
+        assert policy.pop_victim() == "victim"
+        assert policy.inflation == 2.5
+
+        # Evicting raised the inflation value, so a new file outranks a file that was
+        # used more often but not recently
+        policy.add("new", 1)
+        assert policy.pop_victim() == "old"
+
+    def test_remove(self):
+        policy = GDSFPolicy()
+        policy.add("a", 10)
+        policy.add("b", 100)
+        policy.remove("b")
+
+        assert "b" not in policy
+        assert policy.pop_victim() == "a"
+        with pytest.raises(KeyError):
+            policy.pop_victim()
+
+    def test_heap_compaction(self):
+        policy = GDSFPolicy()
+        policy.add("a", 10)
+        policy.add("b", 20)
+        for _ in range(100):
+            policy.access("a")
+
+        assert len(policy._heap) <= policy.HEAP_COMPACT_FACTOR * len(policy) + 1
+        assert policy.pop_victim() == "b"
+        assert policy.pop_victim() == "a"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("lru", LRUPolicy), ("GDSF", GDSFPolicy), (" gdsf ", GDSFPolicy)],
+)
+def test_parse_eviction_policy(value, expected):
+    assert parse_eviction_policy(value) is expected
+
+
+def test_parse_eviction_policy_unknown():
+    with pytest.raises(ValueError):
+        parse_eviction_policy("fifo")
@@ -0,0 +1,98 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import gzip
+
+import pytest
+
+from eliot.libcompression import (
+    CompressionError,
+    decompress_data,
+    get_compressor,
+    Lz4Compressor,
+    StreamDecompressor,
+    ZstdCompressor,
+)
+
+
+SYM_FILE = b"MODULE Linux x86_64 D48F191186D67E69DF025AD71FB91E1F0 testproj\n" * 100
+
+
+def gzip_compress(data):
+    return gzip.compress(data)
+
+
+def zstd_compress(data):
+    return ZstdCompressor().compress(data)
+
+
+def test_get_compressor():
+    assert get_compressor("none") is None
+    assert isinstance(get_compressor("zstd"), ZstdCompressor)
+    assert isinstance(get_compressor("lz4"), Lz4Compressor)
+
+    with pytest.raises(ValueError):
+        get_compressor("foo")
+
+
+@pytest.mark.parametrize("name", ["zstd", "lz4"])
+def test_roundtrip(name):
+    compressor = get_compressor(name)
+    data = b"testproj::main " * 1000
+    compressed = compressor.compress(data)
+    assert len(compressed) < len(data)
+    assert compressor.decompress(compressed) == data
+
+
+@pytest.mark.parametrize("name", ["zstd", "lz4"])
+def test_decompress_error(name):
+    compressor = get_compressor(name)
+    with pytest.raises(CompressionError):
+        compressor.decompress(b"this is junk")
+
+
+@pytest.mark.parametrize(
+    "compress, compression",
+    [(gzip_compress, "gzip"), (zstd_compress, "zstd"), (lambda data: data, None)],
+)
+def test_stream_decompressor(compress, compression):
+    data = compress(SYM_FILE)
+    decompressor = StreamDecompressor()
+    # Feed it small chunks so the magic bytes get split across chunks
+    chunks = [decompressor.decompress(data[i : i + 3]) for i in range(0, len(data), 3)]
+    chunks.append(decompressor.flush())
+    assert b"".join(chunks) == SYM_FILE
+    assert decompressor.compression == compression
+
+
+def test_decompress_data_short():
+    assert decompress_data(b"") == b""
+    assert decompress_data(b"MO") == b"MO"
+
+
+@pytest.mark.parametrize("compress", [gzip_compress, zstd_compress])
+def test_decompress_data_incomplete(compress):
+    data = compress(SYM_FILE)
+    with pytest.raises(CompressionError):
+        decompress_data(data[:-10])
+
+
+@pytest.mark.parametrize("compress", [gzip_compress, zstd_compress])
+def test_decompress_data_multiple_members(compress):
+    data = compress(SYM_FILE) + compress(SYM_FILE)
+    assert decompress_data(data) == SYM_FILE + SYM_FILE
+
+    # Feed it small chunks so the magic bytes of the second member get split
+    # across chunks
+    decompressor = StreamDecompressor()
+    chunks = [decompressor.decompress(data[i : i + 3]) for i in range(0, len(data), 3)]
+    chunks.append(decompressor.flush())
+    assert b"".join(chunks) == SYM_FILE + SYM_FILE
+
+
+@pytest.mark.parametrize("compress", [gzip_compress, zstd_compress])
+@pytest.mark.parametrize("trailing", [b"x", b"trailing garbage"])
+def test_decompress_data_trailing_data(compress, trailing):
+    with pytest.raises(CompressionError):
+        decompress_data(compress(SYM_FILE) + trailing)
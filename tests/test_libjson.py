@@ -0,0 +1,72 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import json
+
+import pytest
+
+from eliot.app import EliotApp
+from eliot.libjson import get_json_codec, OrjsonJSONCodec, StdlibJSONCodec
+
+
+def test_get_json_codec():
+    assert isinstance(get_json_codec("stdlib"), StdlibJSONCodec)
+    assert isinstance(get_json_codec("orjson"), OrjsonJSONCodec)
+    assert isinstance(get_json_codec("auto"), OrjsonJSONCodec)
+
+    with pytest.raises(ValueError):
+        get_json_codec("foo")
+
+
+def test_stdlib_codec_matches_json():
+    data = {"stacks": [[{"frame": 0, "function": "☃"}]], "found": None}
+    assert StdlibJSONCodec().dumps(data) == json.dumps(data).encode("utf-8")
+
+
+@pytest.mark.parametrize("codec_name", ["stdlib", "orjson"])
+def test_roundtrip(codec_name):
+    codec = get_json_codec(codec_name)
+    data = {
+        "results": [{"stacks": [[{"frame": 0, "function": "☃"}]]}],
+        "debug": {"time": 0.5, "count": 1, "missing": None, "ok": True},
+    }
+    assert codec.loads(codec.dumps(data)) == data
+
+
+@pytest.mark.parametrize("codec_name", ["stdlib", "orjson"])
+def test_loads_error(codec_name):
+    codec = get_json_codec(codec_name)
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads(b"{")
+
+
+def test_orjson_big_ints():
+    # orjson can't encode integers that don't fit in 64 bits
+    codec = get_json_codec("orjson")
+    assert codec.dumps({"a": 2**70}) == b'{"a":1180591620717411303424}'
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"[0, 18446744073709551616]",
+        b"[-9223372036854775809]",
+        b'{"a": 1180591620717411303424}',
+    ],
+)
+def test_orjson_loads_big_ints(data):
+    # orjson decodes integers that don't fit in 64 bits as floats, so these have to
+    # come back as ints like with the json module
+    assert get_json_codec("orjson").loads(data) == json.loads(data)
+    assert get_json_codec("orjson").loads(data.decode("utf-8")) == json.loads(data)
+
+
+def test_default_codec_matches_json():
+    """The default codec's output is byte for byte the same as json.dumps"""
+    codec = EliotApp.Config.json_codec.parser(EliotApp.Config.json_codec.default)
+    data = {
+        "results": [{"stacks": [[{"frame": 0, "function": "☃", "offset": 2**70}]]}],
+        "debug": {"time": 0.5, "missing": None},
+    }
+    assert codec.dumps(data) == json.dumps(data).encode("utf-8")
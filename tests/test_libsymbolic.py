@@ -2,6 +2,8 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import pickle
+import signal
 import types
 
 import pytest
@@ -9,10 +11,12 @@ import pytest
 from eliot.libsymbolic import (
     BadDebugIDError,
     bytes_split_generator,
+    bytes_to_symcache,
     convert_debug_id,
     get_module_filename,
     parse_sym_file,
     ParseSymFileError,
+    ParseSymFilePool,
 )
 
 
@@ -62,6 +66,17 @@ def test_get_module_no_pe_filename():
     assert get_module_filename(symfile_bytes, "libxul.so") == "libxul.so"
 
 
+def test_get_module_filename_from_path(tmp_path):
+    symfile = (
+        "MODULE windows x86_64 0185139C8F04FFC94C4C44205044422E1 xul.pdb\n"
+        "INFO CODE_ID 60533C886EFD000 xul.dll\n"
+        "FILE 0 hg:hg.mozilla.org/releases/mozilla-release:media/libjpeg/simd/etc\n"
+    )
+    path = tmp_path / "xul.sym"
+    path.write_text(symfile)
+    assert get_module_filename(path, "xul.pdb") == "xul.dll"
+
+
 def test_convert_debug_id():
     assert (
         convert_debug_id("58C99D979ADA4CD795F8740CE23C2E1F2")
@@ -74,6 +89,13 @@ def test_convert_debug_id_bad():
         convert_debug_id("bad_id")
 
 
+def test_parse_sym_file_from_path(tmp_path):
+    path = tmp_path / "testproj.sym"
+    path.write_text(TESTPROJ_SYM)
+    symcache = parse_sym_file("testproj", "D48F191186D67E69DF025AD71FB91E1F0", path)
+    assert symcache.lookup(int("5380", 16))[0].symbol == "testproj::main"
+
+
 def test_parse_sym_file_malformed():
     debug_filename = "testproj"
     debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
@@ -95,3 +117,93 @@ def test_parse_sym_file_lookup_error():
         parse_sym_file(debug_filename, debug_id, data)
 
     assert excinfo.value.reason_code == "sym_debug_id_lookup_error"
+
+
+def test_parse_sym_file_error_pickle():
+    error = ParseSymFileError(reason_code="sym_malformed", msg="error with sym file")
+    new_error = pickle.loads(pickle.dumps(error))
+    assert new_error.reason_code == "sym_malformed"
+    assert str(new_error) == str(error)
+
+
+class TestParseSymFilePool:
+    def test_parse_sym_file(self):
+        pool = ParseSymFilePool(size=1, max_tasks_per_child=1, timeout=60)
+        try:
+            data = pool.parse_sym_file(
+                "testproj",
+                "D48F191186D67E69DF025AD71FB91E1F0",
+                TESTPROJ_SYM.encode("utf-8"),
+            )
+            symcache = bytes_to_symcache(data)
+            assert symcache.lookup(int("5380", 16))[0].symbol == "testproj::main"
+
+            # The worker process gets replaced after each task, so this verifies the
+            # pool keeps working
+            with pytest.raises(ParseSymFileError) as excinfo:
+                pool.parse_sym_file(
+                    "testproj", "D48F191186D67E69DF025AD71FB91E1F0", b"this is junk"
+                )
+            assert excinfo.value.reason_code == "sym_malformed"
+        finally:
+            pool.shutdown()
+
+    def test_timeout(self):
+        # Starting a worker process takes longer than this
+        pool = ParseSymFilePool(size=1, timeout=0.001)
+        try:
+            with pytest.raises(ParseSymFileError) as excinfo:
+                pool.parse_sym_file(
+                    "testproj",
+                    "D48F191186D67E69DF025AD71FB91E1F0",
+                    TESTPROJ_SYM.encode("utf-8"),
+                )
+            assert excinfo.value.reason_code == "sym_parse_timeout"
+        finally:
+            pool.shutdown()
+
+    def track_processes(self, executor):
+        """Returns a list that gets the worker processes started by submitting"""
+        processes = []
+        submit = executor.submit
+
+        def _submit(*args, **kwargs):
+            future = submit(*args, **kwargs)
+            processes.extend(executor._processes.values())
+            return future
+
+        executor.submit = _submit
+        return processes
+
+    def test_timeout_twice(self):
+        # Starting a worker process takes longer than this
+        pool = ParseSymFilePool(size=1, timeout=0.001)
+        try:
+            for _ in range(2):
+                processes = self.track_processes(pool._get_executor())
+                with pytest.raises(ParseSymFileError) as excinfo:
+                    pool.parse_sym_file(
+                        "testproj",
+                        "D48F191186D67E69DF025AD71FB91E1F0",
+                        TESTPROJ_SYM.encode("utf-8"),
+                    )
+                assert excinfo.value.reason_code == "sym_parse_timeout"
+
+                # The worker process was killed rather than left parsing and the
+                # pool was replaced
+                assert pool._executor is None
+                assert len(processes) == 1
+                processes[0].join(timeout=10)
+                assert processes[0].exitcode == -signal.SIGTERM
+
+            # The new pool works
+            pool.timeout = 60
+            data = pool.parse_sym_file(
+                "testproj",
+                "D48F191186D67E69DF025AD71FB91E1F0",
+                TESTPROJ_SYM.encode("utf-8"),
+            )
+            symcache = bytes_to_symcache(data)
+            assert symcache.lookup(int("5380", 16))[0].symbol == "testproj::main"
+        finally:
+            pool.shutdown()
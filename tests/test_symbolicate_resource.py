@@ -2,23 +2,48 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+import json
 from pathlib import Path
+import threading
+import time
+from unittest import mock
 from unittest.mock import ANY
 
+import httpx
+from inotify_simple import flags, INotify
+import jsonschema
 import pytest
 
-from eliot.cache import DiskCache
+from eliot import symbolicate_resource
+from eliot.app import get_asgi_app
+from eliot.cache import (
+    DiskCache,
+    LookupCache,
+    MemoryCache,
+    NegativeCache,
+    SharedSymcacheCache,
+    SingleFlight,
+)
 from eliot.downloader import SymbolFileDownloader
+from eliot.libhttpx import httpx_async_client
+from eliot.libjson import get_json_codec
+from eliot.libsymbolic import parse_sym_file, ParseSymFilePool
 from eliot.symbolicate_resource import (
     InvalidModules,
     InvalidStacks,
     DebugStats,
+    iter_json_chunks,
+    lookup_symbols,
     SymbolicateBase,
+    SymbolInfo,
     validate_modules,
     validate_stacks,
 )
 
+from tests.conftest import EliotTestClient
 from tests.utils import counter
 
 
@@ -208,6 +233,8 @@ def test_validate_stacks_error(stacks, modules, error):
 
 FAKE_HOST = "http://example.com/"
 
+REPOROOT = Path(__file__).parent.parent
+
 
 class TestSymbolicateBase:
     @pytest.mark.parametrize(
@@ -254,6 +281,66 @@ class TestSymbolicateBase:
         lineinfo = symcache.lookup(int("5380", 16))[0]
         assert lineinfo.symbol == "testproj::main"
 
+    def test_parse_sym_file_parse_pool(self, tmpdir):
+        """Verify SYM files can be parsed in a parse pool"""
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        data = TESTPROJ_SYM.encode("utf-8")
+
+        parse_pool = ParseSymFilePool(size=1, timeout=60)
+        try:
+            base = SymbolicateBase(
+                downloader=None, cache=None, tmpdir=tmpdir, parse_pool=parse_pool
+            )
+            symcache = base.parse_sym_file(debug_filename, debug_id, data)
+            lineinfo = symcache.lookup(int("5380", 16))[0]
+            assert lineinfo.symbol == "testproj::main"
+
+            # Parse errors get handled the same way
+            assert base.parse_sym_file(debug_filename, debug_id, b"junk") is None
+        finally:
+            parse_pool.shutdown()
+
+    def test_get_symcache_parse_pool_no_conversion(
+        self, requestsmock, tmpcachedir, tmpdir
+    ):
+        """Symcache bytes from the parse pool are cached without converting them"""
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        requestsmock.get(
+            f"{FAKE_HOST}{debug_filename}/{debug_id}/testproj.sym",
+            status_code=200,
+            content=TESTPROJ_SYM.encode("utf-8"),
+        )
+
+        parse_pool = ParseSymFilePool(size=1, timeout=60)
+        try:
+            base = SymbolicateBase(
+                downloader=downloader,
+                cache=cache,
+                tmpdir=tmpdir,
+                memory_cache=MemoryCache(max_size=1_000_000),
+                parse_pool=parse_pool,
+            )
+            with (
+                mock.patch.object(
+                    symbolicate_resource, "bytes_to_symcache"
+                ) as mock_bytes_to_symcache,
+                mock.patch.object(
+                    symbolicate_resource, "symcache_to_bytes"
+                ) as mock_symcache_to_bytes,
+            ):
+                symcache, _ = base.get_symcache(debug_filename, debug_id, DebugStats())
+
+            mock_bytes_to_symcache.assert_not_called()
+            mock_symcache_to_bytes.assert_not_called()
+            assert symcache.lookup(0x5380)[0].symbol == "testproj::main"
+            assert cache.key_to_filepath(f"{debug_filename}/{debug_id}.symc").exists()
+        finally:
+            parse_pool.shutdown()
+
     def test_parse_sym_file_malformed(self, caplog, metricsmock, tmpdir):
         """Verify parsing malformed SYM files logs an error"""
         debug_filename = "testproj"
@@ -375,6 +462,240 @@ class TestSymbolicateBase:
         assert symcache.debug_id == "d48f1911-86d6-7e69-df02-5ad71fb91e1f"
         assert debug_stats.data["cache_lookups"] == {"count": 1, "hits": 0, "time": ANY}
 
+    def test_get_symcache_stream_downloads(self, requestsmock, tmpcachedir, tmpdir):
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        base = SymbolicateBase(
+            downloader=downloader,
+            cache=cache,
+            tmpdir=Path(tmpdir),
+            stream_downloads=True,
+        )
+
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        data = TESTPROJ_SYM.encode("utf-8")
+
+        requestsmock.get(
+            f"{FAKE_HOST}{debug_filename}/{debug_id}/testproj.sym",
+            status_code=200,
+            content=data,
+        )
+
+        debug_stats = DebugStats()
+        symcache, filename = base.get_symcache(debug_filename, debug_id, debug_stats)
+        assert symcache.debug_id == "d48f1911-86d6-7e69-df02-5ad71fb91e1f"
+        assert filename == "testproj"
+        assert debug_stats.data["downloads"]["size_per_module"] == {
+            f"{debug_filename}/{debug_id}": len(data)
+        }
+
+        # The downloaded sym file is deleted after it's parsed
+        assert list(Path(tmpdir).glob("*.sym")) == []
+
+    @pytest.mark.parametrize(
+        "status_code, reason",
+        [(404, NegativeCache.NOT_FOUND), (400, NegativeCache.ERROR)],
+    )
+    def test_get_symcache_negative_cache(
+        self, requestsmock, tmpcachedir, tmpdir, status_code, reason
+    ):
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        negative_cache = NegativeCache(ttl=60, error_ttl=10)
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        base = SymbolicateBase(
+            downloader=downloader,
+            cache=cache,
+            tmpdir=tmpdir,
+            negative_cache=negative_cache,
+        )
+
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+
+        requestsmock.get(
+            f"{FAKE_HOST}{debug_filename}/{debug_id}/testproj.sym",
+            status_code=status_code,
+        )
+
+        debug_stats = DebugStats()
+        assert base.get_symcache(debug_filename, debug_id, debug_stats) is None
+        assert requestsmock.call_count == 1
+        assert negative_cache.get(
+            "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc"
+        ) == (reason)
+
+        # The second time, the module is known to be missing, so it doesn't get
+        # downloaded again
+        debug_stats = DebugStats()
+        assert base.get_symcache(debug_filename, debug_id, debug_stats) is None
+        assert requestsmock.call_count == 1
+        assert debug_stats.data["cache_lookups"] == {
+            "count": 1,
+            "hits": 0,
+            "negative_hits": 1,
+            "time": ANY,
+        }
+
+    def test_get_symcache_in_memory_cache(self, requestsmock, tmpcachedir, tmpdir):
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        memory_cache = MemoryCache(max_size=1_000_000)
+
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        base = SymbolicateBase(
+            downloader=downloader, cache=cache, tmpdir=tmpdir, memory_cache=memory_cache
+        )
+
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        requestsmock.get(
+            f"{FAKE_HOST}{debug_filename}/{debug_id}/testproj.sym",
+            status_code=200,
+            content=TESTPROJ_SYM.encode("utf-8"),
+        )
+
+        # The first lookup downloads and parses the sym file and puts the symcache in
+        # the disk cache and the memory cache
+        debug_stats = DebugStats()
+        symcache, filename = base.get_symcache(debug_filename, debug_id, debug_stats)
+        assert debug_stats.data["cache_lookups"] == {
+            "count": 1,
+            "hits": 0,
+            "memory_hits": 0,
+            "time": ANY,
+        }
+        assert f"{debug_filename}/{debug_id}.symc" in memory_cache
+
+        # The second lookup is served from the memory cache and returns the same
+        # symcache instance
+        debug_stats = DebugStats()
+        symcache2, filename2 = base.get_symcache(debug_filename, debug_id, debug_stats)
+        assert symcache2 is symcache
+        assert filename2 == filename
+        assert debug_stats.data["cache_lookups"] == {
+            "count": 1,
+            "hits": 1,
+            "memory_hits": 1,
+            "time": ANY,
+        }
+        assert requestsmock.call_count == 1
+
+    def test_memory_cache_hits_record_access(self, requestsmock, tmpcachedir, tmpdir):
+        """Memory cache hits touch the disk cache file so inotify reports an access"""
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        memory_cache = MemoryCache(max_size=1_000_000)
+
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        base = SymbolicateBase(
+            downloader=downloader, cache=cache, tmpdir=tmpdir, memory_cache=memory_cache
+        )
+
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        requestsmock.get(
+            f"{FAKE_HOST}{debug_filename}/{debug_id}/testproj.sym",
+            status_code=200,
+            content=TESTPROJ_SYM.encode("utf-8"),
+        )
+        base.get_symcache(debug_filename, debug_id, DebugStats())
+
+        with INotify(nonblocking=True) as inotify:
+            inotify.add_watch(Path(tmpcachedir) / debug_filename, flags.ACCESS)
+
+            base.get_symcache(debug_filename, debug_id, DebugStats())
+            events = inotify.read(timeout=0)
+            assert [event.name for event in events] == [f"{debug_id}.symc"]
+
+            # Accesses are only recorded once per interval
+            base.get_symcache(debug_filename, debug_id, DebugStats())
+            assert inotify.read(timeout=0) == []
+
+    def test_get_symcache_in_shared_cache(self, requestsmock, tmpcachedir, tmpdir):
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        shared_cache = SharedSymcacheCache(diskcache=cache, max_items=10)
+        memory_cache = MemoryCache(max_size=1_000_000)
+
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        base = SymbolicateBase(
+            downloader=downloader,
+            cache=cache,
+            tmpdir=tmpdir,
+            memory_cache=memory_cache,
+            shared_cache=shared_cache,
+        )
+
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        cache_key = f"{debug_filename}/{debug_id}.symc"
+        requestsmock.get(
+            f"{FAKE_HOST}{debug_filename}/{debug_id}/testproj.sym",
+            status_code=200,
+            content=TESTPROJ_SYM.encode("utf-8"),
+        )
+
+        # The first lookup downloads and parses the sym file and publishes the
+        # symcache to the shared cache rather than the memory cache
+        debug_stats = DebugStats()
+        symcache, filename = base.get_symcache(debug_filename, debug_id, debug_stats)
+        assert filename == "testproj"
+        assert cache_key in shared_cache
+        assert cache_key not in memory_cache
+
+        # The second lookup is served from the shared cache
+        debug_stats = DebugStats()
+        symcache2, filename2 = base.get_symcache(debug_filename, debug_id, debug_stats)
+        assert symcache2 is symcache
+        assert filename2 == filename
+        assert debug_stats.data["cache_lookups"] == {
+            "count": 1,
+            "hits": 1,
+            "memory_hits": 0,
+            "shared_hits": 1,
+            "time": ANY,
+        }
+        assert requestsmock.call_count == 1
+
+        shared_cache.close()
+
+    def test_get_symcache_singleflight(self, tmpcachedir, tmpdir):
+        """Concurrent cache misses for the same module only download it once"""
+
+        class SlowDownloader:
+            def __init__(self):
+                self.calls = 0
+
+            def get(self, debug_filename, debug_id, filename):
+                self.calls += 1
+                time.sleep(0.2)
+                return TESTPROJ_SYM.encode("utf-8")
+
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        downloader = SlowDownloader()
+        base = SymbolicateBase(
+            downloader=downloader,
+            cache=cache,
+            tmpdir=tmpdir,
+            singleflight=SingleFlight(lockdir=Path(tmpdir)),
+        )
+
+        debug_filename = "testproj"
+        debug_id = "D48F191186D67E69DF025AD71FB91E1F0"
+        results = []
+
+        def worker():
+            ret = base.get_symcache(debug_filename, debug_id, DebugStats())
+            results.append(ret[0].debug_id)
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert downloader.calls == 1
+        assert results == ["d48f1911-86d6-7e69-df02-5ad71fb91e1f"] * 5
+
     def test_symbolicate(self, requestsmock, tmpcachedir, tmpdir):
         # Set up a DiskCache
         cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
@@ -438,6 +759,66 @@ class TestSymbolicateBase:
                     "testproj/D48F191186D67E69DF025AD71FB91E1F0": ANY,
                 },
             },
+            "fetch": {
+                "time": ANY,
+                "time_per_module": {
+                    "testproj/D48F191186D67E69DF025AD71FB91E1F0": ANY,
+                },
+            },
+        }
+
+    def test_symbolicate_concurrent_fetch(self, requestsmock, tmpcachedir, tmpdir):
+        """Test symbolication with modules fetched in a thread pool"""
+        cache = DiskCache(cachedir=Path(tmpcachedir), tmpdir=Path(tmpdir))
+        downloader = SymbolFileDownloader(source_urls=[FAKE_HOST])
+        base = SymbolicateBase(
+            downloader=downloader, cache=cache, tmpdir=tmpdir, fetch_concurrency=4
+        )
+
+        requestsmock.get(
+            f"{FAKE_HOST}testproj/D48F191186D67E69DF025AD71FB91E1F0/testproj.sym",
+            status_code=200,
+            text=TESTPROJ_SYM,
+        )
+        requestsmock.get(
+            f"{FAKE_HOST}ntdll.pdb/F86EB934B42FBB79B2595AA25907695C1/ntdll.sym",
+            status_code=200,
+            text=NTDLL_SYM,
+        )
+        requestsmock.get(
+            f"{FAKE_HOST}libc.so/12345/libc.so.sym",
+            status_code=404,
+        )
+
+        stacks = [[[0, int("5380", 16)], [1, int("1008", 16)], [2, 100]]]
+        modules = [
+            ["testproj", "D48F191186D67E69DF025AD71FB91E1F0"],
+            ["ntdll.pdb", "F86EB934B42FBB79B2595AA25907695C1"],
+            ["libc.so", "12345"],
+        ]
+        debug_stats = DebugStats()
+
+        jobs = [{"stacks": stacks, "memoryMap": modules}]
+        result = base.symbolicate(jobs, debug_stats)[0]
+
+        assert result["found_modules"] == {
+            "testproj/D48F191186D67E69DF025AD71FB91E1F0": True,
+            "ntdll.pdb/F86EB934B42FBB79B2595AA25907695C1": True,
+            "libc.so/12345": False,
+        }
+        assert [frame.get("function") for frame in result["stacks"][0]] == [
+            "testproj::main",
+            "LdrpGetModuleName",
+            None,
+        ]
+        assert debug_stats.data["downloads"]["count"] == 3
+        assert debug_stats.data["fetch"] == {
+            "time": ANY,
+            "time_per_module": {
+                "testproj/D48F191186D67E69DF025AD71FB91E1F0": ANY,
+                "ntdll.pdb/F86EB934B42FBB79B2595AA25907695C1": ANY,
+                "libc.so/12345": ANY,
+            },
         }
 
     def test_symbolicate_pe_file(self, requestsmock, tmpcachedir, tmpdir):
@@ -636,6 +1017,172 @@ class TestSymbolicateV4:
         }
 
 
+def test_lookup_symbols():
+    symcache = parse_sym_file(
+        "testproj", "D48F191186D67E69DF025AD71FB91E1F0", TESTPROJ_SYM.encode("utf-8")
+    )
+
+    lookups = []
+
+    class CountingSymCache:
+        def lookup(self, addr):
+            lookups.append(addr)
+            return symcache.lookup(addr)
+
+    offsets = [0x53BF, 0x5380, 0x5389, 0x5380, 0x5380, -1, 0x1]
+    symbol_infos = lookup_symbols(CountingSymCache(), offsets)
+
+    # Each offset is looked up once and in order; negative offsets are skipped
+    assert lookups == [0x1, 0x5380, 0x5389, 0x53BF]
+    assert symbol_infos == {
+        0x1: None,
+        0x5380: SymbolInfo(
+            function="testproj::main",
+            function_offset="0x0",
+            file="/home/willkg/projects/testproj/src/main.rs",
+            line=1,
+            inlines=(),
+        ),
+        0x5389: SymbolInfo(
+            function="testproj::main",
+            function_offset="0x9",
+            file="/home/willkg/projects/testproj/src/main.rs",
+            line=2,
+            inlines=(),
+        ),
+        0x53BF: SymbolInfo(
+            function="testproj::main",
+            function_offset="0x3f",
+            file="/home/willkg/projects/testproj/src/main.rs",
+            line=3,
+            inlines=(),
+        ),
+    }
+
+
+def test_lookup_module_offsets_lookup_cache(tmpdir):
+    symcache = parse_sym_file(
+        "testproj", "D48F191186D67E69DF025AD71FB91E1F0", TESTPROJ_SYM.encode("utf-8")
+    )
+
+    lookups = []
+
+    class CountingSymCache:
+        def lookup(self, addr):
+            lookups.append(addr)
+            return symcache.lookup(addr)
+
+    base = SymbolicateBase(
+        downloader=None,
+        cache=None,
+        tmpdir=tmpdir,
+        lookup_cache=LookupCache(max_items=100),
+    )
+    module_info = ("testproj", "D48F191186D67E69DF025AD71FB91E1F0")
+
+    symbol_infos = base.lookup_module_offsets(
+        module_info, CountingSymCache(), {0x1, 0x5380, -1}
+    )
+    assert lookups == [0x1, 0x5380]
+    assert symbol_infos[0x1] is None
+    assert symbol_infos[0x5380].function == "testproj::main"
+
+    # The second time, cached results are used, including results with no symbol
+    # information
+    lookups.clear()
+    symbol_infos2 = base.lookup_module_offsets(
+        module_info, CountingSymCache(), {0x1, 0x5380, 0x5389}
+    )
+    assert lookups == [0x5389]
+    assert symbol_infos2[0x1] is None
+    assert symbol_infos2[0x5380] == symbol_infos[0x5380]
+    assert symbol_infos2[0x5389].function_offset == "0x9"
+
+
+def test_collect_frames(tmpdir):
+    base = SymbolicateBase(downloader=None, cache=None, tmpdir=tmpdir)
+    jobs = [
+        {
+            "memoryMap": [
+                ["xul.pdb", "ABCD"],
+                ["unused.pdb", "1234"],
+                ["", ""],
+                ["libc.so", "EFGH"],
+            ],
+            "stacks": [[[3, 0x20], [0, 0x10], [2, 0x5], [7, 0x1]], [[0, 0x10]]],
+        },
+        {
+            "memoryMap": [["libc.so", "EFGH"]],
+            "stacks": [[[0, 0x30]]],
+        },
+    ]
+
+    # Offsets are grouped by module in the order the modules are first seen; modules
+    # with no frames, no debug information, or an invalid index are left out
+    module_offsets = base.collect_frames(jobs)
+    assert module_offsets == {
+        ("libc.so", "EFGH"): {0x20, 0x30},
+        ("xul.pdb", "ABCD"): {0x10},
+    }
+    assert list(module_offsets) == [("libc.so", "EFGH"), ("xul.pdb", "ABCD")]
+
+    results = base.lookup_frames(
+        jobs, module_offsets, {("libc.so", "EFGH"): None, ("xul.pdb", "ABCD"): None}
+    )
+    assert results[0] == {
+        "stacks": [
+            [
+                {"frame": 0, "module": "libc.so", "module_offset": "0x20"},
+                {"frame": 1, "module": "xul.pdb", "module_offset": "0x10"},
+                {"frame": 2, "module": "<unknown>", "module_offset": "0x5"},
+                {"frame": 3, "module": "<unknown>", "module_offset": "0x1"},
+            ],
+            [{"frame": 0, "module": "xul.pdb", "module_offset": "0x10"}],
+        ],
+        "found_modules": {
+            "xul.pdb/ABCD": False,
+            "unused.pdb/1234": None,
+            "/": None,
+            "libc.so/EFGH": False,
+        },
+    }
+
+
+@pytest.mark.parametrize(
+    "obj, depth",
+    [
+        ({}, 4),
+        ([], 4),
+        ({"results": []}, 4),
+        (
+            {
+                "results": [
+                    {
+                        "stacks": [[{"frame": 0, "module": "xul.pdb"}], []],
+                        "found_modules": {"xul.pdb/ABCDE": None, "a/B": True},
+                    },
+                    {"stacks": [], "found_modules": {}},
+                ],
+                "debug": {"time": 1.5, "unicode": "\u2603"},
+            },
+            4,
+        ),
+        ({"a": [1, 2, {"b": [3]}]}, 1),
+        ({"a": [1, 2, {"b": [3]}]}, 10),
+    ],
+)
+@pytest.mark.parametrize("codec_name", ["stdlib", "orjson"])
+def test_iter_json_chunks(obj, depth, codec_name):
+    codec = get_json_codec(codec_name)
+    expected = codec.dumps(obj)
+    assert b"".join(iter_json_chunks(obj, depth=depth, codec=codec)) == expected
+    assert (
+        b"".join(iter_json_chunks(obj, depth=depth, codec=codec, chunk_size=1))
+        == expected
+    )
+    assert json.loads(expected) == obj
+
+
 class TestSymbolicateV5:
     def test_cors(self, client):
         result = client.simulate_options(
@@ -915,3 +1462,211 @@ class TestSymbolicateV5:
                 }
             ],
         }
+
+    @pytest.mark.parametrize("codec_name", ["stdlib", "orjson"])
+    def test_json_codec(self, requestsmock, client, codec_name):
+        """Verify responses from every codec are valid"""
+        requestsmock.get(
+            "http://symbols.example.com/testproj/D48F191186D67E69DF025AD71FB91E1F0/testproj.sym",
+            status_code=200,
+            text=TESTPROJ_SYM,
+        )
+        requestsmock.get(
+            "http://symbols.example.com/xul.pdb/ABCDEF0123/xul.sym", status_code=404
+        )
+        client.get_resource_by_name("symbolicate_v5").json_codec = get_json_codec(
+            codec_name
+        )
+
+        result = client.simulate_post(
+            "/symbolicate/v5",
+            json={
+                "jobs": [
+                    {
+                        "stacks": [[[0, int("5380", 16)], [1, 100]]],
+                        "memoryMap": [
+                            ["testproj", "D48F191186D67E69DF025AD71FB91E1F0"],
+                            ["xul.pdb", "ABCDEF0123"],
+                        ],
+                    },
+                ]
+            },
+        )
+        assert result.status_code == 200
+        assert result.headers["Content-Type"].startswith("application/json")
+        schema = json.loads(
+            (REPOROOT / "schemas" / "symbolicate_api_response_v5.json").read_text()
+        )
+        jsonschema.validate(result.json, schema)
+        assert result.json["results"][0]["stacks"][0][0]["function"] == (
+            "testproj::main"
+        )
+
+    @pytest.mark.parametrize("codec_name", ["stdlib", "orjson"])
+    def test_json_codec_big_offset(self, requestsmock, client, codec_name):
+        """Offsets that don't fit in 64 bits are decoded as ints by every codec"""
+        requestsmock.get(
+            "http://symbols.example.com/xul.pdb/ABCDEF0123/xul.sym", status_code=404
+        )
+        client.get_resource_by_name("symbolicate_v5").json_codec = get_json_codec(
+            codec_name
+        )
+
+        result = client.simulate_post(
+            "/symbolicate/v5",
+            body=(
+                b'{"jobs": [{"stacks": [[[0, 18446744073709551616]]], '
+                b'"memoryMap": [["xul.pdb", "ABCDEF0123"]]}]}'
+            ),
+        )
+        assert result.status_code == 200
+
+    def test_stream_responses(self, requestsmock, client):
+        """Verify streamed responses are the same as non-streamed responses"""
+        requestsmock.get(
+            "http://symbols.example.com/testproj/D48F191186D67E69DF025AD71FB91E1F0/testproj.sym",
+            status_code=200,
+            text=TESTPROJ_SYM,
+        )
+        payload = {
+            "jobs": [
+                {
+                    "stacks": [[[0, int("5380", 16)], [0, int("5389", 16)]]],
+                    "memoryMap": [["testproj", "D48F191186D67E69DF025AD71FB91E1F0"]],
+                },
+            ]
+            * 3
+        }
+
+        result = client.simulate_post("/symbolicate/v5", json=payload)
+        assert result.status_code == 200
+
+        client.get_resource_by_name("symbolicate_v5").stream_responses = True
+        streamed_result = client.simulate_post("/symbolicate/v5", json=payload)
+        assert streamed_result.status_code == 200
+        assert streamed_result.headers["Content-Type"].startswith("application/json")
+        assert streamed_result.content == result.content
+
+
+class TestAsyncSymbolicateV5:
+    def test_get_symcache_singleflight_many_waiters(self, asgi_client, metricsmock):
+        """Many concurrent cache misses for the same module finish and download once"""
+        calls = []
+
+        async def handler(request):
+            calls.append(str(request.url))
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, content=TESTPROJ_SYM.encode("utf-8"))
+
+        resource = asgi_client.app.get_resource_by_name("symbolicate_v5")
+        assert resource.singleflight is not None
+        for source in resource.downloader.sources:
+            source.client = httpx_async_client(transport=httpx.MockTransport(handler))
+
+        async def get_symcaches():
+            # More waiters than there are threads in any executor
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=2)
+            )
+            async with asyncio.timeout(30):
+                return await asyncio.gather(
+                    *[
+                        resource.get_symcache_async(
+                            "testproj",
+                            "D48F191186D67E69DF025AD71FB91E1F0",
+                            DebugStats(),
+                        )
+                        for _ in range(50)
+                    ]
+                )
+
+        with metricsmock:
+            results = asyncio.run(get_symcaches())
+        assert len(calls) == 1
+        assert {ret[0].debug_id for ret in results} == {
+            "d48f1911-86d6-7e69-df02-5ad71fb91e1f"
+        }
+
+    def test_singleflight_disabled(self):
+        app = get_asgi_app(
+            EliotTestClient.build_config({"ELIOT_SYMBOLS_SINGLEFLIGHT": "false"})
+        ).app
+        assert app.get_resource_by_name("symbolicate_v5").singleflight is None
+
+    def mock_symbols(self, client, responses):
+        def handler(request):
+            status_code, content = responses.get(str(request.url), (404, b""))
+            return httpx.Response(status_code, content=content)
+
+        resource = client.app.get_resource_by_name("symbolicate_v5")
+        for source in resource.downloader.sources:
+            source.client = httpx_async_client(transport=httpx.MockTransport(handler))
+
+    def test_heartbeat(self, asgi_client):
+        result = asgi_client.simulate_get("/__lbheartbeat__")
+        assert result.status_code == 200
+
+    def test_bad_request(self, asgi_client):
+        result = asgi_client.simulate_post("/symbolicate/v5", body=b"{")
+        assert result.status_code == 400
+        assert result.json == {"title": "Payload is not valid JSON"}
+
+    @pytest.mark.parametrize("stream_responses", [False, True])
+    def test_symbolication_module_200(self, asgi_client, stream_responses):
+        asgi_client.app.get_resource_by_name(
+            "symbolicate_v5"
+        ).stream_responses = stream_responses
+        self.mock_symbols(
+            asgi_client,
+            {
+                "http://symbols.example.com/testproj/D48F191186D67E69DF025AD71FB91E1F0/testproj.sym": (
+                    200,
+                    TESTPROJ_SYM.encode("utf-8"),
+                ),
+            },
+        )
+
+        result = asgi_client.simulate_post(
+            "/symbolicate/v5",
+            json={
+                "jobs": [
+                    {
+                        "stacks": [[[0, int("5380", 16)], [1, 100]]],
+                        "memoryMap": [
+                            ["testproj", "D48F191186D67E69DF025AD71FB91E1F0"],
+                            ["xul.pdb", "ABCDEF0123"],
+                        ],
+                    },
+                ]
+            },
+        )
+        assert result.status_code == 200
+        assert result.headers["Content-Type"].startswith("application/json")
+        assert result.json == {
+            "results": [
+                {
+                    "found_modules": {
+                        "testproj/D48F191186D67E69DF025AD71FB91E1F0": True,
+                        "xul.pdb/ABCDEF0123": False,
+                    },
+                    "stacks": [
+                        [
+                            {
+                                "file": "/home/willkg/projects/testproj/src/main.rs",
+                                "frame": 0,
+                                "function": "testproj::main",
+                                "function_offset": "0x0",
+                                "line": 1,
+                                "module": "testproj",
+                                "module_offset": "0x5380",
+                            },
+                            {
+                                "frame": 1,
+                                "module": "xul.pdb",
+                                "module_offset": "0x64",
+                            },
+                        ]
+                    ],
+                }
+            ],
+        }
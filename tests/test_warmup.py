@@ -0,0 +1,147 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import os
+from pathlib import Path
+
+import pytest
+
+from eliot.warmup import (
+    build_symbolicate_base,
+    read_modules_file,
+    read_modules_from_cachedir,
+    read_modules_from_logs,
+    warm_up,
+    WarmUpResult,
+)
+
+from tests.conftest import EliotTestClient
+
+
+FAKE_HOST = "http://example.com/"
+
+TESTPROJ_SYM = b"""\
+MODULE Linux x86_64 D48F191186D67E69DF025AD71FB91E1F0 testproj
+FILE 0 /home/willkg/projects/testproj/src/main.rs
+FUNC 5380 44 0 testproj::main
+5380 9 1 0
+"""
+
+
+def test_read_modules_file(tmp_path):
+    path = tmp_path / "modules.txt"
+    path.write_text(
+        "# top modules\n"
+        "xul.pdb 44E4EC8C2F41492B9369D6B9A059577C2\n"
+        "\n"
+        "libxul.so/D48F191186D67E69DF025AD71FB91E1F0\n"
+    )
+    assert read_modules_file(path) == [
+        ("xul.pdb", "44E4EC8C2F41492B9369D6B9A059577C2"),
+        ("libxul.so", "D48F191186D67E69DF025AD71FB91E1F0"),
+    ]
+
+
+def test_read_modules_file_malformed(tmp_path):
+    path = tmp_path / "modules.txt"
+    path.write_text("xul.pdb\n")
+    with pytest.raises(ValueError, match="modules.txt:1"):
+        read_modules_file(path)
+
+
+def test_read_modules_from_cachedir(tmp_path):
+    for i, key in enumerate(
+        [
+            "xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2.symc",
+            "libxul.so/D48F191186D67E69DF025AD71FB91E1F0.symc",
+            "missing.pdb/ABCDEF.symc.missing",
+        ]
+    ):
+        path = tmp_path / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+        os.utime(path, (1000 + i, 1000 + i))
+
+    # Most recently used first and no negative cache entries
+    assert read_modules_from_cachedir(tmp_path) == [
+        ("libxul.so", "D48F191186D67E69DF025AD71FB91E1F0"),
+        ("xul.pdb", "44E4EC8C2F41492B9369D6B9A059577C2"),
+    ]
+
+    # With noatime, atime is stale, so mtime counts as a use, too
+    os.utime(tmp_path / "xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2.symc", (0, 2000))
+    assert read_modules_from_cachedir(tmp_path) == [
+        ("xul.pdb", "44E4EC8C2F41492B9369D6B9A059577C2"),
+        ("libxul.so", "D48F191186D67E69DF025AD71FB91E1F0"),
+    ]
+
+
+def test_read_modules_from_logs(tmp_path):
+    path = tmp_path / "access.log"
+    path.write_text(
+        '1.2.3.4 - - "GET /xul.pdb/44e4ec8c2f41492b9369d6b9a059577c2/xul.sym HTTP/1.1" '
+        "302\n"
+        '1.2.3.4 - - "GET /libxul.so/D48F191186D67E69DF025AD71FB91E1F0/libxul.so.sym '
+        'HTTP/1.1" 302\n'
+        '1.2.3.4 - - "GET /xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2/xul.sym HTTP/1.1" '
+        "302\n"
+        '1.2.3.4 - - "GET /__heartbeat__ HTTP/1.1" 200\n'
+    )
+    # Most requested first
+    assert read_modules_from_logs(path) == [
+        ("xul.pdb", "44E4EC8C2F41492B9369D6B9A059577C2"),
+        ("libxul.so", "D48F191186D67E69DF025AD71FB91E1F0"),
+    ]
+
+
+def test_warm_up(requestsmock, tmpdir):
+    base = build_symbolicate_base(
+        EliotTestClient.build_config(
+            {
+                "ELIOT_SYMBOLS_CACHE_DIR": str(tmpdir),
+                "ELIOT_SYMBOLS_URLS": FAKE_HOST,
+            }
+        )
+    )
+    requestsmock.get(
+        f"{FAKE_HOST}testproj/D48F191186D67E69DF025AD71FB91E1F0/testproj.sym",
+        status_code=200,
+        content=TESTPROJ_SYM,
+    )
+    requestsmock.get(
+        f"{FAKE_HOST}missing.pdb/ABCDEF1234/missing.sym",
+        status_code=404,
+    )
+    modules = [
+        ("testproj", "D48F191186D67E69DF025AD71FB91E1F0"),
+        ("missing.pdb", "ABCDEF1234"),
+        ("testproj", "D48F191186D67E69DF025AD71FB91E1F0"),
+    ]
+
+    progress_calls = []
+
+    def progress(index, total, module_info, result, duration):
+        progress_calls.append((index, total, result))
+
+    counts = warm_up(base, modules, concurrency=2, progress=progress)
+    assert counts == {
+        WarmUpResult.CACHED: 0,
+        WarmUpResult.BUILT: 1,
+        WarmUpResult.MISSING: 1,
+        WarmUpResult.ERROR: 0,
+    }
+    # Duplicates are only warmed up once; modules finish in any order
+    assert [call[:2] for call in progress_calls] == [(1, 2), (2, 2)]
+    assert sorted(call[2] for call in progress_calls) == [
+        WarmUpResult.BUILT,
+        WarmUpResult.MISSING,
+    ]
+
+    # The symcache is where the webapp looks for it
+    cachedir = Path(tmpdir) / "cache"
+    assert (cachedir / "testproj/D48F191186D67E69DF025AD71FB91E1F0.symc").is_file()
+
+    # Warming up again uses the cache
+    counts = warm_up(base, modules[:1])
+    assert counts[WarmUpResult.CACHED] == 1